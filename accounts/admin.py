@@ -1,6 +1,6 @@
 
 from django.contrib import admin
-from .models import User
+from .models import User, Notification
 from .models_telegram_user import TelegramUser
 
 @admin.register(User)
@@ -13,3 +13,11 @@ class UserAdmin(admin.ModelAdmin):
 class TelegramUserAdmin(admin.ModelAdmin):
 	list_display = ("telegram_id", "started_at")
 	search_fields = ("telegram_id",)
+
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+	list_display = ("id", "telegram_id", "status", "attempts", "next_attempt_at", "created_at", "sent_at")
+	list_filter = ("status",)
+	search_fields = ("telegram_id", "message")
+	readonly_fields = ("created_at", "sent_at")
@@ -0,0 +1,96 @@
+"""
+Async fan-out of bot notifications over one long-lived ``httpx.AsyncClient``.
+
+Messages for different recipients go out concurrently (bounded by
+``max_concurrency``); messages for the same recipient are sent one at a time
+in submission order, and once one fails the rest of that recipient's queue in
+the batch is held back. Ordering across batches is ``claim_batch``'s job.
+"""
+import asyncio
+from collections import defaultdict
+
+import httpx
+
+from .send_booking_message import BOT_SERVER_URL
+
+SENT = "sent"
+FAILED = "failed"
+HELD = "held"
+
+
+class AsyncNotificationDispatcher:
+    def __init__(self, base_url=None, max_concurrency=20, timeout=10, transport=None):
+        self.base_url = base_url or BOT_SERVER_URL
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.transport = transport
+        self._client = None
+        self._semaphore = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def start(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency,
+                ),
+                transport=self.transport,
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def send(self, payload):
+        async with self._semaphore:
+            response = await self._client.post("/telegram/send", json=payload)
+        response.raise_for_status()
+        return response
+
+    async def _drain_recipient(self, items):
+        results = []
+        failed = False
+        for key, payload in items:
+            if failed:
+                results.append((key, HELD, None))
+                continue
+            try:
+                await self.send(payload)
+            except Exception as exc:
+                failed = True
+                results.append((key, FAILED, exc))
+            else:
+                results.append((key, SENT, None))
+        return results
+
+    async def dispatch(self, messages):
+        """
+        Send ``[(key, payload), ...]``; returns ``{key: (status, error)}``.
+
+        ``status`` is ``SENT``, ``FAILED`` or ``HELD`` (not attempted because an
+        earlier message to the same recipient failed).
+        """
+        await self.start()
+        queues = defaultdict(list)
+        for key, payload in messages:
+            queues[payload["telegram_id"]].append((key, payload))
+
+        per_recipient = await asyncio.gather(
+            *(self._drain_recipient(items) for items in queues.values())
+        )
+        return {
+            key: (status, error)
+            for results in per_recipient
+            for key, status, error in results
+        }
@@ -0,0 +1,65 @@
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from accounts.async_dispatch import AsyncNotificationDispatcher
+from accounts.outbox import drain_once, drain_once_async, make_session
+
+
+class Command(BaseCommand):
+    help = "Deliver queued bot notifications from the outbox."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=50)
+        parser.add_argument("--interval", type=float, default=1.0,
+                            help="Seconds to sleep when the outbox is empty.")
+        parser.add_argument("--concurrency", type=int,
+                            default=getattr(settings, "NOTIFICATION_CONCURRENCY", 20),
+                            help="Concurrent requests to the bot server.")
+        parser.add_argument("--sync", action="store_true",
+                            help="Send one message at a time over requests instead of httpx.")
+        parser.add_argument("--once", action="store_true",
+                            help="Drain what is due now and exit.")
+
+    def report(self, counts):
+        if any(counts.values()):
+            self.stdout.write(
+                f"sent={counts['sent']} retry={counts['retry']} dead={counts['dead']}"
+            )
+
+    def handle(self, *args, **options):
+        if options["sync"]:
+            self.run_sync(options)
+        else:
+            asyncio.run(self.run_async(options))
+
+    def run_sync(self, options):
+        session = make_session()
+        batch_size = options["batch_size"]
+        while True:
+            close_old_connections()
+            counts = drain_once(session, batch_size)
+            self.report(counts)
+            if sum(counts.values()) < batch_size:
+                if options["once"]:
+                    return
+                time.sleep(options["interval"])
+
+    async def run_async(self, options):
+        batch_size = options["batch_size"]
+        async with AsyncNotificationDispatcher(
+            max_concurrency=options["concurrency"],
+            timeout=getattr(settings, "NOTIFICATION_HTTP_TIMEOUT", 10),
+        ) as dispatcher:
+            while True:
+                await sync_to_async(close_old_connections)()
+                counts = await drain_once_async(dispatcher, batch_size)
+                self.report(counts)
+                if sum(counts.values()) < batch_size:
+                    if options["once"]:
+                        return
+                    await asyncio.sleep(options["interval"])
@@ -0,0 +1,31 @@
+from .user_cache import get_by_telegram_id
+
+
+def telegram_id_from_request(request):
+    """
+    Caller's telegram_id from ``?telegram_id=`` or the ``Telegram-Id`` /
+    ``X-Telegram-Id`` header.
+    """
+    return (
+        request.GET.get("telegram_id")
+        or request.headers.get("X-Telegram-Id")
+        or request.headers.get("Telegram-Id")
+    )
+
+
+class TelegramUserMiddleware:
+    """
+    Resolve the calling Telegram user once per request.
+
+    Sets ``request.tg_telegram_id`` (the raw id, or ``None``) and
+    ``request.tg_user`` (the ``User`` or ``None``), looked up through the
+    process cache in ``accounts/user_cache.py``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.tg_telegram_id = telegram_id_from_request(request)
+        request.tg_user = get_by_telegram_id(request.tg_telegram_id)
+        return self.get_response(request)
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_notification'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['joined_at'], name='user_joined_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_user_user_joined_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['telegram_id', 'status'], name='notification_recipient_idx'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 class User(models.Model):
     telegram_id = models.CharField(max_length=50, unique=True)
@@ -12,5 +13,42 @@ class User(models.Model):
     )
     joined_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['joined_at'], name='user_joined_idx'),
+        ]
+
     def __str__(self):
         return self.full_name or self.username or self.telegram_id
+
+
+class Notification(models.Model):
+    """
+    Outbox row for a Telegram bot message, written in the same transaction as
+    the change it announces and delivered by ``manage.py send_notifications``.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('dead', 'Dead'),
+    ]
+
+    telegram_id = models.CharField(max_length=50)
+    message = models.TextField()
+    button_text = models.CharField(max_length=100, blank=True, default='')
+    button_url = models.URLField(max_length=500, blank=True, default='')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='notification_due_idx'),
+            models.Index(fields=['telegram_id', 'status'], name='notification_recipient_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.telegram_id}: {self.message[:40]} ({self.status})"
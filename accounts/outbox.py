@@ -0,0 +1,191 @@
+"""
+Transactional outbox for bot notifications.
+
+Request handlers call ``enqueue_booking_message`` inside their database
+transaction; ``manage.py send_notifications`` drains due rows in batches,
+retrying failures with exponential backoff and dead-lettering after
+``NOTIFICATION_MAX_ATTEMPTS``.
+"""
+import logging
+from datetime import timedelta
+
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+
+from .async_dispatch import FAILED, HELD, SENT
+from .models import Notification
+from .send_booking_message import build_payload, post_booking_message
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_booking_message(telegram_id, message, button_text, button_url):
+    return Notification.objects.create(
+        telegram_id=str(telegram_id),
+        message=message,
+        button_text=button_text,
+        button_url=button_url,
+    )
+
+
+def enqueue_many(messages):
+    """
+    Queue several messages (dicts of ``enqueue_booking_message`` kwargs) in one INSERT.
+    """
+    return Notification.objects.bulk_create([
+        Notification(
+            telegram_id=str(m["telegram_id"]),
+            message=m["message"],
+            button_text=m["button_text"],
+            button_url=m["button_url"],
+        )
+        for m in messages
+    ])
+
+
+def make_session(pool_size=10):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def backoff_delay(attempts):
+    base = getattr(settings, "NOTIFICATION_BACKOFF_BASE", 5)
+    cap = getattr(settings, "NOTIFICATION_BACKOFF_MAX", 60 * 60)
+    return timedelta(seconds=min(cap, base * 2 ** max(attempts - 1, 0)))
+
+
+def claim_batch(batch_size):
+    """
+    Lease up to ``batch_size`` due notifications.
+
+    Claimed rows have ``next_attempt_at`` pushed out by
+    ``NOTIFICATION_LEASE_SECONDS`` so concurrent workers skip them; a worker
+    that dies mid-batch simply lets the lease expire.
+
+    A message is not claimed while an earlier one to the same recipient is
+    leased or backing off, and due messages are claimed oldest first, so a
+    recipient's messages go out in order across batches and workers.
+    """
+    now = timezone.now()
+    lease = timedelta(seconds=getattr(settings, "NOTIFICATION_LEASE_SECONDS", 120))
+    waiting_behind = Notification.objects.filter(
+        telegram_id=OuterRef("telegram_id"), status="pending", id__lt=OuterRef("id"), next_attempt_at__gt=now,
+    )
+    with transaction.atomic():
+        batch = list(
+            Notification.objects
+            .select_for_update(skip_locked=True)
+            .filter(status="pending", next_attempt_at__lte=now)
+            .filter(~Exists(waiting_behind))
+            .order_by("id")[:batch_size]
+        )
+        if batch:
+            Notification.objects.filter(id__in=[n.id for n in batch]).update(
+                next_attempt_at=now + lease
+            )
+    return batch
+
+
+def record_success(notification):
+    Notification.objects.filter(pk=notification.pk).update(
+        status="sent", sent_at=timezone.now(), attempts=notification.attempts + 1, last_error=""
+    )
+
+
+def record_failure(notification, error):
+    attempts = notification.attempts + 1
+    max_attempts = getattr(settings, "NOTIFICATION_MAX_ATTEMPTS", 8)
+    if attempts >= max_attempts:
+        logger.error("Notification %s dead-lettered after %s attempts: %s", notification.pk, attempts, error)
+        status, next_attempt_at = "dead", timezone.now()
+    else:
+        status, next_attempt_at = "pending", timezone.now() + backoff_delay(attempts)
+    Notification.objects.filter(pk=notification.pk).update(
+        status=status, attempts=attempts, next_attempt_at=next_attempt_at, last_error=str(error)[:2000]
+    )
+    notification.status, notification.attempts, notification.next_attempt_at = status, attempts, next_attempt_at
+    return status
+
+
+def release(notification, next_attempt_at):
+    """
+    Hand a leased notification back without counting an attempt.
+    """
+    Notification.objects.filter(pk=notification.pk).update(next_attempt_at=next_attempt_at)
+
+
+def deliver(notification, session):
+    payload = build_payload(
+        notification.telegram_id, notification.message,
+        notification.button_text, notification.button_url,
+    )
+    post_booking_message(session, payload, timeout=getattr(settings, "NOTIFICATION_HTTP_TIMEOUT", 10))
+
+
+def drain_once(session, batch_size=50):
+    """
+    Deliver one batch; returns ``{"sent": n, "retry": n, "dead": n}``.
+    """
+    counts = {"sent": 0, "retry": 0, "dead": 0}
+    retry_at = {}  # telegram_id -> when its failed message is next tried
+    for notification in claim_batch(batch_size):
+        if notification.telegram_id in retry_at:
+            release(notification, retry_at[notification.telegram_id])
+            counts["retry"] += 1
+            continue
+        try:
+            deliver(notification, session)
+        except Exception as exc:
+            status = record_failure(notification, exc)
+            counts["dead" if status == "dead" else "retry"] += 1
+            retry_at[notification.telegram_id] = notification.next_attempt_at
+        else:
+            record_success(notification)
+            counts["sent"] += 1
+    return counts
+
+
+def _record_dispatch_results(batch, results):
+    counts = {"sent": 0, "retry": 0, "dead": 0}
+    retry_at = {}  # telegram_id -> when its failed message is next tried
+    held = []
+    for notification in batch:
+        status, error = results[notification.pk]
+        if status == SENT:
+            record_success(notification)
+            counts["sent"] += 1
+        elif status == FAILED:
+            outcome = record_failure(notification, error)
+            counts["dead" if outcome == "dead" else "retry"] += 1
+            retry_at[notification.telegram_id] = notification.next_attempt_at
+        elif status == HELD:
+            held.append(notification)
+    for notification in held:
+        # Never due before the failed message to the same recipient, which
+        # claim_batch also refuses to pass while it is backing off
+        release(notification, retry_at.get(notification.telegram_id, timezone.now()))
+        counts["retry"] += 1
+    return counts
+
+
+async def drain_once_async(dispatcher, batch_size=50):
+    """
+    Async counterpart of ``drain_once``: one batch through an
+    ``AsyncNotificationDispatcher``, recipients in parallel.
+    """
+    batch = await sync_to_async(claim_batch)(batch_size)
+    if not batch:
+        return {"sent": 0, "retry": 0, "dead": 0}
+    results = await dispatcher.dispatch([
+        (n.pk, build_payload(n.telegram_id, n.message, n.button_text, n.button_url))
+        for n in batch
+    ])
+    return await sync_to_async(_record_dispatch_results)(batch, results)
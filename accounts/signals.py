@@ -0,0 +1,16 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import User
+from .user_cache import user_cache
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    def invalidate():
+        user_cache.invalidate(instance.telegram_id, instance.pk)
+
+    invalidate()
+    transaction.on_commit(invalidate)
@@ -1,3 +1,273 @@
-from django.test import TestCase
+import asyncio
+import json
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import httpx
+import requests
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from .async_dispatch import FAILED, HELD, SENT, AsyncNotificationDispatcher
+from .middleware import TelegramUserMiddleware
+from .models import Notification, User
+from .outbox import backoff_delay, drain_once, drain_once_async, enqueue_booking_message
+from .user_cache import get_by_telegram_id, user_cache
+
+
+class StandInBotServer:
+    """
+    Minimal ASGI stand-in for the bot service's ``POST /telegram/send``.
+    """
+
+    def __init__(self, delay=0.05, fail_messages=()):
+        self.delay = delay
+        self.fail_messages = set(fail_messages)
+        self.received = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(self, scope, receive, send):
+        body = b""
+        while True:
+            event = await receive()
+            body += event.get("body", b"")
+            if not event.get("more_body"):
+                break
+        payload = json.loads(body)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.delay)
+        self.in_flight -= 1
+        self.received.append(payload)
+        status = 500 if payload["message"] in self.fail_messages else 200
+        await send({"type": "http.response.start", "status": status, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    def dispatcher(self, **kwargs):
+        return AsyncNotificationDispatcher(
+            base_url="http://bot.test", transport=httpx.ASGITransport(app=self), **kwargs
+        )
+
+
+def payload(telegram_id, message):
+    return {"telegram_id": telegram_id, "message": message, "button_text": "", "button_url": ""}
+
+
+class AsyncNotificationDispatcherTests(SimpleTestCase):
+
+    def dispatch(self, server, messages, **kwargs):
+        async def run():
+            async with server.dispatcher(**kwargs) as dispatcher:
+                return await dispatcher.dispatch(messages)
+        return asyncio.run(run())
+
+    def test_recipients_are_sent_concurrently(self):
+        server = StandInBotServer()
+        results = self.dispatch(server, [(1, payload("customer", "a")), (2, payload("provider", "b"))])
+        self.assertEqual(results, {1: (SENT, None), 2: (SENT, None)})
+        self.assertEqual(server.max_in_flight, 2)
+
+    def test_per_recipient_order_is_preserved(self):
+        server = StandInBotServer(delay=0)
+        messages = [(i, payload(str(i % 3), f"m{i}")) for i in range(12)]
+        self.dispatch(server, messages)
+        for recipient in "012":
+            sent = [p["message"] for p in server.received if p["telegram_id"] == recipient]
+            self.assertEqual(sent, [f"m{i}" for i in range(12) if str(i % 3) == recipient])
+
+    def test_concurrency_is_bounded(self):
+        server = StandInBotServer()
+        self.dispatch(server, [(i, payload(str(i), "x")) for i in range(10)], max_concurrency=3)
+        self.assertEqual(server.max_in_flight, 3)
+
+    def test_failure_holds_back_later_messages_to_same_recipient(self):
+        server = StandInBotServer(delay=0, fail_messages={"first"})
+        results = self.dispatch(server, [
+            (1, payload("a", "first")), (2, payload("a", "second")), (3, payload("b", "other")),
+        ])
+        self.assertEqual(results[1][0], FAILED)
+        self.assertEqual(results[2], (HELD, None))
+        self.assertEqual(results[3], (SENT, None))
+
+
+class OutboxAsyncDrainTests(TransactionTestCase):
+
+    def test_drain_records_outcomes(self):
+        enqueue_booking_message("a", "first", "", "")
+        enqueue_booking_message("a", "second", "", "")
+        enqueue_booking_message("b", "other", "", "")
+        server = StandInBotServer(delay=0, fail_messages={"first"})
+
+        async def run():
+            async with server.dispatcher() as dispatcher:
+                return await drain_once_async(dispatcher)
+
+        self.assertEqual(asyncio.run(run()), {"sent": 1, "retry": 2, "dead": 0})
+        statuses = dict(Notification.objects.values_list("message", "status"))
+        self.assertEqual(statuses, {"first": "pending", "second": "pending", "other": "sent"})
+        self.assertEqual(Notification.objects.get(message="first").attempts, 1)
+        self.assertEqual(Notification.objects.get(message="second").attempts, 0)
+
+    def test_held_messages_stay_behind_a_repeatedly_failing_one(self):
+        enqueue_booking_message("a", "first", "", "")
+        enqueue_booking_message("a", "second", "", "")
+        failing = StandInBotServer(delay=0, fail_messages={"first"})
+        now = timezone.now()
+
+        def drain_at(moment, server):
+            async def run():
+                async with server.dispatcher() as dispatcher:
+                    return await drain_once_async(dispatcher)
+            with mock.patch("django.utils.timezone.now", return_value=moment):
+                return asyncio.run(run())
+
+        drain_at(now, failing)
+        first = Notification.objects.get(message="first")
+        drain_at(first.next_attempt_at, failing)  # second failure: a longer backoff
+        first.refresh_from_db()
+        second = Notification.objects.get(message="second")
+        self.assertEqual(first.attempts, 2)
+        self.assertGreaterEqual(second.next_attempt_at, first.next_attempt_at)
+
+        server = StandInBotServer(delay=0)
+        drain_at(first.next_attempt_at, server)
+        self.assertEqual([p["message"] for p in server.received], ["first", "second"])
+
+
+class StandInSession:
+    """
+    ``requests.Session`` stand-in for ``drain_once``; fails the listed messages.
+    """
+
+    def __init__(self, fail_messages=()):
+        self.fail_messages = set(fail_messages)
+        self.sent = []
+
+    def post(self, url, json, timeout):
+        if json["message"] in self.fail_messages:
+            raise requests.ConnectionError("bot unavailable")
+        self.sent.append(json["message"])
+        return mock.Mock(raise_for_status=lambda: None)
+
+
+@override_settings(NOTIFICATION_BACKOFF_BASE=5, NOTIFICATION_BACKOFF_MAX=60, NOTIFICATION_MAX_ATTEMPTS=3)
+class OutboxDrainTests(TestCase):
+
+    def test_backoff_doubles_up_to_the_cap(self):
+        self.assertEqual(
+            [backoff_delay(attempts).total_seconds() for attempts in range(1, 7)], [5, 10, 20, 40, 60, 60]
+        )
+
+    def test_due_messages_are_sent_once(self):
+        enqueue_booking_message("a", "now", "", "")
+        later = enqueue_booking_message("a", "later", "", "")
+        Notification.objects.filter(pk=later.pk).update(next_attempt_at=timezone.now() + timedelta(hours=1))
+        session = StandInSession()
+        self.assertEqual(drain_once(session), {"sent": 1, "retry": 0, "dead": 0})
+        self.assertEqual(drain_once(session), {"sent": 0, "retry": 0, "dead": 0})
+        self.assertEqual(session.sent, ["now"])
+        sent = Notification.objects.get(message="now")
+        self.assertEqual((sent.status, sent.attempts, sent.last_error), ("sent", 1, ""))
+        self.assertIsNotNone(sent.sent_at)
+
+    def test_failures_back_off_then_dead_letter(self):
+        notification = enqueue_booking_message("a", "broken", "", "")
+        session = StandInSession(fail_messages={"broken"})
+        now = timezone.now()
+        for attempt, outcome in ((1, "retry"), (2, "retry"), (3, "dead")):
+            with mock.patch("django.utils.timezone.now", return_value=now):
+                counts = drain_once(session)
+            self.assertEqual(counts[outcome], 1)
+            notification.refresh_from_db()
+            self.assertEqual(notification.attempts, attempt)
+            self.assertIn("bot unavailable", notification.last_error)
+            if outcome == "retry":
+                self.assertEqual(notification.next_attempt_at, now + backoff_delay(attempt))
+                now = notification.next_attempt_at
+        self.assertEqual(notification.status, "dead")
+        self.assertEqual(drain_once(session), {"sent": 0, "retry": 0, "dead": 0})
+
+    def test_recipient_order_holds_across_batches(self):
+        enqueue_booking_message("a", "first", "", "")
+        enqueue_booking_message("a", "second", "", "")
+        enqueue_booking_message("b", "other", "", "")
+        now = timezone.now()
+
+        def drain_at(moment, session):
+            with mock.patch("django.utils.timezone.now", return_value=moment):
+                return drain_once(session, batch_size=1)
+
+        failing = StandInSession(fail_messages={"first"})
+        self.assertEqual(drain_at(now, failing), {"sent": 0, "retry": 1, "dead": 0})
+        # "second" is due, but waits behind "first" while it backs off
+        self.assertEqual(drain_at(now, failing), {"sent": 1, "retry": 0, "dead": 0})
+        self.assertEqual(drain_at(now, failing), {"sent": 0, "retry": 0, "dead": 0})
+        self.assertEqual(failing.sent, ["other"])
+
+        healthy = StandInSession()
+        retry_at = Notification.objects.get(message="first").next_attempt_at
+        while drain_at(retry_at, healthy)["sent"]:
+            pass
+        self.assertEqual(healthy.sent, ["first", "second"])
+
+
+class TelegramUserCacheTests(TestCase):
+
+    def setUp(self):
+        user_cache.clear()
+        self.user = User.objects.create(telegram_id="700", full_name="Before")
+        self.factory = RequestFactory()
+
+    def resolve(self, **kwargs):
+        request = self.factory.get("/", **kwargs)
+        TelegramUserMiddleware(lambda request: None)(request)
+        return request
+
+    def test_resolved_once_then_served_from_cache(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.resolve(data={"telegram_id": "700"}).tg_user, self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.resolve(HTTP_X_TELEGRAM_ID="700").tg_user, self.user)
+            self.assertEqual(self.resolve(HTTP_TELEGRAM_ID="700").tg_user, self.user)
+
+    def test_save_and_delete_invalidate(self):
+        self.resolve(data={"telegram_id": "700"})
+        self.user.full_name = "After"
+        self.user.save()
+        self.assertEqual(self.resolve(data={"telegram_id": "700"}).tg_user.full_name, "After")
+        self.user.delete()
+        self.assertIsNone(self.resolve(data={"telegram_id": "700"}).tg_user)
+
+    def test_callers_get_copies(self):
+        first = get_by_telegram_id("700")
+        first.full_name = "Mutated"
+        self.assertEqual(get_by_telegram_id("700").full_name, "Before")
+
+    def test_unknown_ids_are_not_cached(self):
+        self.assertIsNone(get_by_telegram_id("701"))
+        User.objects.create(telegram_id="701")
+        self.assertIsNotNone(get_by_telegram_id("701"))
+        request = self.resolve()
+        self.assertIsNone(request.tg_telegram_id)
+        self.assertIsNone(request.tg_user)
+
+    @override_settings(TG_USER_CACHE_SIZE=2)
+    def test_bounded(self):
+        user_cache.clear()
+        for telegram_id in ("710", "711", "712"):
+            User.objects.create(telegram_id=telegram_id)
+            get_by_telegram_id(telegram_id)
+        self.assertEqual(len(user_cache._lru()), 2)
+
+    def test_update_does_not_write_back_a_stale_cached_copy(self):
+        get_by_telegram_id("700")
+        # Changed by another worker: this process's cached copy is now stale
+        User.objects.filter(pk=self.user.pk).update(phone_number="0911000000")
+        response = self.client.post(
+            "/api/accounts/", {"telegram_id": "700", "full_name": "Renamed"}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.full_name, self.user.phone_number), ("Renamed", "0911000000"))
+        self.assertEqual(get_by_telegram_id("700").full_name, "Renamed")
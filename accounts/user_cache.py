@@ -0,0 +1,69 @@
+import copy
+import threading
+
+from cachetools import TTLCache
+from django.conf import settings
+
+
+class TelegramUserCache:
+    """
+    Bounded in-process LRU of ``User`` rows keyed by ``telegram_id``.
+
+    ``accounts/signals.py`` drops an entry whenever its user is saved or
+    deleted in this process, once immediately and again after commit so a
+    concurrent read cannot re-cache the pre-commit row. Writes made by other
+    gunicorn workers (or via ``QuerySet.update``) are picked up once the
+    entry's ``TG_USER_CACHE_TTL`` runs out. Unknown ids are never cached, so a
+    fresh registration is visible everywhere at once.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = None
+
+    def _lru(self):
+        if self._local is None:
+            self._local = TTLCache(
+                maxsize=getattr(settings, "TG_USER_CACHE_SIZE", 4096),
+                ttl=getattr(settings, "TG_USER_CACHE_TTL", 60),
+            )
+        return self._local
+
+    def get(self, telegram_id):
+        """The user with ``telegram_id``, or ``None``; callers get their own copy."""
+        from .models import User
+
+        if telegram_id in (None, ""):
+            return None
+        key = str(telegram_id)
+        with self._lock:
+            cached = self._lru().get(key)
+        if cached is not None:
+            return copy.copy(cached)
+
+        user = User.objects.filter(telegram_id=key).first()
+        if user is not None:
+            with self._lock:
+                self._lru()[key] = copy.copy(user)
+        return user
+
+    def invalidate(self, telegram_id=None, pk=None):
+        with self._lock:
+            lru = self._lru()
+            lru.pop(str(telegram_id), None)
+            if pk is not None:
+                # telegram_id may have changed since the entry was cached
+                for key, user in list(lru.items()):
+                    if user.pk == pk:
+                        lru.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._local = None
+
+
+user_cache = TelegramUserCache()
+
+
+def get_by_telegram_id(telegram_id):
+    return user_cache.get(telegram_id)
@@ -1,6 +1,7 @@
 from rest_framework import viewsets
 from .models import User
-from .send_booking_message import send_booking_message_sync
+from django.db import transaction
+from .outbox import enqueue_booking_message
 from .serializers import UserSerializer
 from rest_framework.response import Response
 
@@ -11,27 +12,31 @@ class UserViewSet(viewsets.ModelViewSet):
 
     def create(self, request, *args, **kwargs):
         telegram_id = request.data.get('telegram_id')
-        user = User.objects.filter(telegram_id=telegram_id).first()
-        if user:
-            # Update user with new info
-            serializer = self.get_serializer(user, data=request.data, partial=True)
-            if serializer.is_valid():
-                user = serializer.save()
-                return Response(self.get_serializer(user).data, status=200)
-            else:
-                print("[User Update Error]", serializer.errors)
-                return Response(serializer.errors, status=400)
+        with transaction.atomic():
+            # Saved back whole, so read the current row rather than the cached copy;
+            # the post_save signal then drops the cached one
+            user = User.objects.select_for_update().filter(telegram_id=telegram_id).first() if telegram_id else None
+            if user:
+                # Update user with new info
+                serializer = self.get_serializer(user, data=request.data, partial=True)
+                if serializer.is_valid():
+                    user = serializer.save()
+                    return Response(self.get_serializer(user).data, status=200)
+                else:
+                    print("[User Update Error]", serializer.errors)
+                    return Response(serializer.errors, status=400)
         # If not exists, create new
         serializer = self.get_serializer(data=request.data)
         if not serializer.is_valid():
             print("[User Registration Error]", serializer.errors)
             return Response(serializer.errors, status=400)
-        user = serializer.save()
-        # Send Telegram message after registration
-        send_booking_message_sync(
-            telegram_id=user.telegram_id,
-            message="Registration successful! Welcome to Balemuya.",
-            button_text="Go to Dashboard",
-            button_url="https://balemuya-frontend-qn6y.vercel.app/"
-        )
+        with transaction.atomic():
+            user = serializer.save()
+            # Queue Telegram message after registration
+            enqueue_booking_message(
+                telegram_id=user.telegram_id,
+                message="Registration successful! Welcome to Balemuya.",
+                button_text="Go to Dashboard",
+                button_url="https://balemuya-frontend-qn6y.vercel.app/"
+            )
         return Response(self.get_serializer(user).data, status=201)
@@ -0,0 +1,139 @@
+"""
+Response cache for the admin analytics endpoints.
+
+Entries are keyed by the endpoint, the normalized ``parse_period`` range and
+the remaining query parameters. Closed periods (ending before now) are cached
+without expiry under the current history version, which is replaced whenever
+a write lands on a past day or the rollups are rebuilt; ranges that include
+now get ``ANALYTICS_CACHE_OPEN_TTL``. Every response carries ``ETag`` and
+``Last-Modified`` and a matching conditional GET is answered with 304 from
+the cache alone.
+
+Values that change without touching any rollup (the user count, display
+names) are covered by the live version instead: endpoints cached with
+``live=True`` also key on it, and it is replaced whenever a user joins, is
+deleted or renamed, or a service is renamed.
+"""
+import functools
+import hashlib
+import json
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+HISTORY_VERSION_KEY = "admin-analytics:history-version"
+LIVE_VERSION_KEY = "admin-analytics:live-version"
+PERIOD_PARAMS = ("from", "to")
+
+
+def _cache():
+    return caches[getattr(settings, "ANALYTICS_CACHE_ALIAS", "default")]
+
+
+def _version(key):
+    cache = _cache()
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        cache.add(key, version, timeout=None)
+        version = cache.get(key, version)
+    return version
+
+
+def history_version():
+    return _version(HISTORY_VERSION_KEY)
+
+
+def invalidate_history():
+    _cache().set(HISTORY_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+
+
+def live_version():
+    return _version(LIVE_VERSION_KEY)
+
+
+def invalidate_live():
+    _cache().set(LIVE_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+
+
+def _normalized_key(name, request, date_from, date_to, now, live):
+    open_ttl = getattr(settings, "ANALYTICS_CACHE_OPEN_TTL", 60)
+    is_open = date_to >= now
+    if is_open:
+        # Sliding "now" ranges: bucket both ends so repeated refreshes share an entry
+        bucket = int(now.timestamp()) // open_ttl
+        period = f"open:{int(date_from.timestamp()) // open_ttl}:{bucket}"
+    else:
+        period = f"closed:{date_from.isoformat()}:{date_to.isoformat()}:{history_version()}"
+    params = sorted(
+        (key, value)
+        for key, values in request.query_params.lists()
+        if key not in PERIOD_PARAMS
+        for value in values
+    )
+    raw = json.dumps([name, period, params, live_version() if live else None])
+    return "admin-analytics:" + hashlib.sha256(raw.encode()).hexdigest(), is_open
+
+
+def _etag(data):
+    body = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True)
+    return quote_etag(hashlib.sha256(body.encode()).hexdigest()[:32])
+
+
+def _not_modified(request, entry):
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match:
+        return entry["etag"] in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+    since = parse_http_date_safe(request.headers.get("If-Modified-Since", ""))
+    return since is not None and entry["last_modified"] <= since
+
+
+def _respond(request, entry):
+    if _not_modified(request, entry):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response(entry["data"])
+    response["ETag"] = entry["etag"]
+    response["Last-Modified"] = http_date(entry["last_modified"])
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def cached_analytics(view_method=None, *, live=False):
+    """
+    Cache an ``AdminDashboardViewSet`` action that depends on ``parse_period``.
+    ``live=True`` for actions that also report user counts or display names.
+    """
+    if view_method is None:
+        return functools.partial(cached_analytics, live=live)
+
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        from .views import parse_period
+
+        now = timezone.now()  # taken first so a defaulted "to" counts as open
+        date_from, date_to = parse_period(request)
+        key, is_open = _normalized_key(view_method.__name__, request, date_from, date_to, now, live)
+        cache = _cache()
+        entry = cache.get(key)
+        if entry is None:
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            entry = {
+                "data": response.data,
+                "etag": _etag(response.data),
+                "last_modified": int(time.time()),
+            }
+            timeout = getattr(settings, "ANALYTICS_CACHE_OPEN_TTL", 60) if is_open else None
+            cache.set(key, entry, timeout=timeout)
+        return _respond(request, entry)
+
+    return wrapper
@@ -0,0 +1,19 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from admins import rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily revenue/booking rollups and revenue leaderboards from raw transactions and bookings."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="date_from", type=date.fromisoformat,
+                            help="First day to rebuild (YYYY-MM-DD); default: all history.")
+        parser.add_argument("--to", dest="date_to", type=date.fromisoformat,
+                            help="Last day to rebuild (YYYY-MM-DD), inclusive.")
+
+    def handle(self, *args, **options):
+        rollups.rebuild(options["date_from"], options["date_to"])
+        self.stdout.write(self.style.SUCCESS("Rollups rebuilt."))
@@ -0,0 +1,73 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_rollups(apps, schema_editor):
+    Transaction = apps.get_model('bookings', 'Transaction')
+    Booking = apps.get_model('bookings', 'Booking')
+    DailyRevenueRollup = apps.get_model('admins', 'DailyRevenueRollup')
+    DailyBookingRollup = apps.get_model('admins', 'DailyBookingRollup')
+
+    DailyRevenueRollup.objects.bulk_create(
+        DailyRevenueRollup(**row)
+        for row in Transaction.objects.annotate(day=TruncDate('created_at'))
+        .values('day', 'provider_id', 'service_id')
+        .annotate(gross=Sum('amount'), transaction_count=Count('id'))
+        .order_by()
+    )
+    DailyBookingRollup.objects.bulk_create(
+        DailyBookingRollup(**row)
+        for row in Booking.objects.annotate(day=TruncDate('created_at'))
+        .values('day', 'provider_id', 'service_id', 'status')
+        .annotate(booking_count=Count('id'))
+        .order_by()
+    )
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('accounts', '0003_notification'),
+        ('bookings', '0002_transaction_customer_transaction_provider_and_more'),
+        ('services', '0006_service_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyBookingRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(max_length=20)),
+                ('booking_count', models.IntegerField(default=0)),
+                ('provider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='accounts.user')),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='services.service')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day', 'status'], name='booking_rollup_day_idx')],
+                'unique_together': {('day', 'provider', 'service', 'status')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyRevenueRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('gross', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('transaction_count', models.IntegerField(default=0)),
+                ('provider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='accounts.user')),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='services.service')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='revenue_rollup_day_idx')],
+                'unique_together': {('day', 'provider', 'service')},
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
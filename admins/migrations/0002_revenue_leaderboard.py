@@ -0,0 +1,51 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:29
+
+from django.db import migrations, models
+from django.db.models import F, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+
+
+def backfill_leaderboards(apps, schema_editor):
+    DailyRevenueRollup = apps.get_model('admins', 'DailyRevenueRollup')
+    RevenueLeaderboard = apps.get_model('admins', 'RevenueLeaderboard')
+
+    buckets = {'day': F('day'), 'week': TruncWeek('day'), 'month': TruncMonth('day')}
+    for period, bucket in buckets.items():
+        for kind in ('provider', 'service'):
+            RevenueLeaderboard.objects.bulk_create(
+                RevenueLeaderboard(
+                    period=period, period_start=row['bucket'], kind=kind,
+                    subject_id=row[f'{kind}_id'], gross=row['gross'], transaction_count=row['count'],
+                )
+                for row in DailyRevenueRollup.objects.annotate(bucket=bucket)
+                .values('bucket', f'{kind}_id')
+                .annotate(gross=Sum('gross'), count=Sum('transaction_count'))
+                .order_by()
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admins', '0001_daily_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevenueLeaderboard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Day'), ('week', 'Week'), ('month', 'Month')], max_length=5)),
+                ('period_start', models.DateField()),
+                ('kind', models.CharField(choices=[('provider', 'Provider'), ('service', 'Service')], max_length=10)),
+                ('subject_id', models.BigIntegerField()),
+                ('gross', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('transaction_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['period', 'kind', 'period_start', '-gross'], name='leaderboard_rank_idx')],
+                'unique_together': {('period', 'period_start', 'kind', 'subject_id')},
+            },
+        ),
+        migrations.RunPython(backfill_leaderboards, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,74 @@
 from django.db import models
 
-# Create your models here.
+from accounts.models import User
+from services.models import Service
+
+
+class DailyRevenueRollup(models.Model):
+    """
+    Transaction totals per day, provider and service (see admins/rollups.py).
+    """
+    day = models.DateField()
+    provider = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, related_name='+')
+    gross = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    transaction_count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('day', 'provider', 'service')
+        indexes = [models.Index(fields=['day'], name='revenue_rollup_day_idx')]
+
+    def __str__(self):
+        return f"{self.day} {self.provider_id}/{self.service_id}: {self.gross}"
+
+
+class DailyBookingRollup(models.Model):
+    """
+    Booking counts per creation day, provider, service and current status.
+    """
+    day = models.DateField()
+    provider = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, related_name='+')
+    status = models.CharField(max_length=20)
+    booking_count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('day', 'provider', 'service', 'status')
+        indexes = [models.Index(fields=['day', 'status'], name='booking_rollup_day_idx')]
+
+    def __str__(self):
+        return f"{self.day} {self.provider_id}/{self.service_id} {self.status}: {self.booking_count}"
+
+
+class RevenueLeaderboard(models.Model):
+    """
+    Revenue per provider or service within one day, week or month.
+
+    Maintained alongside the daily rollups (see admins/rollups.py); the top-N
+    for a period is an index range read ordered by ``gross``.
+    """
+    PERIOD_CHOICES = [
+        ('day', 'Day'),
+        ('week', 'Week'),
+        ('month', 'Month'),
+    ]
+    KIND_CHOICES = [
+        ('provider', 'Provider'),
+        ('service', 'Service'),
+    ]
+
+    period = models.CharField(max_length=5, choices=PERIOD_CHOICES)
+    period_start = models.DateField()
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    subject_id = models.BigIntegerField()  # provider or service id, per ``kind``
+    gross = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    transaction_count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('period', 'period_start', 'kind', 'subject_id')
+        indexes = [
+            models.Index(fields=['period', 'kind', 'period_start', '-gross'], name='leaderboard_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.period} {self.period_start} {self.kind} {self.subject_id}: {self.gross}"
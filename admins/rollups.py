@@ -0,0 +1,322 @@
+"""
+Daily rollups behind the admin analytics endpoints.
+
+``DailyRevenueRollup`` and ``DailyBookingRollup`` are bumped incrementally by
+the signals in ``admins/signals.py`` and can be rebuilt from raw rows with
+``manage.py rebuild_rollups``. Readers answer whole days from the rollups
+and only touch raw ``Transaction``/``Booking`` rows for the partial days at
+either end of a range, so cost no longer grows with history.
+
+``RevenueLeaderboard`` holds the same revenue per provider and per service
+for each day, week (from Monday) and month, bumped together with the daily
+rollup, so a period's top-N is read without aggregating anything.
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from bookings.models import Booking, Transaction
+
+from .cache import invalidate_history
+from accounts.models import User
+from services.models import Service
+
+from .models import DailyBookingRollup, DailyRevenueRollup, RevenueLeaderboard
+
+LEADERBOARD_KINDS = {
+    # kind -> (model, display field)
+    "provider": (User, "full_name"),
+    "service": (Service, "title"),
+}
+
+
+def day_of(dt):
+    return timezone.localdate(dt) if timezone.is_aware(dt) else dt.date()
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def period_start(period, day):
+    if period == "week":
+        return day - timedelta(days=day.weekday())
+    if period == "month":
+        return day.replace(day=1)
+    return day
+
+
+def period_end(period, start):
+    """First day after the period beginning at ``start``."""
+    if period == "week":
+        return start + timedelta(days=7)
+    if period == "month":
+        return (start + timedelta(days=31)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def _bump(model, keys, **deltas):
+    if keys["day"] < timezone.localdate():
+        # Closed-period analytics responses are cached forever; retire them
+        invalidate_history()
+    _upsert(model, keys, **deltas)
+
+
+def _upsert(model, keys, **deltas):
+    increments = {field: F(field) + delta for field, delta in deltas.items()}
+    if model.objects.filter(**keys).update(**increments):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**keys, **deltas)
+    except IntegrityError:
+        # Created concurrently by another writer; apply as an increment.
+        model.objects.filter(**keys).update(**increments)
+
+
+def bump_revenue(day, provider_id, service_id, amount, count):
+    _bump(
+        DailyRevenueRollup,
+        {"day": day, "provider_id": provider_id, "service_id": service_id},
+        gross=amount, transaction_count=count,
+    )
+    for period in ("day", "week", "month"):
+        for kind, subject_id in (("provider", provider_id), ("service", service_id)):
+            _upsert(
+                RevenueLeaderboard,
+                {"period": period, "period_start": period_start(period, day), "kind": kind, "subject_id": subject_id},
+                gross=amount, transaction_count=count,
+            )
+
+
+def bump_bookings(day, provider_id, service_id, status, count):
+    _bump(
+        DailyBookingRollup,
+        {"day": day, "provider_id": provider_id, "service_id": service_id, "status": status},
+        booking_count=count,
+    )
+
+
+def rebuild(date_from=None, date_to=None):
+    """
+    Recompute rollups for ``[date_from, date_to]`` (whole history by default).
+    """
+    tx_qs = Transaction.objects.all()
+    booking_qs = Booking.objects.all()
+    revenue = DailyRevenueRollup.objects.all()
+    bookings = DailyBookingRollup.objects.all()
+    if date_from:
+        tx_qs = tx_qs.filter(created_at__gte=day_start(date_from))
+        booking_qs = booking_qs.filter(created_at__gte=day_start(date_from))
+        revenue = revenue.filter(day__gte=date_from)
+        bookings = bookings.filter(day__gte=date_from)
+    if date_to:
+        tx_qs = tx_qs.filter(created_at__lt=day_start(date_to + timedelta(days=1)))
+        booking_qs = booking_qs.filter(created_at__lt=day_start(date_to + timedelta(days=1)))
+        revenue = revenue.filter(day__lte=date_to)
+        bookings = bookings.filter(day__lte=date_to)
+
+    with transaction.atomic():
+        revenue.delete()
+        bookings.delete()
+        DailyRevenueRollup.objects.bulk_create(
+            DailyRevenueRollup(**row)
+            for row in tx_qs.annotate(day=TruncDate("created_at"))
+            .values("day", "provider_id", "service_id")
+            .annotate(gross=Sum("amount"), transaction_count=Count("id"))
+            .order_by()
+            .iterator()
+        )
+        DailyBookingRollup.objects.bulk_create(
+            DailyBookingRollup(**row)
+            for row in booking_qs.annotate(day=TruncDate("created_at"))
+            .values("day", "provider_id", "service_id", "status")
+            .annotate(booking_count=Count("id"))
+            .order_by()
+            .iterator()
+        )
+        rebuild_leaderboards(date_from, date_to)
+    invalidate_history()
+
+
+def rebuild_leaderboards(date_from=None, date_to=None):
+    """
+    Recompute leaderboards for every period touching ``[date_from, date_to]``
+    from the daily revenue rollups.
+    """
+    truncs = {"day": None, "week": TruncWeek, "month": TruncMonth}
+    with transaction.atomic():
+        for period, trunc in truncs.items():
+            entries = RevenueLeaderboard.objects.filter(period=period)
+            days = DailyRevenueRollup.objects.all()
+            if date_from:
+                first = period_start(period, date_from)
+                entries = entries.filter(period_start__gte=first)
+                days = days.filter(day__gte=first)
+            if date_to:
+                last = period_start(period, date_to)
+                entries = entries.filter(period_start__lte=last)
+                days = days.filter(day__lt=period_end(period, last))
+            entries.delete()
+
+            days = days.annotate(bucket=trunc("day") if trunc else F("day"))
+            for kind in LEADERBOARD_KINDS:
+                RevenueLeaderboard.objects.bulk_create(
+                    RevenueLeaderboard(
+                        period=period, period_start=row["bucket"], kind=kind,
+                        subject_id=row[f"{kind}_id"], gross=row["gross"], transaction_count=row["count"],
+                    )
+                    for row in days.values("bucket", f"{kind}_id")
+                    .annotate(gross=Sum("gross"), count=Sum("transaction_count"))
+                    .order_by()
+                    .iterator()
+                )
+
+
+def split_range(date_from, date_to):
+    """
+    Split the inclusive ``created_at`` range into whole days and raw edges.
+
+    Returns ``(first_day, last_day, edges)``: rollups cover ``first_day`` to
+    ``last_day`` inclusive (``None`` when no whole day fits) and ``edges`` is
+    a list of ``(start, end, end_inclusive)`` datetime ranges to read raw.
+    """
+    first_day = day_of(date_from)
+    if day_start(first_day) < date_from:
+        first_day += timedelta(days=1)
+    end_day = day_of(date_to)  # rollups stop before this day's midnight
+    if date_to + timedelta(microseconds=1) >= day_start(end_day + timedelta(days=1)):
+        end_day += timedelta(days=1)  # ends on a day's last instant: that day is whole
+    if first_day >= end_day:
+        return None, None, [(date_from, date_to, True)]
+
+    edges = []
+    if date_from < day_start(first_day):
+        edges.append((date_from, day_start(first_day), False))
+    if day_start(end_day) <= date_to:
+        edges.append((day_start(end_day), date_to, True))
+    return first_day, end_day - timedelta(days=1), edges
+
+
+def _edge_filter(queryset, edges):
+    for start, end, inclusive in edges:
+        lookup = "created_at__lte" if inclusive else "created_at__lt"
+        yield queryset.filter(created_at__gte=start, **{lookup: end})
+
+
+def revenue_totals(date_from, date_to):
+    """
+    ``(gross, transaction_count)`` for the range.
+    """
+    first_day, last_day, edges = split_range(date_from, date_to)
+    gross, count = Decimal("0"), 0
+    if first_day:
+        row = DailyRevenueRollup.objects.filter(day__range=(first_day, last_day)).aggregate(
+            gross=Sum("gross"), count=Sum("transaction_count")
+        )
+        gross += row["gross"] or 0
+        count += row["count"] or 0
+    for qs in _edge_filter(Transaction.objects.all(), edges):
+        row = qs.aggregate(gross=Sum("amount"), count=Count("id"))
+        gross += row["gross"] or 0
+        count += row["count"]
+    return gross, count
+
+
+def booking_status_counts(date_from, date_to):
+    first_day, last_day, edges = split_range(date_from, date_to)
+    counts = {}
+    if first_day:
+        rows = (
+            DailyBookingRollup.objects.filter(day__range=(first_day, last_day))
+            .values("status").annotate(count=Sum("booking_count")).order_by()
+        )
+        for row in rows:
+            counts[row["status"]] = counts.get(row["status"], 0) + row["count"]
+    for qs in _edge_filter(Booking.objects.all(), edges):
+        for row in qs.values("status").annotate(count=Count("id")).order_by():
+            counts[row["status"]] = counts.get(row["status"], 0) + row["count"]
+    return {status: count for status, count in counts.items() if count}
+
+
+def revenue_series(date_from, date_to, trunc):
+    """
+    ``{bucket_date: gross}`` where ``trunc`` is TruncDay/TruncWeek/TruncMonth.
+    """
+    first_day, last_day, edges = split_range(date_from, date_to)
+    series = {}
+
+    def add(bucket, gross):
+        if isinstance(bucket, datetime):
+            bucket = day_of(bucket)
+        series[bucket] = series.get(bucket, Decimal("0")) + (gross or 0)
+
+    if first_day:
+        rows = (
+            DailyRevenueRollup.objects.filter(day__range=(first_day, last_day))
+            .annotate(bucket=trunc("day")).values("bucket")
+            .annotate(gross=Sum("gross")).order_by()
+        )
+        for row in rows:
+            add(row["bucket"], row["gross"])
+    for qs in _edge_filter(Transaction.objects.all(), edges):
+        for row in qs.annotate(bucket=trunc("created_at")).values("bucket").annotate(gross=Sum("amount")).order_by():
+            add(row["bucket"], row["gross"])
+    return series
+
+
+def top_revenue(date_from, date_to, key, label, limit):
+    """
+    Top ``key`` (``"provider"`` or ``"service"``) by gross revenue.
+
+    Returns ``[{id, label, total, count}, ...]``; ``label`` is the related
+    field used for the display name (``"provider__full_name"`` etc.).
+    """
+    first_day, last_day, edges = split_range(date_from, date_to)
+    totals = {}
+
+    def add(rows, gross_field, count_field):
+        for row in rows:
+            entry = totals.setdefault(row[f"{key}_id"], {
+                "id": row[f"{key}_id"], "label": row[label], "total": Decimal("0"), "count": 0,
+            })
+            entry["total"] += row[gross_field] or 0
+            entry["count"] += row[count_field] or 0
+
+    if first_day:
+        add(
+            DailyRevenueRollup.objects.filter(day__range=(first_day, last_day))
+            .values(f"{key}_id", label)
+            .annotate(total=Sum("gross"), count=Sum("transaction_count")).order_by(),
+            "total", "count",
+        )
+    for qs in _edge_filter(Transaction.objects.all(), edges):
+        add(
+            qs.values(f"{key}_id", label).annotate(total=Sum("amount"), count=Count("id")).order_by(),
+            "total", "count",
+        )
+    return sorted(totals.values(), key=lambda entry: entry["total"], reverse=True)[:limit]
+
+
+def leaderboard(period, start, kind, limit):
+    """
+    Top ``limit`` providers or services for the period beginning at ``start``,
+    in the same shape as ``top_revenue``.
+    """
+    rows = list(
+        RevenueLeaderboard.objects.filter(
+            period=period, kind=kind, period_start=start, transaction_count__gt=0
+        ).order_by("-gross", "subject_id")[:limit]
+    )
+    model, label = LEADERBOARD_KINDS[kind]
+    labels = dict(model.objects.filter(pk__in=[row.subject_id for row in rows]).values_list("pk", label))
+    return [{
+        "id": row.subject_id,
+        "label": labels.get(row.subject_id),
+        "total": row.gross,
+        "count": row.transaction_count,
+    } for row in rows]
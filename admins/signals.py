@@ -0,0 +1,105 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from accounts.models import User
+from bookings.models import Booking, Transaction
+from services.models import Service
+
+from . import rollups
+from .cache import invalidate_history, invalidate_live
+
+
+def _previous(model, instance, fields):
+    if not instance.pk:
+        return None
+    return model.objects.filter(pk=instance.pk).values(*fields).first()
+
+
+@receiver(pre_save, sender=Transaction)
+def remember_transaction(sender, instance, **kwargs):
+    instance._rollup_previous = _previous(
+        Transaction, instance, ("created_at", "provider_id", "service_id", "amount")
+    )
+
+
+@receiver(post_save, sender=Transaction)
+def roll_up_transaction(sender, instance, **kwargs):
+    old = getattr(instance, "_rollup_previous", None)
+    if old:
+        if (
+            rollups.day_of(old["created_at"]) == rollups.day_of(instance.created_at)
+            and (old["provider_id"], old["service_id"], old["amount"])
+            == (instance.provider_id, instance.service_id, instance.amount)
+        ):
+            return
+        rollups.bump_revenue(
+            rollups.day_of(old["created_at"]), old["provider_id"], old["service_id"], -old["amount"], -1
+        )
+    rollups.bump_revenue(
+        rollups.day_of(instance.created_at), instance.provider_id, instance.service_id, instance.amount, 1
+    )
+
+
+@receiver(post_delete, sender=Transaction)
+def unroll_transaction(sender, instance, **kwargs):
+    rollups.bump_revenue(
+        rollups.day_of(instance.created_at), instance.provider_id, instance.service_id, -instance.amount, -1
+    )
+
+
+@receiver(pre_save, sender=Booking)
+def remember_booking(sender, instance, **kwargs):
+    instance._rollup_previous = _previous(
+        Booking, instance, ("created_at", "provider_id", "service_id", "status")
+    )
+
+
+@receiver(post_save, sender=Booking)
+def roll_up_booking(sender, instance, **kwargs):
+    old = getattr(instance, "_rollup_previous", None)
+    new_key = (rollups.day_of(instance.created_at), instance.provider_id, instance.service_id, instance.status)
+    if old:
+        old_key = (rollups.day_of(old["created_at"]), old["provider_id"], old["service_id"], old["status"])
+        if old_key == new_key:
+            return
+        rollups.bump_bookings(*old_key, -1)
+    rollups.bump_bookings(*new_key, 1)
+
+
+@receiver(post_delete, sender=Booking)
+def unroll_booking(sender, instance, **kwargs):
+    rollups.bump_bookings(
+        rollups.day_of(instance.created_at), instance.provider_id, instance.service_id, instance.status, -1
+    )
+
+
+@receiver(pre_save, sender=User)
+def remember_user_name(sender, instance, **kwargs):
+    instance._analytics_previous = _previous(User, instance, ("full_name",))
+
+
+@receiver(post_save, sender=User)
+def refresh_user_totals(sender, instance, created, **kwargs):
+    # total_users and provider names in cached summaries and leaderboards
+    old = getattr(instance, "_analytics_previous", None)
+    if created or (old and old["full_name"] != instance.full_name):
+        invalidate_live()
+
+
+@receiver(post_delete, sender=User)
+def forget_user(sender, instance, **kwargs):
+    # Cached closed-period summaries count the users who joined in them
+    invalidate_history()
+    invalidate_live()
+
+
+@receiver(pre_save, sender=Service)
+def remember_service_title(sender, instance, **kwargs):
+    instance._analytics_previous = _previous(Service, instance, ("title",))
+
+
+@receiver(post_save, sender=Service)
+def refresh_service_titles(sender, instance, **kwargs):
+    old = getattr(instance, "_analytics_previous", None)
+    if old and old["title"] != instance.title:
+        invalidate_live()
@@ -1,3 +1,315 @@
-from django.test import TestCase
+import io
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db.models import Sum
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from bookings.models import Booking, Transaction, Wallet
+from bookings.tests import BookingFixtureMixin, QueryPlanAssertions
+
+from . import rollups
+from .models import DailyBookingRollup, DailyRevenueRollup, RevenueLeaderboard
+
+
+@override_settings(CACHES={
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "analytics": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"},
+})
+class AdminAnalyticsQueryPlanTests(QueryPlanAssertions, BookingFixtureMixin, TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        wallet = Wallet.objects.create(user=self.customer)
+        now = timezone.now()
+        for days in range(0, 60, 3):
+            when = now - timedelta(days=days, hours=5)
+            Transaction.objects.create(
+                wallet=wallet, amount=Decimal("25.00"), transaction_type="payment",
+                service=self.services[0], customer=self.customer, provider=self.provider,
+                created_at=when,
+            )
+            Booking.objects.create(
+                service=self.services[0], customer=self.customer, provider=self.provider,
+                scheduled_date=when, price=Decimal("25.00"), created_at=when,
+            )
+        self.period = "from={}&to={}".format(
+            (now - timedelta(days=45)).date().isoformat(), now.date().isoformat()
+        )
+
+    def test_summary(self):
+        # total_users is a plain COUNT(*) over accounts_user
+        self.assertNoFullTableScans(
+            lambda: self.client.get(f"/api/admin/summary/?{self.period}"), allow={"accounts_user"}
+        )
+
+    def test_timeseries(self):
+        for granularity in ("day", "week", "month"):
+            self.assertNoFullTableScans(
+                lambda: self.client.get(f"/api/admin/timeseries/?{self.period}&granularity={granularity}")
+            )
+
+    def test_top(self):
+        for by in ("providers", "services"):
+            self.assertNoFullTableScans(lambda: self.client.get(f"/api/admin/top/?{self.period}&by={by}"))
+
+    def test_top_standard_periods(self):
+        for period in ("day", "week", "month"):
+            for by in ("providers", "services"):
+                self.assertNoFullTableScans(
+                    lambda: self.client.get(f"/api/admin/top/?period={period}&by={by}")
+                )
+
+    def test_leaderboards_match_raw_transactions(self):
+        from admins import rollups
+
+        for period in ("day", "week", "month"):
+            start = rollups.period_start(period, timezone.localdate() - timedelta(days=3))
+            response = self.client.get(f"/api/admin/top/?period={period}&date={start.isoformat()}")
+            expected = Transaction.objects.filter(
+                created_at__gte=rollups.day_start(start),
+                created_at__lt=rollups.day_start(rollups.period_end(period, start)),
+            ).aggregate(total=Sum("amount"))["total"]
+            items = response.json()["items"]
+            self.assertEqual(sum(Decimal(item["revenue"]) for item in items), expected or 0)
+
+    def test_limit_is_bounded(self):
+        from admins.views import TOP_MAX_LIMIT
+
+        response = self.client.get("/api/admin/top/?period=month&limit=100000")
+        self.assertEqual(response.json()["limit"], TOP_MAX_LIMIT)
+        response = self.client.get("/api/admin/top/?limit=oops")
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(CACHES={
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "analytics": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "admin-analytics-tests"},
+})
+class AdminAnalyticsCacheTests(BookingFixtureMixin, TestCase):
+
+    def setUp(self):
+        caches["analytics"].clear()
+        self.client = APIClient()
+        self.wallet = Wallet.objects.create(user=self.customer)
+        self.last_week = timezone.now() - timedelta(days=7)
+        self.pay(self.last_week)
+        day = timezone.localdate(self.last_week).isoformat()
+        self.closed = f"from={day}&to={day}"
+
+    def pay(self, when, amount="25.00"):
+        Transaction.objects.create(
+            wallet=self.wallet, amount=Decimal(amount), transaction_type="payment",
+            service=self.services[0], customer=self.customer, provider=self.provider, created_at=when,
+        )
+
+    def test_closed_period_served_from_cache(self):
+        first = self.client.get(f"/api/admin/timeseries/?{self.closed}")
+        with self.assertNumQueries(0):
+            second = self.client.get(f"/api/admin/timeseries/?{self.closed}")
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(first["ETag"], second["ETag"])
+
+    def test_conditional_gets(self):
+        response = self.client.get(f"/api/admin/timeseries/?{self.closed}")
+        with self.assertNumQueries(0):
+            not_modified = self.client.get(
+                f"/api/admin/timeseries/?{self.closed}", HTTP_IF_NONE_MATCH=response["ETag"]
+            )
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified["ETag"], response["ETag"])
+        since = self.client.get(
+            f"/api/admin/timeseries/?{self.closed}", HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+        )
+        self.assertEqual(since.status_code, 304)
+        stale = self.client.get(f"/api/admin/timeseries/?{self.closed}", HTTP_IF_NONE_MATCH='"stale"')
+        self.assertEqual(stale.status_code, 200)
+
+    def test_backdated_write_retires_closed_periods(self):
+        before = self.client.get(f"/api/admin/summary/?{self.closed}").json()
+        self.pay(self.last_week)
+        after = self.client.get(f"/api/admin/summary/?{self.closed}").json()
+        self.assertEqual(before["transactions"]["count"] + 1, after["transactions"]["count"])
+
+    def test_open_period_cached_until_its_bucket_ends(self):
+        url = "/api/admin/summary/"
+        before = self.client.get(url).json()
+        self.pay(timezone.now())  # today's rollup: no history bump
+        self.assertEqual(self.client.get(url).json()["transactions"], before["transactions"])
+        later = timezone.now() + timedelta(seconds=settings.ANALYTICS_CACHE_OPEN_TTL)
+        with mock.patch("admins.cache.timezone.now", return_value=later), \
+                mock.patch("admins.views.timezone.now", return_value=later):
+            after = self.client.get(url).json()
+        self.assertEqual(after["transactions"]["count"], before["transactions"]["count"] + 1)
+
+    def test_user_totals_and_names_are_versioned(self):
+        summary = self.client.get(f"/api/admin/summary/?{self.closed}")
+        top = self.client.get(f"/api/admin/top/?{self.closed}")
+        self.assertEqual(top.json()["items"][0]["provider_name"], "Provider")
+        for url, response in (("summary", summary), ("top", top)):
+            with self.assertNumQueries(0):
+                not_modified = self.client.get(
+                    f"/api/admin/{url}/?{self.closed}", HTTP_IF_NONE_MATCH=response["ETag"]
+                )
+            self.assertEqual(not_modified.status_code, 304)
+            self.assertIn("Last-Modified", not_modified)
+
+        User.objects.create(telegram_id="299")
+        fresh = self.client.get(f"/api/admin/summary/?{self.closed}", HTTP_IF_NONE_MATCH=summary["ETag"])
+        self.assertEqual(fresh.status_code, 200)
+        self.assertEqual(fresh.json()["users"]["total_users"], summary.json()["users"]["total_users"] + 1)
+
+        self.provider.full_name = "Renamed"
+        self.provider.save()
+        renamed = self.client.get(f"/api/admin/top/?{self.closed}", HTTP_IF_NONE_MATCH=top["ETag"])
+        self.assertEqual(renamed.status_code, 200)
+        self.assertEqual(renamed.json()["items"][0]["provider_name"], "Renamed")
+
+        by_service = f"/api/admin/top/?{self.closed}&by=services"
+        self.assertNotEqual(self.client.get(by_service).json()["items"][0]["service_title"], "Retitled")
+        self.services[0].title = "Retitled"
+        self.services[0].save()
+        self.assertEqual(self.client.get(by_service).json()["items"][0]["service_title"], "Retitled")
+
+
+class RollupMaintenanceTests(BookingFixtureMixin, TestCase):
+    """
+    The incrementally maintained rollups must always equal a fresh aggregate
+    over the raw rows.
+    """
+
+    def setUp(self):
+        self.wallet = Wallet.objects.create(user=self.customer)
+        self.now = timezone.now()
+
+    def pay(self, when, amount="25.00", service=None):
+        return Transaction.objects.create(
+            wallet=self.wallet, amount=Decimal(amount), transaction_type="payment",
+            service=service or self.services[0], customer=self.customer, provider=self.provider, created_at=when,
+        )
+
+    def book(self, when, service=None):
+        return Booking.objects.create(
+            service=service or self.services[0], customer=self.customer, provider=self.provider,
+            scheduled_date=when, price=Decimal("100.00"), created_at=when,
+        )
+
+    def assertRollupsMatchRawRows(self):
+        revenue, bookings = {}, {}
+        for tx in Transaction.objects.all():
+            key = (timezone.localdate(tx.created_at), tx.provider_id, tx.service_id)
+            gross, count = revenue.get(key, (Decimal("0"), 0))
+            revenue[key] = (gross + tx.amount, count + 1)
+        for booking in Booking.objects.all():
+            key = (timezone.localdate(booking.created_at), booking.provider_id, booking.service_id, booking.status)
+            bookings[key] = bookings.get(key, 0) + 1
+        self.assertEqual({
+            (r.day, r.provider_id, r.service_id): (r.gross, r.transaction_count)
+            for r in DailyRevenueRollup.objects.exclude(transaction_count=0)
+        }, revenue)
+        self.assertEqual({
+            (r.day, r.provider_id, r.service_id, r.status): r.booking_count
+            for r in DailyBookingRollup.objects.exclude(booking_count=0)
+        }, bookings)
+
+    def test_status_moves_edits_and_deletes(self):
+        old = self.book(self.now - timedelta(days=3))
+        new = self.book(self.now)
+        self.book(self.now, service=self.services[1])
+        old.status = "in_progress"
+        old.save()
+        old.status = "completed"
+        old.save()
+        new.status = "cancelled"
+        new.save()
+        new.created_at = self.now - timedelta(days=9)  # backdated
+        new.save()
+        old.delete()
+
+        moved = self.pay(self.now - timedelta(days=2))
+        removed = self.pay(self.now, amount="40.00", service=self.services[2])
+        self.pay(self.now)
+        moved.amount = Decimal("30.00")
+        moved.service = self.services[1]
+        moved.save()
+        removed.delete()
+        self.assertRollupsMatchRawRows()
+
+    def test_split_range_boundaries(self):
+        day = timezone.localdate(self.now) - timedelta(days=5)
+        midnight = rollups.day_start(day)
+        for when in (midnight - timedelta(microseconds=1), midnight, midnight + timedelta(hours=13),
+                     midnight + timedelta(days=2), rollups.day_start(day + timedelta(days=3))):
+            self.pay(when)
+
+        self.assertEqual(rollups.split_range(midnight, midnight + timedelta(hours=6)),
+                         (None, None, [(midnight, midnight + timedelta(hours=6), True)]))
+        first, last, edges = rollups.split_range(midnight + timedelta(hours=1), midnight + timedelta(days=3))
+        self.assertEqual((first, last), (day + timedelta(days=1), day + timedelta(days=2)))
+        self.assertEqual(edges, [
+            (midnight + timedelta(hours=1), midnight + timedelta(days=1), False),
+            (rollups.day_start(day + timedelta(days=3)), midnight + timedelta(days=3), True),
+        ])
+
+        ranges = [
+            (midnight, rollups.day_start(day + timedelta(days=3))),
+            (midnight - timedelta(hours=2), midnight + timedelta(hours=13)),
+            (midnight + timedelta(hours=13), midnight + timedelta(days=2, hours=1)),
+            (midnight - timedelta(microseconds=1), midnight - timedelta(microseconds=1)),
+        ]
+        for date_from, date_to in ranges:
+            raw = Transaction.objects.filter(created_at__gte=date_from, created_at__lte=date_to)
+            expected = raw.aggregate(total=Sum("amount"))["total"] or Decimal("0")
+            self.assertEqual(rollups.revenue_totals(date_from, date_to), (expected, raw.count()), (date_from, date_to))
+
+    def test_standard_periods_stop_before_the_next_period(self):
+        day = timezone.localdate(self.now) - timedelta(days=3)
+        self.pay(rollups.day_start(day) + timedelta(hours=9))
+        self.pay(rollups.day_start(day + timedelta(days=1)), amount="40.00")  # the next day's midnight
+
+        first, last, edges = rollups.split_range(
+            rollups.day_start(day), rollups.day_start(day + timedelta(days=1)) - timedelta(microseconds=1)
+        )
+        self.assertEqual((first, last, edges), (day, day, []))
+
+        client = APIClient()
+        query = f"period=day&date={day.isoformat()}"
+        summary = client.get(f"/api/admin/summary/?{query}").json()
+        series = client.get(f"/api/admin/timeseries/?{query}").json()["series"]
+        top = client.get(f"/api/admin/top/?{query}").json()["items"]
+        self.assertEqual(Decimal(summary["transactions"]["gross_revenue"]), Decimal("25.00"))
+        self.assertEqual([Decimal(bucket["gross"]) for bucket in series], [Decimal("25.00")])
+        self.assertEqual([Decimal(item["revenue"]) for item in top], [Decimal("25.00")])
+
+    def test_rebuild_command(self):
+        for days in (1, 8, 40):
+            self.pay(self.now - timedelta(days=days))
+            self.book(self.now - timedelta(days=days)).delete()
+            self.book(self.now - timedelta(days=days))
+        DailyRevenueRollup.objects.update(gross=0, transaction_count=7)  # drifted
+        DailyBookingRollup.objects.all().delete()
+        RevenueLeaderboard.objects.all().delete()
+
+        out = io.StringIO()
+        call_command("rebuild_rollups", stdout=out)
+        self.assertIn("Rollups rebuilt.", out.getvalue())
+        self.assertRollupsMatchRawRows()
+        self.assertEqual(
+            RevenueLeaderboard.objects.filter(period="day", kind="provider").aggregate(total=Sum("gross"))["total"],
+            Transaction.objects.aggregate(total=Sum("amount"))["total"],
+        )
+
+        # A partial rebuild leaves days outside its range alone
+        DailyRevenueRollup.objects.update(transaction_count=7)
+        recent = str(timezone.localdate(self.now - timedelta(days=1)))
+        call_command("rebuild_rollups", "--from", recent, "--to", recent, stdout=io.StringIO())
+        self.assertEqual(
+            sorted(DailyRevenueRollup.objects.values_list("transaction_count", flat=True)), [1, 7, 7]
+        )
@@ -1,23 +1,50 @@
 # config/yourapp/views_admin_dashboard.py
 from decimal import Decimal
 from datetime import timedelta
-from django.db.models import Sum, Count
 from django.db.models.functions import TruncDay, TruncWeek, TruncMonth
 from django.utils import timezone
 from rest_framework import viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from accounts.models import User  # adjust paths as needed
-from bookings.models import Transaction, Booking  # adjust paths as needed
+from config.routers import ReplicaReadsMixin
+from . import rollups
+from .cache import cached_analytics
 
 PLATFORM_FEE_RATE = Decimal("0.10")  # 10% platform cut
+TOP_DEFAULT_LIMIT = 5
+TOP_MAX_LIMIT = 50
+STANDARD_PERIODS = ("day", "week", "month")
+LAST_INSTANT = timedelta(microseconds=1)
+
+
+def standard_period(request):
+    """
+    ``(period, start_day)`` for ?period=day|week|month[&date=YYYY-MM-DD], else None.
+    ``date`` may be any day inside the period and defaults to today.
+    """
+    period = request.query_params.get("period")
+    if period not in STANDARD_PERIODS:
+        return None
+    try:
+        day = timezone.datetime.fromisoformat(request.query_params["date"]).date()
+    except (KeyError, ValueError):
+        day = timezone.localdate()
+    return period, rollups.period_start(period, day)
 
 
 def parse_period(request):
     """
     Accepts optional ?from=YYYY-MM-DD&to=YYYY-MM-DD
+    or ?period=day|week|month[&date=YYYY-MM-DD] for one standard period
     Defaults: last 30 days [to=now, from=now-30d]
     """
+    standard = standard_period(request)
+    if standard:
+        period, start = standard
+        # "to" is inclusive: stop just before the next period's first instant
+        return rollups.day_start(start), rollups.day_start(rollups.period_end(period, start)) - LAST_INSTANT
+
     to_param = request.query_params.get("to")
     from_param = request.query_params.get("from")
 
@@ -43,26 +70,25 @@ def parse_period(request):
     return frm_dt, to_dt
 
 
-class AdminDashboardViewSet(viewsets.ViewSet):
+class AdminDashboardViewSet(ReplicaReadsMixin, viewsets.ViewSet):
     """
     Admin-only analytics for the platform.
     """
     @action(detail=False, methods=["get"])
+    @cached_analytics(live=True)
     def summary(self, request):
         """
         High-level summary for a period (transaction-based + bookings + users).
         """
         date_from, date_to = parse_period(request)
 
-        # Transactions
-        tx_qs = Transaction.objects.filter(created_at__range=(date_from, date_to))
-        gross_revenue = tx_qs.aggregate(total=Sum("amount"))["total"] or Decimal("0")
+        # Transactions (daily rollups + raw rows for partial edge days)
+        gross_revenue, tx_count = rollups.revenue_totals(date_from, date_to)
         platform_profit = (gross_revenue * PLATFORM_FEE_RATE).quantize(Decimal("0.01"))
         providers_take = (gross_revenue - platform_profit).quantize(Decimal("0.01"))
 
         # Bookings
-        bookings_qs = Booking.objects.filter(created_at__range=(date_from, date_to))
-        booking_status_counts = bookings_qs.values("status").annotate(count=Count("id"))
+        status_counts = rollups.booking_status_counts(date_from, date_to)
 
         # Users
         new_users_count = User.objects.filter(joined_at__range=(date_from, date_to)).count()
@@ -74,11 +100,11 @@ class AdminDashboardViewSet(viewsets.ViewSet):
                 "gross_revenue": str(gross_revenue),
                 "platform_profit": str(platform_profit),
                 "providers_take": str(providers_take),
-                "count": tx_qs.count(),
+                "count": tx_count,
             },
             "bookings": {
-                "total": bookings_qs.count(),
-                "status_counts": {b["status"]: b["count"] for b in booking_status_counts}
+                "total": sum(status_counts.values()),
+                "status_counts": status_counts
             },
             "users": {
                 "new_users": new_users_count,
@@ -87,6 +113,7 @@ class AdminDashboardViewSet(viewsets.ViewSet):
         })
 
     @action(detail=False, methods=["get"])
+    @cached_analytics
     def timeseries(self, request):
         """
         Time-series revenue/profit over a period.
@@ -101,26 +128,15 @@ class AdminDashboardViewSet(viewsets.ViewSet):
         elif granularity == "month":
             trunc = TruncMonth
 
-        tx_qs = Transaction.objects.filter(
-            created_at__range=(date_from, date_to)
-            
-        )
-
-        series = (
-            tx_qs
-            .annotate(bucket=trunc("created_at"))
-            .values("bucket")
-            .annotate(gross=Sum("amount"))
-            .order_by("bucket")
-        )
+        series = rollups.revenue_series(date_from, date_to, trunc)
 
         results = []
-        for row in series:
-            gross = row["gross"] or Decimal("0")
+        for bucket in sorted(series):
+            gross = series[bucket]
             profit = (gross * PLATFORM_FEE_RATE).quantize(Decimal("0.01"))
             take = (gross - profit).quantize(Decimal("0.01"))
             results.append({
-                "bucket": row["bucket"],
+                "bucket": rollups.day_start(bucket),
                 "gross": str(gross),
                 "platform_profit": str(profit),
                 "providers_take": str(take),
@@ -133,49 +149,47 @@ class AdminDashboardViewSet(viewsets.ViewSet):
         })
 
     @action(detail=False, methods=["get"])
+    @cached_analytics(live=True)
     def top(self, request):
         """
         Top providers/services by revenue (from transactions).
-        ?by=providers|services&limit=5
+        ?by=providers|services&limit=5 (at most TOP_MAX_LIMIT)
+        Standard periods (?period=day|week|month) are read from the leaderboards.
         """
         date_from, date_to = parse_period(request)
-        limit = int(request.query_params.get("limit", 5))
+        try:
+            limit = int(request.query_params.get("limit", TOP_DEFAULT_LIMIT))
+        except ValueError:
+            limit = TOP_DEFAULT_LIMIT
+        limit = min(max(limit, 1), TOP_MAX_LIMIT)
         by = request.query_params.get("by", "providers")
+        standard = standard_period(request)
 
-        tx_qs = Transaction.objects.filter(
-            created_at__range=(date_from, date_to)
-            
-        )
+        key, label = ("service", "service__title") if by == "services" else ("provider", "provider__full_name")
+        if standard:
+            data = rollups.leaderboard(*standard, key, limit)
+        else:
+            data = rollups.top_revenue(date_from, date_to, key, label, limit)
 
         if by == "services":
-            data = (
-                tx_qs
-                .values("service_id", "service__title")
-                .annotate(total=Sum("amount"), count=Count("id"))
-                .order_by("-total")[:limit]
-            )
             items = [{
-                "service_id": r["service_id"],
-                "service_title": r["service__title"],
-                "revenue": str(r["total"] or 0),
+                "service_id": r["id"],
+                "service_title": r["label"],
+                "revenue": str(r["total"]),
                 "transactions": r["count"],
             } for r in data]
         else:  # default providers
-            data = (
-                tx_qs
-                .values("provider_id", "provider__full_name")
-                .annotate(total=Sum("amount"), count=Count("id"))
-                .order_by("-total")[:limit]
-            )
             items = [{
-                "provider_id": r["provider_id"],
-                "provider_name": r["provider__full_name"],
-                "revenue": str(r["total"] or 0),
+                "provider_id": r["id"],
+                "provider_name": r["label"],
+                "revenue": str(r["total"]),
                 "transactions": r["count"],
             } for r in data]
 
         return Response({
             "range": {"from": date_from, "to": date_to},
+            "period": standard[0] if standard else None,
             "by": by,
+            "limit": limit,
             "items": items,
         })
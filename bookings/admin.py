@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Booking, Wallet, Transaction
+from .models import Booking, Wallet, Transaction, WalletCheckpoint, ProviderAvailability
 
 @admin.register(Booking)
 class BookingAdmin(admin.ModelAdmin):
@@ -21,3 +21,15 @@ class TransactionAdmin(admin.ModelAdmin):
     list_filter = ('transaction_type',)
     search_fields = ('wallet__user__username', 'description')
     ordering = ('-created_at',)
+
+
+@admin.register(WalletCheckpoint)
+class WalletCheckpointAdmin(admin.ModelAdmin):
+    list_display = ('id', 'wallet', 'balance', 'last_transaction_id', 'created_at')
+    ordering = ('-created_at',)
+
+
+@admin.register(ProviderAvailability)
+class ProviderAvailabilityAdmin(admin.ModelAdmin):
+    list_display = ('id', 'provider', 'weekday', 'start_time', 'end_time')
+    list_filter = ('weekday',)
@@ -0,0 +1,115 @@
+"""
+Provider availability and double-booking detection.
+
+Every booking occupies ``BOOKING_SLOT_MINUTES`` from its ``scheduled_date``.
+With a fixed length, two bookings overlap exactly when their start times are
+less than one slot apart, so both the conflict check and the free-slot
+listing are plain range scans on ``booking_provider_sched_idx``
+(provider, scheduled_date).
+"""
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from accounts.models import User
+from .models import Booking, ProviderAvailability
+
+# Statuses that hold on to their slot
+ACTIVE_STATUSES = ('pending', 'confirmed', 'in_progress')
+
+
+class SlotUnavailable(Exception):
+    pass
+
+
+def slot_length():
+    return timedelta(minutes=getattr(settings, 'BOOKING_SLOT_MINUTES', 60))
+
+
+def conflicting_bookings(provider_id, start, exclude_id=None):
+    """Active bookings of ``provider_id`` overlapping the slot starting at ``start``."""
+    length = slot_length()
+    queryset = Booking.objects.filter(
+        provider_id=provider_id,
+        scheduled_date__gt=start - length,
+        scheduled_date__lt=start + length,
+        status__in=ACTIVE_STATUSES,
+    )
+    if exclude_id is not None:
+        queryset = queryset.exclude(pk=exclude_id)
+    return queryset
+
+
+def _windows(provider_id, day):
+    """(has_any_windows, [(start, end), ...] for ``day``) from one query."""
+    rows = list(ProviderAvailability.objects.filter(provider_id=provider_id).values_list(
+        'weekday', 'start_time', 'end_time'
+    ))
+    weekday = day.weekday()
+    return bool(rows), [(start, end) for wd, start, end in rows if wd == weekday]
+
+
+def within_availability(provider_id, start):
+    local = timezone.localtime(start)
+    has_windows, windows = _windows(provider_id, local.date())
+    if not has_windows:
+        return True
+    end = (local + slot_length()).time()
+    if end <= local.time():
+        # slot crosses midnight; windows never do
+        return False
+    return any(w_start <= local.time() and end <= w_end for w_start, w_end in windows)
+
+
+def reserve(provider_id, start, exclude_id=None):
+    """
+    Check that ``provider_id`` can take a booking at ``start``.
+
+    Call inside ``transaction.atomic()`` and write the booking in the same
+    block: the provider row lock serializes concurrent reservations for one
+    provider, so the check and the insert cannot interleave.
+    """
+    list(User.objects.select_for_update().filter(pk=provider_id).values_list('pk'))
+    if not within_availability(provider_id, start):
+        raise SlotUnavailable("The provider is not available at this time.")
+    if conflicting_bookings(provider_id, start, exclude_id).exists():
+        raise SlotUnavailable("The provider already has a booking at this time.")
+
+
+def free_slots(provider_id, day, now=None):
+    """
+    Bookable slot start times for ``provider_id`` on ``day``.
+
+    Occupancy comes from a single range scan over the day's bookings; candidate
+    starts step through each availability window one slot at a time.
+    """
+    now = now or timezone.now()
+    length = slot_length()
+    _, windows = _windows(provider_id, day)
+    if not windows:
+        return []
+
+    tz = timezone.get_current_timezone()
+    day_start = timezone.make_aware(datetime.combine(day, datetime.min.time()), tz)
+    taken = list(
+        Booking.objects.filter(
+            provider_id=provider_id,
+            scheduled_date__gt=day_start - length,
+            scheduled_date__lt=day_start + timedelta(days=1),
+            status__in=ACTIVE_STATUSES,
+        ).order_by('scheduled_date').values_list('scheduled_date', flat=True)
+    )
+
+    slots = []
+    for w_start, w_end in windows:
+        start = timezone.make_aware(datetime.combine(day, w_start), tz)
+        end = timezone.make_aware(datetime.combine(day, w_end), tz)
+        while start + length <= end:
+            # first booking starting after start - length; it conflicts if it starts before start + length
+            i = bisect_left(taken, start - length + timedelta(microseconds=1))
+            if start >= now and (i == len(taken) or taken[i] >= start + length):
+                slots.append(start)
+            start += length
+    return sorted(slots)
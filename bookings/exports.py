@@ -0,0 +1,87 @@
+"""
+Streaming CSV / NDJSON exports of transactions and bookings.
+
+Rows are read with ``values()`` and ``iterator(chunk_size=...)`` and encoded
+one at a time, so memory stays flat however many rows are exported.
+"""
+import csv
+import json
+from datetime import date, datetime, time, timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .models import Booking, Transaction
+
+CHUNK_SIZE = 2000
+
+DATASETS = {
+    "transactions": (
+        Transaction,
+        [
+            "id", "created_at", "transaction_type", "amount", "wallet_id",
+            "customer_id", "provider_id", "service_id", "service__title",
+            "reference_id", "description",
+        ],
+    ),
+    "bookings": (
+        Booking,
+        [
+            "id", "created_at", "scheduled_date", "status", "price",
+            "service_id", "service__title", "customer_id", "customer__telegram_id",
+            "provider_id", "provider__telegram_id", "notes",
+        ],
+    ),
+}
+FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def parse_day(value):
+    if not value:
+        return None
+    return date.fromisoformat(value)
+
+
+def export_rows(dataset, date_from=None, date_to=None):
+    """
+    Yield ``dict`` rows of ``dataset`` created within ``[date_from, date_to]``.
+    """
+    model, fields = DATASETS[dataset]
+    queryset = model.objects.all()
+    if date_from:
+        queryset = queryset.filter(created_at__gte=timezone.make_aware(datetime.combine(date_from, time.min)))
+    if date_to:
+        end = timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min))
+        queryset = queryset.filter(created_at__lt=end)
+    return queryset.order_by("created_at", "id").values(*fields).iterator(chunk_size=CHUNK_SIZE)
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def encode_csv(dataset, rows):
+    _, fields = DATASETS[dataset]
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow([row[field] for field in fields])
+
+
+def encode_ndjson(dataset, rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + "\n"
+
+
+ENCODERS = {
+    "csv": encode_csv,
+    "ndjson": encode_ndjson,
+}
+
+
+def stream(dataset, fmt, date_from=None, date_to=None):
+    return ENCODERS[fmt](dataset, export_rows(dataset, date_from, date_to))
@@ -0,0 +1,98 @@
+"""
+Wallet ledger: every balance change is a ``Transaction`` posted together with
+an atomic ``F()`` update of ``Wallet.balance``.
+
+The wallet row is updated before the transaction row is inserted, so the
+row lock taken by that UPDATE orders postings against checkpoints:
+``create_checkpoint`` locks the wallet and records the balance with the
+highest transaction id, and ``reconcile`` only has to sum the transactions
+after it.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Max, Sum, When
+
+from .models import Transaction, Wallet, WalletCheckpoint
+
+CREDIT_TYPES = ('deposit', 'refund')
+DEBIT_TYPES = ('withdraw', 'payment')
+
+
+class InsufficientFunds(Exception):
+    pass
+
+
+def signed_amount(transaction_type, amount):
+    return amount if transaction_type in CREDIT_TYPES else -amount
+
+
+def post_transaction(wallet, amount, transaction_type, **fields):
+    """
+    Record a transaction and apply it to the wallet balance in one database
+    transaction. Debits never take the balance below zero.
+    """
+    amount = Decimal(amount)
+    if amount <= 0:
+        raise ValueError("amount must be positive")
+    if transaction_type not in CREDIT_TYPES + DEBIT_TYPES:
+        raise ValueError(f"unknown transaction type {transaction_type!r}")
+    wallet_id = getattr(wallet, 'pk', wallet)
+    delta = signed_amount(transaction_type, amount)
+
+    with transaction.atomic():
+        wallets = Wallet.objects.filter(pk=wallet_id)
+        if delta < 0:
+            wallets = wallets.filter(balance__gte=-delta)
+        if not wallets.update(balance=F('balance') + delta):
+            if Wallet.objects.filter(pk=wallet_id).exists():
+                raise InsufficientFunds(f"wallet {wallet_id} cannot cover {amount}")
+            raise Wallet.DoesNotExist(f"wallet {wallet_id} does not exist")
+        return Transaction.objects.create(
+            wallet_id=wallet_id, amount=amount, transaction_type=transaction_type, **fields
+        )
+
+
+def _signed_sum(transactions):
+    return transactions.aggregate(
+        total=Sum(Case(
+            When(transaction_type__in=CREDIT_TYPES, then=F('amount')),
+            default=-F('amount'),
+            output_field=DecimalField(max_digits=14, decimal_places=2),
+        ))
+    )['total'] or Decimal('0')
+
+
+def latest_checkpoint(wallet_id):
+    return WalletCheckpoint.objects.filter(wallet_id=wallet_id).order_by('-last_transaction_id').first()
+
+
+def create_checkpoint(wallet):
+    wallet_id = getattr(wallet, 'pk', wallet)
+    with transaction.atomic():
+        locked = Wallet.objects.select_for_update().get(pk=wallet_id)
+        last_id = Transaction.objects.filter(wallet_id=wallet_id).aggregate(last=Max('id'))['last'] or 0
+        return WalletCheckpoint.objects.create(
+            wallet_id=wallet_id, balance=locked.balance, last_transaction_id=last_id
+        )
+
+
+def ledger_balance(wallet):
+    """
+    Balance implied by the latest checkpoint plus the transactions after it.
+    """
+    wallet_id = getattr(wallet, 'pk', wallet)
+    checkpoint = latest_checkpoint(wallet_id)
+    base, after = (checkpoint.balance, checkpoint.last_transaction_id) if checkpoint else (Decimal('0'), 0)
+    return base + _signed_sum(Transaction.objects.filter(wallet_id=wallet_id, id__gt=after))
+
+
+def reconcile(wallet):
+    """
+    Return ``(stored_balance, ledger_balance)``; they differ only if the
+    balance was changed outside the ledger.
+    """
+    wallet_id = getattr(wallet, 'pk', wallet)
+    with transaction.atomic():
+        stored = Wallet.objects.select_for_update().values_list('balance', flat=True).get(pk=wallet_id)
+        return stored, ledger_balance(wallet_id)
@@ -0,0 +1,141 @@
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections, transaction
+from django.test.utils import setup_databases, teardown_databases
+from django.utils import timezone
+
+from accounts.models import User
+from accounts.outbox import enqueue_many
+from bookings import availability
+from bookings.models import Booking
+from services.models import Service
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark concurrent booking creation on throwaway databases: SQLite with "
+        "default pragmas, SQLite with SQLITE_OPTIONS in WAL mode, and PostgreSQL when DATABASE_URL is set."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--bookings", type=int, default=50, help="Bookings created per thread.")
+        parser.add_argument("--profiles", help="Comma-separated subset of the profiles to run.")
+
+    def profiles(self, workdir):
+        base = dict(connections.settings["default"])
+        profiles = {
+            "sqlite-legacy": {
+                **base, "ENGINE": "django.db.backends.sqlite3", "OPTIONS": {},
+                "TEST": {**base["TEST"], "NAME": str(workdir / "legacy.sqlite3")},
+            },
+            "sqlite-tuned": {
+                **base, "ENGINE": "django.db.backends.sqlite3", "OPTIONS": {
+                    **settings.SQLITE_OPTIONS,
+                    "init_command": settings.SQLITE_WAL_PRAGMAS + settings.SQLITE_PRAGMAS,
+                },
+                "TEST": {**base["TEST"], "NAME": str(workdir / "tuned.sqlite3")},
+            },
+        }
+        if base["ENGINE"] == "django.db.backends.postgresql":
+            profiles["postgres"] = base
+        return profiles
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as tmp:
+            profiles = self.profiles(Path(tmp))
+            selected = options["profiles"].split(",") if options["profiles"] else list(profiles)
+            unknown = set(selected) - set(profiles)
+            if unknown:
+                raise CommandError(f"Unknown profile(s): {', '.join(sorted(unknown))}. Available: {', '.join(profiles)}")
+
+            original = connections.settings["default"]
+            try:
+                for name in selected:
+                    self.run_profile(name, profiles[name], options["threads"], options["bookings"])
+            finally:
+                connections.close_all()
+                connections.settings["default"] = original
+                del connections["default"]
+
+    def run_profile(self, name, config, threads, per_thread):
+        connections.close_all()
+        connections.settings["default"] = dict(config)
+        del connections["default"]
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            customer = User.objects.create(telegram_id="bench-customer")
+            services = []
+            for i in range(threads):
+                provider = User.objects.create(telegram_id=f"bench-provider-{i}", role="pro")
+                services.append(Service.objects.create(provider=provider, title=f"Bench {i}", description="", price=100))
+            connections.close_all()
+
+            start = timezone.now() + timedelta(days=1)
+            latencies, retries, errors = [], [0], []
+            lock = threading.Lock()
+
+            def worker(service):
+                try:
+                    for n in range(per_thread):
+                        began = time.perf_counter()
+                        attempts = self.book(customer, service, start + timedelta(hours=n))
+                        with lock:
+                            latencies.append(time.perf_counter() - began)
+                            retries[0] += attempts - 1
+                except Exception as exc:  # reported below
+                    errors.append(exc)
+                finally:
+                    connections.close_all()
+
+            workers = [threading.Thread(target=worker, args=(service,)) for service in services]
+            began = time.perf_counter()
+            for thread in workers:
+                thread.start()
+            for thread in workers:
+                thread.join()
+            elapsed = time.perf_counter() - began
+
+            if errors:
+                raise CommandError(f"{name}: {errors[0]!r}")
+            created = Booking.objects.count()
+            latencies.sort()
+            self.stdout.write(
+                f"{name:>14}: {created} bookings in {elapsed:.2f}s ({created / elapsed:.0f}/s), "
+                f"p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+                f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:.1f} ms, "
+                f"{retries[0]} lock retries"
+            )
+        finally:
+            connections.close_all()
+            teardown_databases(old_config, verbosity=0)
+
+    def book(self, customer, service, when):
+        """The BookingViewSet.perform_create write path; returns the attempts it took."""
+        attempts = 0
+        while True:
+            attempts += 1
+            try:
+                with transaction.atomic():
+                    availability.reserve(service.provider_id, when)
+                    Booking.objects.create(
+                        service=service, customer=customer, provider_id=service.provider_id,
+                        scheduled_date=when, price=Decimal("100.00"),
+                    )
+                    enqueue_many([
+                        dict(telegram_id=customer.telegram_id, message=f"Your booking for {service.title} is created!",
+                             button_text="View Booking", button_url=""),
+                        dict(telegram_id=service.provider.telegram_id, message=f"New booking for your service: {service.title}",
+                             button_text="View Provider Dashboard", button_url=""),
+                    ])
+                return attempts
+            except OperationalError:
+                # "database is locked": the whole attempt rolled back
+                time.sleep(0.001)
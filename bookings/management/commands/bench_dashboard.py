@@ -0,0 +1,97 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import ExpressionWrapper, F, FloatField, Sum
+from django.test.utils import CaptureQueriesContext, setup_databases, teardown_databases
+from django.utils import timezone
+
+from accounts.models import User
+from bookings.models import Booking
+from bookings.views import get_dashboard_stats
+from services.models import Service
+
+
+def legacy_dashboard_stats():
+    """
+    The previous 12-query implementation, kept for comparison.
+    """
+    today = timezone.now().date()
+    week_start = today - timedelta(days=today.weekday())
+    month_start = today.replace(day=1)
+    year_start = today.replace(month=1, day=1)
+    completed_qs = Booking.objects.filter(status='completed')
+
+    def calculate_share(qs):
+        return qs.aggregate(
+            share=ExpressionWrapper(Sum(F('price') * 0.10), output_field=FloatField())
+        )['share'] or 0
+
+    windows = [
+        completed_qs.filter(scheduled_date__date=today),
+        completed_qs.filter(scheduled_date__date__gte=week_start),
+        completed_qs.filter(scheduled_date__date__gte=month_start),
+        completed_qs.filter(scheduled_date__date__gte=year_start),
+    ]
+    data = [qs.aggregate(total=Sum('price'))['total'] or 0 for qs in windows]
+    data += [calculate_share(qs) for qs in windows]
+    data += [Booking.objects.filter(status=s).count() for s in ('completed', 'pending', 'cancelled', 'in_progress')]
+    return data
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark get_dashboard_stats against the legacy per-metric queries on a "
+        "throwaway test database filled with synthetic bookings."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bookings", type=int, default=1_000_000)
+        parser.add_argument("--batch-size", type=int, default=20_000)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            self.populate(options["bookings"], options["batch_size"])
+            for label, fn in (("legacy", legacy_dashboard_stats), ("single-pass", get_dashboard_stats)):
+                self.measure(label, fn, options["repeat"])
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+    def populate(self, count, batch_size):
+        customer = User.objects.create(telegram_id="bench-customer")
+        provider = User.objects.create(telegram_id="bench-provider", role="pro")
+        service = Service.objects.create(provider=provider, title="Bench", description="", price=100)
+        statuses = [choice for choice, _ in Booking.STATUS_CHOICES]
+        now = timezone.now()
+        rng = random.Random(0)
+        started = time.perf_counter()
+        for offset in range(0, count, batch_size):
+            Booking.objects.bulk_create([
+                Booking(
+                    service=service, customer=customer, provider=provider,
+                    status=rng.choice(statuses),
+                    scheduled_date=now - timedelta(minutes=rng.randrange(0, 3 * 365 * 24 * 60)),
+                    price=Decimal(rng.randrange(1000, 100000)) / 100,
+                )
+                for _ in range(min(batch_size, count - offset))
+            ])
+        self.stdout.write(f"inserted {count} bookings in {time.perf_counter() - started:.1f}s")
+
+    def measure(self, label, fn, repeat):
+        fn()  # warm caches
+        timings = []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                fn()
+                timings.append(time.perf_counter() - started)
+        timings.sort()
+        self.stdout.write(
+            f"{label:>12}: {len(queries)} queries, "
+            f"median {timings[len(timings) // 2] * 1000:.1f} ms, best {timings[0] * 1000:.1f} ms"
+        )
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max, OuterRef, Subquery
+
+from bookings import ledger
+from bookings.models import Transaction, Wallet, WalletCheckpoint
+
+
+class Command(BaseCommand):
+    help = (
+        "Checkpoint wallet balances that moved since their last checkpoint; "
+        "run periodically so reconciliation stays cheap."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reconcile", action="store_true",
+                            help="Check each wallet against its ledger before checkpointing it.")
+
+    def handle(self, *args, **options):
+        last_checkpoint = (
+            WalletCheckpoint.objects.filter(wallet=OuterRef('pk'))
+            .order_by().values('wallet').annotate(last=Max('last_transaction_id')).values('last')
+        )
+        last_transaction = (
+            Transaction.objects.filter(wallet=OuterRef('pk'))
+            .order_by().values('wallet').annotate(last=Max('id')).values('last')
+        )
+        wallets = Wallet.objects.annotate(
+            checkpointed=Subquery(last_checkpoint), latest=Subquery(last_transaction)
+        ).filter(latest__isnull=False)
+
+        created = mismatched = 0
+        for wallet in wallets.iterator():
+            if wallet.checkpointed is not None and wallet.checkpointed >= wallet.latest:
+                continue
+            if options["reconcile"]:
+                stored, expected = ledger.reconcile(wallet.pk)
+                if stored != expected:
+                    mismatched += 1
+                    self.stderr.write(f"wallet {wallet.pk}: balance {stored} != ledger {expected}; not checkpointed")
+                    continue
+            ledger.create_checkpoint(wallet.pk)
+            created += 1
+        self.stdout.write(self.style.SUCCESS(f"{created} checkpoints created, {mismatched} mismatches."))
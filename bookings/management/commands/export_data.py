@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from bookings import exports
+
+
+class Command(BaseCommand):
+    help = "Stream a CSV or NDJSON export of transactions or bookings."
+
+    def add_arguments(self, parser):
+        parser.add_argument("dataset", choices=sorted(exports.DATASETS))
+        parser.add_argument("--format", dest="fmt", choices=sorted(exports.FORMATS), default="csv")
+        parser.add_argument("--from", dest="date_from", help="YYYY-MM-DD, inclusive")
+        parser.add_argument("--to", dest="date_to", help="YYYY-MM-DD, inclusive")
+        parser.add_argument("--output", "-o", help="File to write; defaults to stdout.")
+
+    def handle(self, *args, **options):
+        try:
+            date_from = exports.parse_day(options["date_from"])
+            date_to = exports.parse_day(options["date_to"])
+        except ValueError:
+            raise CommandError("--from/--to must be YYYY-MM-DD.")
+
+        chunks = exports.stream(options["dataset"], options["fmt"], date_from, date_to)
+        if options["output"]:
+            with open(options["output"], "w", newline="", encoding="utf-8") as out:
+                for chunk in chunks:
+                    out.write(chunk)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending="")
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_user_user_joined_idx'),
+        ('bookings', '0002_transaction_customer_transaction_provider_and_more'),
+        ('services', '0006_service_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['customer', 'scheduled_date'], name='booking_customer_sched_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['provider', 'scheduled_date'], name='booking_provider_sched_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['status', 'scheduled_date'], name='booking_status_sched_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['created_at', 'status'], name='booking_created_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['created_at'], name='transaction_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['wallet', 'created_at'], name='transaction_wallet_created_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:22
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def checkpoint_existing_wallets(apps, schema_editor):
+    # Existing balances predate the ledger; start reconciliation from them
+    Wallet = apps.get_model('bookings', 'Wallet')
+    WalletCheckpoint = apps.get_model('bookings', 'WalletCheckpoint')
+    WalletCheckpoint.objects.bulk_create(
+        WalletCheckpoint(wallet_id=wallet.pk, balance=wallet.balance, last_transaction_id=wallet.last_id or 0)
+        for wallet in Wallet.objects.annotate(last_id=Max('transactions__id'))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0003_booking_booking_customer_sched_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WalletCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('last_transaction_id', models.BigIntegerField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('wallet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='bookings.wallet')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['wallet', '-last_transaction_id'], name='checkpoint_wallet_last_idx')],
+            },
+        ),
+        migrations.RunPython(checkpoint_existing_wallets, migrations.RunPython.noop),
+    ]
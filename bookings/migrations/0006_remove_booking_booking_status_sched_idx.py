@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:08
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0005_provideravailability'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='booking',
+            name='booking_status_sched_idx',
+        ),
+    ]
@@ -21,10 +21,52 @@ class Booking(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     created_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            # Customer / provider booking lists ordered by date
+            models.Index(fields=['customer', 'scheduled_date'], name='booking_customer_sched_idx'),
+            models.Index(fields=['provider', 'scheduled_date'], name='booking_provider_sched_idx'),
+            # Admin analytics by creation date
+            models.Index(fields=['created_at', 'status'], name='booking_created_status_idx'),
+        ]
+
     def __str__(self):
         return f"{self.customer} → {self.service} ({self.status})"
 
 
+class ProviderAvailability(models.Model):
+    """
+    Weekly window in which a provider takes bookings (see bookings/availability.py).
+    Providers without any windows accept bookings at any time.
+    """
+    WEEKDAY_CHOICES = [
+        (0, 'Monday'),
+        (1, 'Tuesday'),
+        (2, 'Wednesday'),
+        (3, 'Thursday'),
+        (4, 'Friday'),
+        (5, 'Saturday'),
+        (6, 'Sunday'),
+    ]
+
+    provider = models.ForeignKey(User, on_delete=models.CASCADE, related_name='availability')
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAY_CHOICES)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+
+    class Meta:
+        ordering = ['weekday', 'start_time']
+        indexes = [
+            models.Index(fields=['provider', 'weekday'], name='availability_provider_day_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(condition=models.Q(end_time__gt=models.F('start_time')), name='availability_window_order'),
+        ]
+
+    def __str__(self):
+        return f"{self.provider} {self.get_weekday_display()} {self.start_time}-{self.end_time}"
+
+
 class Wallet(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='wallet')
     balance = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
@@ -51,5 +93,31 @@ class Transaction(models.Model):
     provider = models.ForeignKey(User, on_delete=models.CASCADE, related_name='received_booking')
     reference_id = models.CharField(max_length=100, blank=True, null=True)  # For payment gateway tracking
 
+    class Meta:
+        indexes = [
+            # Analytics date ranges and per-wallet history
+            models.Index(fields=['created_at'], name='transaction_created_idx'),
+            models.Index(fields=['wallet', 'created_at'], name='transaction_wallet_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.transaction_type} - {self.amount} ({self.wallet.user})"
+
+
+class WalletCheckpoint(models.Model):
+    """
+    Wallet balance as of ``last_transaction_id``; reconciliation only sums
+    transactions after the latest checkpoint (see bookings/ledger.py).
+    """
+    wallet = models.ForeignKey(Wallet, on_delete=models.CASCADE, related_name='checkpoints')
+    balance = models.DecimalField(max_digits=12, decimal_places=2)
+    last_transaction_id = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['wallet', '-last_transaction_id'], name='checkpoint_wallet_last_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.wallet} @ {self.last_transaction_id}: {self.balance}"
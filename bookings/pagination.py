@@ -0,0 +1,16 @@
+from rest_framework.pagination import CursorPagination
+
+
+class BookingSegmentPagination(CursorPagination):
+    """
+    Keyset pagination over one booking segment.
+
+    ``upcoming`` pages ascend and ``past`` pages descend on ``scheduled_date``,
+    each an index range scan on ``(customer|provider, scheduled_date)``.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def get_ordering(self, request, queryset, view):
+        return view.SEGMENT_ORDERING[view.get_segment()]
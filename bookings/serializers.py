@@ -1,13 +1,13 @@
 from rest_framework import serializers
-from .models import Booking, Wallet, Transaction
-from services.serializers import ServiceSerializer
+from .models import Booking, Wallet, Transaction, ProviderAvailability
+from services.serializers import ServiceSummarySerializer
 from accounts.serializers import UserSerializer  # or create a minimal user serializer
 
 class BookingSerializer(serializers.ModelSerializer):
     # Nested serializers
     customer = UserSerializer(read_only=True)
     provider = UserSerializer(read_only=True)
-    service = ServiceSerializer(read_only=True)
+    service = ServiceSummarySerializer(read_only=True)
     
     class Meta:
         model = Booking
@@ -26,3 +26,16 @@ class TransactionSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ['created_at']
 
+
+class ProviderAvailabilitySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ProviderAvailability
+        fields = '__all__'
+        read_only_fields = ['provider']
+
+    def validate(self, attrs):
+        start = attrs.get('start_time', getattr(self.instance, 'start_time', None))
+        end = attrs.get('end_time', getattr(self.instance, 'end_time', None))
+        if start and end and end <= start:
+            raise serializers.ValidationError({"end_time": "Must be after start_time."})
+        return attrs
@@ -1,3 +1,589 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from datetime import datetime, time as datetime_time, timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, connections, transaction as db_transaction
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from accounts.user_cache import user_cache
+from admins import rollups
+from services.models import Service, ServiceCategory, ServiceReview
+from . import availability, exports, ledger
+from .models import Booking, ProviderAvailability, Transaction, Wallet, WalletCheckpoint
+
+
+class BookingFixtureMixin:
+    @classmethod
+    def setUpTestData(cls):
+        user_cache.clear()  # users of earlier test classes were rolled back
+        cls.customer = User.objects.create(telegram_id="100", full_name="Customer")
+        cls.provider = User.objects.create(telegram_id="200", full_name="Provider", role="pro")
+        cls.category = ServiceCategory.objects.create(name="Cleaning")
+        cls.services = [
+            Service.objects.create(
+                provider=cls.provider, category=cls.category,
+                title=f"Service {i}", description="desc", price=Decimal("100.00"),
+            )
+            for i in range(3)
+        ]
+        ServiceReview.objects.create(service=cls.services[0], reviewer=cls.customer, rating=5)
+
+    def make_bookings(self, count):
+        base = timezone.now()
+        Booking.objects.bulk_create([
+            Booking(
+                service=self.services[i % len(self.services)],
+                customer=self.customer,
+                provider=self.provider,
+                scheduled_date=base + timedelta(days=i - count // 2, hours=1),
+                price=Decimal("100.00"),
+            )
+            for i in range(count)
+        ])
+
+
+class BookingQueryBudgetTests(BookingFixtureMixin, TestCase):
+    """
+    Booking lists must cost a fixed number of queries regardless of size.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def assert_list_budget(self, url, budget):
+        self.client.get(url)  # resolve the caller into the process user cache
+        for count in (2, 40):
+            Booking.objects.all().delete()
+            self.make_bookings(count)
+            with self.assertNumQueries(budget):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()), count)
+
+    def test_customer_booking_list(self):
+        # upcoming + past segments
+        self.assert_list_budget("/api/bookings/?telegram_id=100", 2)
+
+    def test_provider_booking_list(self):
+        # upcoming + past segments; the provider comes from the user cache
+        self.assert_list_budget("/api/provider/bookings/?telegram_id=200", 2)
+
+    def test_service_is_a_summary(self):
+        self.make_bookings(1)
+        service = self.client.get("/api/bookings/?telegram_id=100").json()[0]["service"]
+        self.assertNotIn("reviews", service)
+        self.assertEqual(service["category_name"], "Cleaning")
+        self.assertEqual(service["provider_name"], "Provider")
+
+
+class BookingSegmentTests(BookingFixtureMixin, TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.make_bookings(10)  # 5 past, 5 upcoming
+
+    def collect(self, url):
+        dates = []
+        while url:
+            page = self.client.get(url).json()
+            dates += [item["scheduled_date"] for item in page["results"]]
+            url = page["next"]
+        return dates
+
+    def test_segments_page_independently(self):
+        upcoming = self.collect("/api/bookings/?telegram_id=100&segment=upcoming&page_size=2")
+        past = self.collect("/api/provider/bookings/?telegram_id=200&segment=past&page_size=2")
+        self.assertEqual(len(upcoming), 5)
+        self.assertEqual(upcoming, sorted(upcoming))
+        self.assertEqual(len(past), 5)
+        self.assertEqual(past, sorted(past, reverse=True))
+        self.assertLess(past[0], upcoming[0])
+
+    def test_unsegmented_list_keeps_upcoming_first(self):
+        dates = [b["scheduled_date"] for b in self.client.get("/api/bookings/?telegram_id=100").json()]
+        self.assertEqual(dates[:5], sorted(dates[:5]))
+        self.assertEqual(dates[5:], sorted(dates[5:], reverse=True))
+
+    def test_invalid_segment(self):
+        response = self.client.get("/api/bookings/?telegram_id=100&segment=soon")
+        self.assertEqual(response.status_code, 400)
+
+
+class DashboardStatsTests(BookingFixtureMixin, TestCase):
+
+    def test_single_query_with_exact_shares(self):
+        from .views import get_dashboard_stats
+
+        now = timezone.now()
+        for status, price, when in [
+            ("completed", "10.50", now),
+            ("completed", "20.00", now - timedelta(days=400)),
+            ("pending", "5.00", now),
+            ("cancelled", "5.00", now),
+            ("in_progress", "5.00", now),
+        ]:
+            Booking.objects.create(
+                service=self.services[0], customer=self.customer, provider=self.provider,
+                status=status, price=Decimal(price), scheduled_date=when,
+            )
+
+        with self.assertNumQueries(1):
+            stats = get_dashboard_stats()
+
+        self.assertEqual(stats["total_earned_day"], Decimal("10.50"))
+        self.assertEqual(stats["total_earned_year"], Decimal("10.50"))
+        self.assertEqual(stats["share_day"], Decimal("1.05"))
+        self.assertEqual(stats["completed_bookings"], 2)
+        self.assertEqual(stats["pending_bookings"], 1)
+        self.assertEqual(stats["cancelled_bookings"], 1)
+        self.assertEqual(stats["in_progress_bookings"], 1)
+
+
+class QueryPlanAssertions:
+    """
+    Run a callable, EXPLAIN every SELECT it issued and fail on full table scans.
+    """
+    SQLITE_SCAN = re.compile(r"\bSCAN (?!CONSTANT ROW)(\w+)")
+    POSTGRES_SCAN = re.compile(r"Seq Scan on (\w+)")
+
+    def full_scans(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute("SET LOCAL enable_seqscan = off")
+                cursor.execute("EXPLAIN " + sql)
+                pattern = self.POSTGRES_SCAN
+            else:
+                cursor.execute("EXPLAIN QUERY PLAN " + sql)
+                pattern = self.SQLITE_SCAN
+            plan = "\n".join(" ".join(str(col) for col in row) for row in cursor.fetchall())
+        return {table for table in pattern.findall(plan)}, plan
+
+    def assertNoFullTableScans(self, func, allow=()):
+        with CaptureQueriesContext(connection) as ctx:
+            func()
+        selects = [q["sql"] for q in ctx.captured_queries if q["sql"].lstrip().upper().startswith("SELECT")]
+        self.assertTrue(selects, "no queries were captured")
+        for sql in selects:
+            tables, plan = self.full_scans(sql)
+            unexpected = tables - set(allow)
+            self.assertFalse(unexpected, f"full scan of {unexpected}:\n{sql}\n{plan}")
+
+
+class BookingQueryPlanTests(QueryPlanAssertions, BookingFixtureMixin, TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.make_bookings(6)
+
+    def test_customer_booking_list(self):
+        self.assertNoFullTableScans(lambda: self.client.get("/api/bookings/?telegram_id=100"))
+
+    def test_provider_booking_list(self):
+        self.assertNoFullTableScans(lambda: self.client.get("/api/provider/bookings/?telegram_id=200"))
+
+    def test_segments_are_ordered_by_the_index(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get("/api/bookings/?telegram_id=100&segment=upcoming")
+            self.client.get("/api/provider/bookings/?telegram_id=200&segment=past")
+        for query in ctx.captured_queries:
+            if connection.vendor == "sqlite" and "bookings_booking" in query["sql"]:
+                with connection.cursor() as cursor:
+                    cursor.execute("EXPLAIN QUERY PLAN " + query["sql"])
+                    plan = " ".join(str(row) for row in cursor.fetchall())
+                self.assertIn("_sched_idx", plan)
+                self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_dashboard_stats(self):
+        from .views import get_dashboard_stats
+
+        # One pass over all bookings is inherent to these whole-table totals;
+        # the point is that it is a single query
+        with self.assertNumQueries(1):
+            get_dashboard_stats()
+        self.assertNoFullTableScans(get_dashboard_stats, allow={"bookings_booking"})
+
+    def test_wallet_transactions(self):
+        self.assertNoFullTableScans(lambda: self.client.get("/api/transactions/?telegram_id=100"))
+
+
+class TransactionEndpointTests(BookingFixtureMixin, TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.wallet = Wallet.objects.create(user=self.customer)
+        self.victim = Wallet.objects.create(user=self.provider)
+        ledger.post_transaction(
+            self.wallet, Decimal("100.00"), "deposit",
+            service=self.services[0], customer=self.customer, provider=self.provider,
+        )
+
+    def post(self, wallet, transaction_type, amount="10.00", telegram_id="100"):
+        query = f"?telegram_id={telegram_id}" if telegram_id else ""
+        return self.client.post(f"/api/transactions/{query}", {
+            "wallet": wallet.pk, "amount": amount, "transaction_type": transaction_type,
+            "service": self.services[0].pk, "customer": self.customer.pk, "provider": self.provider.pk,
+        }, format="json")
+
+    def balances(self):
+        return [Wallet.objects.get(pk=w.pk).balance for w in (self.wallet, self.victim)]
+
+    def test_debits_own_wallet(self):
+        self.assertEqual(self.post(self.wallet, "payment").status_code, 201)
+        self.assertEqual(self.balances(), [Decimal("90.00"), Decimal("0.00")])
+
+    def test_other_wallets_and_credits_are_refused(self):
+        self.assertEqual(self.post(self.victim, "deposit", "1000000", telegram_id=None).status_code, 400)
+        self.assertEqual(self.post(self.victim, "payment").status_code, 403)
+        for credit in ledger.CREDIT_TYPES:
+            self.assertEqual(self.post(self.wallet, credit, "1000000").status_code, 400)
+        self.assertEqual(self.balances(), [Decimal("100.00"), Decimal("0.00")])
+
+
+class LedgerStressTests(TransactionTestCase):
+    """
+    Concurrent postings against one wallet must never lose an update.
+    """
+    THREADS = 8
+    POSTINGS = 25
+
+    def setUp(self):
+        self.customer = User.objects.create(telegram_id="300", full_name="Customer")
+        self.provider = User.objects.create(telegram_id="400", full_name="Provider", role="pro")
+        self.service = Service.objects.create(
+            provider=self.provider, title="Service", description="desc", price=Decimal("1.00"),
+        )
+        self.wallet = Wallet.objects.create(user=self.customer)
+
+    def retry(self, func, *args, **kwargs):
+        # SQLite serializes writers and reports contention instead of waiting;
+        # a rejected attempt rolled back completely, so retrying is safe.
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                return func(*args, **kwargs)
+            except OperationalError:
+                time.sleep(0.005)
+        raise AssertionError(f"{func.__name__} kept failing")
+
+    def post(self, transaction_type, amount):
+        return self.retry(
+            ledger.post_transaction, self.wallet, amount, transaction_type,
+            service=self.service, customer=self.customer, provider=self.provider,
+        )
+
+    def worker(self, index, errors):
+        try:
+            for n in range(self.POSTINGS):
+                self.post("deposit", Decimal("3.00"))
+                if n % 5 == 4:
+                    self.post("payment", Decimal("2.00"))
+                if index == 0 and n % 10 == 0:
+                    self.retry(ledger.create_checkpoint, self.wallet)
+        except Exception as exc:  # surfaced in the main thread
+            errors.append(exc)
+        finally:
+            connections.close_all()
+
+    def test_no_lost_updates(self):
+        errors = []
+        threads = [threading.Thread(target=self.worker, args=(i, errors)) for i in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+        deposits = self.THREADS * self.POSTINGS
+        payments = self.THREADS * (self.POSTINGS // 5)
+        expected = Decimal("3.00") * deposits - Decimal("2.00") * payments
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, expected)
+        self.assertEqual(Transaction.objects.filter(wallet=self.wallet).count(), deposits + payments)
+        self.assertEqual(ledger.reconcile(self.wallet), (expected, expected))
+        self.assertTrue(WalletCheckpoint.objects.filter(wallet=self.wallet).exists())
+
+    def test_debit_cannot_overdraw(self):
+        ledger.post_transaction(
+            self.wallet, "5.00", "deposit",
+            service=self.service, customer=self.customer, provider=self.provider,
+        )
+        with self.assertRaises(ledger.InsufficientFunds):
+            ledger.post_transaction(
+                self.wallet, "6.00", "withdraw",
+                service=self.service, customer=self.customer, provider=self.provider,
+            )
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal("5.00"))
+        self.assertEqual(Transaction.objects.count(), 1)
+
+
+class BulkStatusTests(BookingFixtureMixin, TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.make_bookings(4)
+        self.ids = list(Booking.objects.order_by("id").values_list("id", flat=True))
+        Booking.objects.filter(id=self.ids[3]).update(status="completed")
+        rollups.rebuild()
+
+    def test_per_item_results_and_batched_notifications(self):
+        from accounts.models import Notification
+
+        other = User.objects.create(telegram_id="999")
+        foreign = Booking.objects.create(
+            service=self.services[0], customer=other, provider=other,
+            scheduled_date=timezone.now(), price=Decimal("1.00"),
+        )
+        response = self.client.post(
+            "/api/provider/bookings/bulk-status/?telegram_id=200",
+            {"ids": self.ids + [foreign.id], "status": "cancelled"}, format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body["updated"], 3)
+        self.assertEqual([r["ok"] for r in body["results"]], [True, True, True, False, False])
+        self.assertEqual(body["results"][3]["status"], "completed")
+        self.assertEqual(body["results"][4]["detail"], "Not found.")
+        self.assertEqual(Booking.objects.filter(status="cancelled").count(), 3)
+        self.assertEqual(Notification.objects.count(), 6)
+
+    def test_rollups_follow_the_bulk_update(self):
+        from admins.models import DailyBookingRollup
+
+        self.client.post(
+            "/api/provider/bookings/bulk-status/?telegram_id=200",
+            {"ids": self.ids[:2], "status": "in_progress"}, format="json",
+        )
+        counts = {
+            status: total for status, total in
+            DailyBookingRollup.objects.values_list("status").annotate(total=Sum("booking_count"))
+        }
+        self.assertEqual(counts, {"pending": 1, "in_progress": 2, "completed": 1})
+
+    def test_rejects_unknown_status(self):
+        response = self.client.post(
+            "/api/provider/bookings/bulk-status/?telegram_id=200",
+            {"ids": self.ids, "status": "completed"}, format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class AvailabilityTests(QueryPlanAssertions, BookingFixtureMixin, TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.day = timezone.localdate() + timedelta(days=7)
+        ProviderAvailability.objects.create(
+            provider=self.provider, weekday=self.day.weekday(),
+            start_time=datetime_time(9), end_time=datetime_time(12),
+        )
+
+    def at(self, hour, minute=0):
+        return timezone.make_aware(datetime.combine(self.day, datetime_time(hour, minute)))
+
+    def book(self, when):
+        return self.client.post(
+            "/api/bookings/?telegram_id=100",
+            {"service": self.services[0].id, "scheduled_date": when.isoformat(), "price": "100.00"},
+            format="json",
+        )
+
+    def test_overlapping_booking_is_rejected(self):
+        self.assertEqual(self.book(self.at(9)).status_code, 201)
+        response = self.book(self.at(9, 30))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("scheduled_date", response.json())
+        self.assertEqual(self.book(self.at(10)).status_code, 201)
+
+    def test_outside_availability_is_rejected(self):
+        self.assertEqual(self.book(self.at(11, 30)).status_code, 400)
+        self.assertEqual(self.book(self.at(14)).status_code, 400)
+
+    def test_free_slots(self):
+        self.book(self.at(10))
+        cancelled = self.book(self.at(11)).json()["id"]
+        Booking.objects.filter(id=cancelled).update(status="cancelled")
+
+        url = f"/api/free-slots/?service={self.services[1].id}&date={self.day.isoformat()}"
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        booking_queries = [q for q in ctx.captured_queries if 'FROM "bookings_booking"' in q["sql"]]
+        self.assertEqual(len(booking_queries), 1)
+        slots = [datetime.fromisoformat(s) for s in response.json()["slots"]]
+        self.assertEqual(slots, [self.at(9), self.at(11)])
+
+    def test_free_slots_rejects_a_bad_service_id(self):
+        for service in ("abc", ""):
+            response = self.client.get(f"/api/free-slots/?service={service}&date={self.day.isoformat()}")
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("service", response.json())
+
+    def test_reactivating_a_booking_rechecks_its_slot(self):
+        cancelled = self.book(self.at(9)).json()["id"]
+        Booking.objects.filter(id=cancelled).update(status="cancelled")
+        self.assertEqual(self.book(self.at(9)).status_code, 201)
+
+        response = self.client.patch(f"/api/bookings/{cancelled}/", {"status": "pending"}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Booking.objects.get(id=cancelled).status, "cancelled")
+        # Reactivated into a free slot instead
+        response = self.client.patch(
+            f"/api/bookings/{cancelled}/", {"status": "pending", "scheduled_date": self.at(10).isoformat()},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_conflict_check_uses_the_index(self):
+        self.make_bookings(20)
+        self.assertNoFullTableScans(
+            lambda: list(availability.conflicting_bookings(self.provider.id, self.at(9))),
+            allow=("bookings_provideravailability",),
+        )
+        self.assertNoFullTableScans(
+            lambda: availability.free_slots(self.provider.id, self.day),
+            allow=("bookings_provideravailability",),
+        )
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+    """
+    Simultaneous requests for one slot must produce exactly one booking.
+    """
+    THREADS = 8
+
+    def setUp(self):
+        self.customer = User.objects.create(telegram_id="500", full_name="Customer")
+        self.provider = User.objects.create(telegram_id="600", full_name="Provider", role="pro")
+        self.service = Service.objects.create(
+            provider=self.provider, title="Service", description="desc", price=Decimal("1.00"),
+        )
+        self.start = timezone.now() + timedelta(days=1)
+
+    def book(self, offset):
+        start = self.start + timedelta(minutes=offset)
+        with db_transaction.atomic():
+            availability.reserve(self.provider.id, start)
+            Booking.objects.create(
+                service=self.service, customer=self.customer, provider=self.provider,
+                scheduled_date=start, price=Decimal("1.00"),
+            )
+
+    def worker(self, index, outcomes):
+        try:
+            deadline = time.monotonic() + 30
+            while time.monotonic() < deadline:
+                try:
+                    self.book(index)
+                    outcomes.append("booked")
+                    return
+                except availability.SlotUnavailable:
+                    outcomes.append("rejected")
+                    return
+                except OperationalError:
+                    # SQLite contention; the attempt rolled back, try again
+                    time.sleep(0.005)
+            outcomes.append("gave up")
+        finally:
+            connections.close_all()
+
+    def test_one_booking_per_slot(self):
+        outcomes = []
+        threads = [threading.Thread(target=self.worker, args=(i, outcomes)) for i in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(outcomes), ["booked"] + ["rejected"] * (self.THREADS - 1))
+        self.assertEqual(Booking.objects.count(), 1)
+
+
+class ExportTests(BookingFixtureMixin, TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(
+            get_user_model().objects.create_user("exporter", password="x", is_staff=True)
+        )
+        self.days = [timezone.localdate() - timedelta(days=offset) for offset in (10, 5, 0)]
+        wallet = Wallet.objects.create(user=self.customer)
+        for i, day in enumerate(self.days):
+            created = timezone.make_aware(datetime.combine(day, datetime_time(12)))
+            Booking.objects.create(
+                service=self.services[0], customer=self.customer, provider=self.provider,
+                scheduled_date=created, price=Decimal("100.00"), notes=f'note {i}, "quoted"',
+                created_at=created,
+            )
+            Transaction.objects.create(
+                wallet=wallet, amount=Decimal("25.00"), transaction_type="payment", customer=self.customer,
+                provider=self.provider, service=self.services[0], created_at=created,
+            )
+
+    def export(self, path):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return response, b"".join(response.streaming_content).decode()
+
+    def test_csv(self):
+        response, body = self.export("/api/exports/bookings.csv")
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertIn('filename="bookings.csv"', response["Content-Disposition"])
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual([row["notes"] for row in rows], ['note 0, "quoted"', 'note 1, "quoted"', 'note 2, "quoted"'])
+        self.assertEqual(rows[0]["service__title"], "Service 0")
+        self.assertEqual(rows[0]["customer__telegram_id"], "100")
+
+    def test_ndjson(self):
+        response, body = self.export("/api/exports/transactions.ndjson")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]["amount"], "25.00")
+        self.assertEqual(set(rows[0]), set(exports.DATASETS["transactions"][1]))
+
+    def test_date_filters_are_inclusive(self):
+        _, body = self.export(f"/api/exports/bookings.ndjson?from={self.days[1]}&to={self.days[1]}")
+        self.assertEqual([json.loads(line)["notes"] for line in body.splitlines()], ['note 1, "quoted"'])
+        _, body = self.export(f"/api/exports/bookings.ndjson?from={self.days[1]}")
+        self.assertEqual(len(body.splitlines()), 2)
+        _, body = self.export(f"/api/exports/bookings.ndjson?to={self.days[1]}")
+        self.assertEqual(len(body.splitlines()), 2)
+
+    def test_staff_only(self):
+        self.assertIn(APIClient().get("/api/exports/bookings.csv").status_code, (401, 403))
+        self.client.force_authenticate(get_user_model().objects.create_user("member", password="x"))
+        self.assertEqual(self.client.get("/api/exports/bookings.csv").status_code, 403)
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get("/api/exports/bookings.csv?from=last-week").status_code, 400)
+        self.assertEqual(self.client.get("/api/exports/bookings.csv?to=2024-13-01").status_code, 400)
+        self.assertEqual(self.client.get("/api/exports/wallets.csv").status_code, 404)
+        self.assertEqual(self.client.get("/api/exports/bookings.xml").status_code, 404)
+
+    def test_management_command(self):
+        out = io.StringIO()
+        call_command("export_data", "transactions", "--format", "csv", "--from", str(self.days[1]), stdout=out)
+        rows = list(csv.DictReader(io.StringIO(out.getvalue())))
+        self.assertEqual(len(rows), 2)
+        with self.assertRaises(CommandError):
+            call_command("export_data", "bookings", "--to", "yesterday", stdout=io.StringIO())
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bookings.ndjson")
+            call_command("export_data", "bookings", "--format", "ndjson", "-o", path)
+            with open(path, encoding="utf-8") as f:
+                self.assertEqual(len(f.read().splitlines()), 3)
@@ -1,13 +1,16 @@
 from rest_framework.routers import DefaultRouter
-from .views import BookingViewSet, WalletViewSet, TransactionViewSet, AdminDashboardAPIView,ProviderBookingViewSet
+from .views import BookingViewSet, WalletViewSet, TransactionViewSet, AdminDashboardAPIView,ProviderBookingViewSet, ExportAPIView, ProviderAvailabilityViewSet, FreeSlotsAPIView
 from django.urls import path
 
 router = DefaultRouter()
 router.register(r'bookings', BookingViewSet, basename='booking')
 router.register(r'provider/bookings', ProviderBookingViewSet, basename='provider-bookings')
+router.register(r'provider/availability', ProviderAvailabilityViewSet, basename='provider-availability')
 router.register(r'wallets', WalletViewSet, basename='wallet')
 router.register(r'transactions', TransactionViewSet, basename='transaction')
 
 urlpatterns = router.urls + [
     path('admin/dashboard/', AdminDashboardAPIView.as_view(), name='admin-dashboard'),
+    path('free-slots/', FreeSlotsAPIView.as_view(), name='free-slots'),
+    path('exports/<str:dataset>.<str:fmt>', ExportAPIView.as_view(), name='export'),
 ]
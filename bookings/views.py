@@ -1,162 +1,264 @@
 from rest_framework import viewsets
 from rest_framework.response import Response
 from rest_framework import status
-from .models import Booking, Wallet, Transaction, User  # make sure you import User if needed
-from .serializers import BookingSerializer, WalletSerializer, TransactionSerializer
-from django.db.models import Sum, Count, F, FloatField, ExpressionWrapper, Q
-from django.utils.timezone import now, timedelta
+from .models import Booking, Wallet, Transaction, ProviderAvailability
+from .serializers import BookingSerializer, WalletSerializer, TransactionSerializer, ProviderAvailabilitySerializer
+from datetime import datetime, time
+from decimal import Decimal
+from django.db.models import Sum, Count, Q
+from django.utils.timezone import now, timedelta, localdate, make_aware
 from rest_framework.views import APIView
 from services.models import Service  # Assuming you have a Service model
-from django.db.models import Case, When, Value, IntegerField, F, DateTimeField
 from django.utils.timezone import now
 from django.shortcuts import get_object_or_404
+from django.db import transaction
+from accounts.outbox import enqueue_booking_message, enqueue_many
+from accounts.user_cache import get_by_telegram_id
+from config.routers import ReplicaReadsMixin
+from admins import rollups
+from collections import Counter
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAdminUser
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from .pagination import BookingSegmentPagination
+from . import ledger
+from . import exports
+from . import availability
+from django.http import Http404, StreamingHttpResponse
 
 
-class BookingViewSet(viewsets.ModelViewSet):
-    queryset = Booking.objects.all()
+# Everything BookingSerializer renders, fetched in the booking query itself
+BOOKING_READ_RELATED = (
+    'customer', 'provider', 'service', 'service__category', 'service__provider',
+)
+
+
+class SegmentedBookingListMixin:
+    """
+    Booking listing split at "now" into two independently paged segments.
+
+    ``?segment=upcoming`` (soonest first) and ``?segment=past`` (latest first)
+    are cursor-paginated range scans. Without ``segment`` the list is both
+    segments back to back, upcoming first, as before.
+    """
+    SEGMENT_ORDERING = {
+        'upcoming': ('scheduled_date', 'id'),
+        'past': ('-scheduled_date', '-id'),
+    }
+    pagination_class = BookingSegmentPagination
+
+    def get_segment(self):
+        segment = self.request.query_params.get('segment')
+        if segment and segment not in self.SEGMENT_ORDERING:
+            raise ValidationError({"segment": "Must be 'upcoming' or 'past'."})
+        return segment
+
+    def segment_queryset(self, queryset, segment, at=None):
+        at = at or now()
+        if segment == 'upcoming':
+            queryset = queryset.filter(scheduled_date__gte=at)
+        else:
+            queryset = queryset.filter(scheduled_date__lt=at)
+        return queryset.order_by(*self.SEGMENT_ORDERING[segment])
+
+    def paginate_queryset(self, queryset):
+        if not self.get_segment():
+            return None
+        return super().paginate_queryset(queryset)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.get_queryset()
+        segment = self.get_segment()
+        if segment:
+            page = self.paginate_queryset(self.segment_queryset(queryset, segment))
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
+        at = now()
+        bookings = (
+            list(self.segment_queryset(queryset, 'upcoming', at))
+            + list(self.segment_queryset(queryset, 'past', at))
+        )
+        return Response(self.get_serializer(bookings, many=True).data)
+
+
+class BookingViewSet(SegmentedBookingListMixin, viewsets.ModelViewSet):
+    queryset = Booking.objects.select_related(*BOOKING_READ_RELATED)
     serializer_class = BookingSerializer
     # No permission_classes needed if you want it open
 
     def get_queryset(self):
-        qs = self.queryset
+        qs = self.queryset.all()
 
         if self.action == "list":
-            telegram_id = self.request.query_params.get('telegram_id')
-            if not telegram_id:
+            if self.request.tg_user is None:
                 return Booking.objects.none()
-            qs = qs.filter(customer__telegram_id=telegram_id)
-
-        # future first (0), past second (1)
-        # then: within future -> scheduled_date ASC
-        #       within past   -> scheduled_date DESC
-        return (
-            qs.annotate(
-                is_future=Case(
-                    When(scheduled_date__gte=now(), then=Value(0)),
-                    default=Value(1),
-                    output_field=IntegerField(),
-                ),
-                future_date=Case(  # only set for future items
-                    When(scheduled_date__gte=now(), then=F('scheduled_date')),
-                    default=Value(None),
-                    output_field=DateTimeField(),
-                ),
-                past_date=Case(    # only set for past items
-                    When(scheduled_date__lt=now(), then=F('scheduled_date')),
-                    default=Value(None),
-                    output_field=DateTimeField(),
-                ),
-            )
-            .order_by('is_future', 'future_date', '-past_date')
-        )
-    
+            qs = qs.filter(customer=self.request.tg_user)
+        return qs
+
     def perform_create(self, serializer):
-        print(self.request.query_params.get('telegram_id'))
-        telegram_id = self.request.query_params.get('telegram_id') or self.request.headers.get('telegram_id') or 123456
+        telegram_id = self.request.tg_telegram_id or 123456
         if not telegram_id:
             return Response({"detail": "telegram_id is required"}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Assuming your User model stores telegram_id field
-        user = User.objects.filter(telegram_id=telegram_id).first()
+        # Resolved once by TelegramUserMiddleware
+        user = self.request.tg_user or get_by_telegram_id(telegram_id)
         if not user:
             return Response({"detail": "User with this telegram_id not found"}, status=status.HTTP_404_NOT_FOUND)
         service_id = self.request.data.get('service')
         service = Service.objects.filter(id=service_id).first()
         if not service:
             return Response({"detail": "Service not found"}, status=status.HTTP_404_NOT_FOUND)
-        booking = serializer.save(customer=user, provider=service.provider, service=service)
-
-        # Send Telegram message to client and provider
-        from accounts.send_booking_message import send_booking_message_sync
-        # Client message
-        send_booking_message_sync(
-            telegram_id=user.telegram_id,
-            message=f"Your booking for {service.title} is created!",
-            button_text="View Booking",
-            button_url="https://balemuya-frontend-qn6y.vercel.app/bookings"
-        )
-        # Provider message
-        send_booking_message_sync(
-            telegram_id=service.provider.telegram_id,
-            message=f"New booking for your service: {service.title}",
-            button_text="View Provider Dashboard",
-            button_url="https://balemuya-frontend-qn6y.vercel.app/provider-dashboard"
-        )
+        with transaction.atomic():
+            try:
+                availability.reserve(service.provider_id, serializer.validated_data['scheduled_date'])
+            except availability.SlotUnavailable as exc:
+                raise ValidationError({"scheduled_date": str(exc)})
+            booking = serializer.save(customer=user, provider=service.provider, service=service)
+
+            # Queue Telegram messages to client and provider (delivered by send_notifications)
+            # Client message
+            enqueue_booking_message(
+                telegram_id=user.telegram_id,
+                message=f"Your booking for {service.title} is created!",
+                button_text="View Booking",
+                button_url="https://balemuya-frontend-qn6y.vercel.app/bookings"
+            )
+            # Provider message
+            enqueue_booking_message(
+                telegram_id=service.provider.telegram_id,
+                message=f"New booking for your service: {service.title}",
+                button_text="View Provider Dashboard",
+                button_url="https://balemuya-frontend-qn6y.vercel.app/provider-dashboard"
+            )
+
+    def perform_update(self, serializer):
+        booking = serializer.instance
+        scheduled_date = serializer.validated_data.get('scheduled_date', booking.scheduled_date)
+        new_status = serializer.validated_data.get('status', booking.status)
+        moved = scheduled_date != booking.scheduled_date
+        reactivated = booking.status not in availability.ACTIVE_STATUSES
+        with transaction.atomic():
+            # Check the slot whenever the booking (re)claims one: moved while
+            # active, or brought back from cancelled/completed
+            if new_status in availability.ACTIVE_STATUSES and (moved or reactivated):
+                try:
+                    availability.reserve(booking.provider_id, scheduled_date, exclude_id=booking.pk)
+                except availability.SlotUnavailable as exc:
+                    raise ValidationError({"scheduled_date": str(exc)})
+            serializer.save()
 
 class WalletViewSet(viewsets.ModelViewSet):
     queryset = Wallet.objects.all()
     serializer_class = WalletSerializer
 
     def get_queryset(self):
-        telegram_id = self.request.query_params.get('telegram_id') or self.request.headers.get('telegram_id')
-        if not telegram_id:
+        if self.request.tg_user is None:
             return Wallet.objects.none()
-        return Wallet.objects.filter(user__telegram_id=telegram_id)
+        return Wallet.objects.filter(user=self.request.tg_user)
 
 class TransactionViewSet(viewsets.ModelViewSet):
     queryset = Transaction.objects.all()
     serializer_class = TransactionSerializer
+    # Ledger entries are append-only; corrections are posted as new transactions
+    http_method_names = ['get', 'post', 'head', 'options']
+
+    def perform_create(self, serializer):
+        if self.request.tg_user is None:
+            raise ValidationError({"detail": "telegram_id is required"})
+        if serializer.validated_data['wallet'].user_id != self.request.tg_user.pk:
+            raise PermissionDenied("You can only post to your own wallet.")
+        if serializer.validated_data['transaction_type'] in ledger.CREDIT_TYPES:
+            # Credits create money; they are posted by server-side code only
+            raise ValidationError({"transaction_type": "Only withdraw and payment can be posted here."})
+        try:
+            serializer.instance = ledger.post_transaction(**serializer.validated_data)
+        except ledger.InsufficientFunds as exc:
+            raise ValidationError({"amount": str(exc)})
+        except ValueError as exc:
+            raise ValidationError({"amount": str(exc)})
 
     def get_queryset(self):
-        telegram_id = self.request.query_params.get('telegram_id') or self.request.headers.get('telegram_id')
-        if not telegram_id:
+        if self.request.tg_user is None:
             return Transaction.objects.none()
-        return Transaction.objects.filter(wallet__user__telegram_id=telegram_id)
+        return Transaction.objects.filter(wallet__user=self.request.tg_user).order_by('-created_at')
+
+PLATFORM_SHARE_RATE = Decimal("0.10")
+
+
+def _day_start(day):
+    return make_aware(datetime.combine(day, time.min))
+
 
 def get_dashboard_stats():
-    today = now().date()
+    """
+    Earnings, platform share and status counts in one conditional-aggregation query.
+    """
+    today = localdate()
     week_start = today - timedelta(days=today.weekday())  # Monday
     month_start = today.replace(day=1)
     year_start = today.replace(month=1, day=1)
 
-    completed_qs = Booking.objects.filter(status='completed')
-
-    def calculate_share(qs):
-        return qs.aggregate(
-            share=ExpressionWrapper(Sum(F('price') * 0.10), output_field=FloatField())
-        )['share'] or 0
-
-    total_earned_day = completed_qs.filter(scheduled_date__date=today).aggregate(total=Sum('price'))['total'] or 0
-    total_earned_week = completed_qs.filter(scheduled_date__date__gte=week_start).aggregate(total=Sum('price'))['total'] or 0
-    total_earned_month = completed_qs.filter(scheduled_date__date__gte=month_start).aggregate(total=Sum('price'))['total'] or 0
-    total_earned_year = completed_qs.filter(scheduled_date__date__gte=year_start).aggregate(total=Sum('price'))['total'] or 0
-
-    share_day = calculate_share(completed_qs.filter(scheduled_date__date=today))
-    share_week = calculate_share(completed_qs.filter(scheduled_date__date__gte=week_start))
-    share_month = calculate_share(completed_qs.filter(scheduled_date__date__gte=month_start))
-    share_year = calculate_share(completed_qs.filter(scheduled_date__date__gte=year_start))
-
-    completed_count = completed_qs.count()
-    pending_count = Booking.objects.filter(status='pending').count()
-    cancelled_count = Booking.objects.filter(status='cancelled').count()
-    in_progress_count = Booking.objects.filter(status='in_progress').count()
-
-    data = {
-        "total_earned_day": total_earned_day,
-        "total_earned_week": total_earned_week,
-        "total_earned_month": total_earned_month,
-        "total_earned_year": total_earned_year,
-
-        "share_day": share_day,
-        "share_week": share_week,
-        "share_month": share_month,
-        "share_year": share_year,
-
-        "completed_bookings": completed_count,
-        "pending_bookings": pending_count,
-        "cancelled_bookings": cancelled_count,
-        "in_progress_bookings": in_progress_count,
+    completed = Q(status='completed')
+    earned_windows = {
+        "day": Q(scheduled_date__gte=_day_start(today), scheduled_date__lt=_day_start(today + timedelta(days=1))),
+        "week": Q(scheduled_date__gte=_day_start(week_start)),
+        "month": Q(scheduled_date__gte=_day_start(month_start)),
+        "year": Q(scheduled_date__gte=_day_start(year_start)),
+    }
+    aggregates = {
+        f"total_earned_{name}": Sum('price', filter=completed & window)
+        for name, window in earned_windows.items()
     }
+    aggregates.update({
+        "completed_bookings": Count('id', filter=completed),
+        "pending_bookings": Count('id', filter=Q(status='pending')),
+        "cancelled_bookings": Count('id', filter=Q(status='cancelled')),
+        "in_progress_bookings": Count('id', filter=Q(status='in_progress')),
+    })
+    totals = Booking.objects.aggregate(**aggregates)
+
+    data = {}
+    for name in earned_windows:
+        data[f"total_earned_{name}"] = totals[f"total_earned_{name}"] or Decimal("0")
+    for name in earned_windows:
+        data[f"share_{name}"] = (data[f"total_earned_{name}"] * PLATFORM_SHARE_RATE).quantize(Decimal("0.01"))
+    for key in ("completed_bookings", "pending_bookings", "cancelled_bookings", "in_progress_bookings"):
+        data[key] = totals[key]
 
     return data
 
-class AdminDashboardAPIView(APIView):
+class AdminDashboardAPIView(ReplicaReadsMixin, APIView):
 
     def get(self, request):
         data = get_dashboard_stats()
         return Response(data)
 
-class ProviderBookingViewSet(viewsets.ModelViewSet):
+# new status -> (statuses it may be reached from, error shown otherwise)
+STATUS_TRANSITIONS = {
+    "in_progress": (("pending",), "You can only accept pending bookings."),
+    "cancelled": (("pending", "in_progress"), "You can only cancel pending or in-progress bookings."),
+}
+BULK_STATUS_MAX_IDS = 500
+
+
+def status_change_messages(booking):
+    return [
+        dict(
+            telegram_id=booking.customer.telegram_id,
+            message=f"Your booking for {booking.service.title} status changed to {booking.status}!",
+            button_text="View Booking",
+            button_url="https://balemuya-frontend-qn6y.vercel.app/bookings"
+        ),
+        dict(
+            telegram_id=booking.provider.telegram_id,
+            message=f"Booking for your service {booking.service.title} status changed to {booking.status}!",
+            button_text="View Provider Dashboard",
+            button_url="https://balemuya-frontend-qn6y.vercel.app/provider-dashboard"
+        ),
+    ]
+
+
+class ProviderBookingViewSet(SegmentedBookingListMixin, viewsets.ModelViewSet):
     """
     Provider Dashboard: list bookings for their services and accept pending bookings
     """
@@ -164,72 +266,158 @@ class ProviderBookingViewSet(viewsets.ModelViewSet):
     queryset = Booking.objects.all()
 
     def get_queryset(self):
-        telegram_id = self.request.query_params.get("telegram_id")
-        if not telegram_id:
+        if not self.request.query_params.get("telegram_id"):
             return Booking.objects.none()
-        provider = get_object_or_404(User, telegram_id=telegram_id)
-        qs = Booking.objects.filter(provider=provider)
-
-        # annotate future/past for ordering
-        return qs.annotate(
-            is_future=Case(
-                When(scheduled_date__gte=now(), then=Value(0)),
-                default=Value(1),
-                output_field=IntegerField()
-            ),
-            future_date=Case(
-                When(scheduled_date__gte=now(), then=F('scheduled_date')),
-                default=Value(None),
-                output_field=DateTimeField()
-            ),
-            past_date=Case(
-                When(scheduled_date__lt=now(), then=F('scheduled_date')),
-                default=Value(None),
-                output_field=DateTimeField()
-            )
-        ).order_by('is_future', 'future_date', '-past_date')
+        provider = self.request.tg_user
+        if provider is None:
+            raise Http404("No User matches the given query.")
+        return Booking.objects.filter(provider=provider).select_related(*BOOKING_READ_RELATED)
 
     def partial_update(self, request, *args, **kwargs):
         booking = self.get_object()
         new_status = request.data.get("status")
 
-        if new_status == "in_progress":
-            # Can only accept pending bookings
-            if booking.status != "pending":
-                return Response(
-                    {"detail": "You can only accept pending bookings."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-        elif new_status == "cancelled":
-            # Can cancel only pending or in_progress bookings
-            if booking.status not in ["pending", "in_progress"]:
-                return Response(
-                    {"detail": "You can only cancel pending or in-progress bookings."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-        else:
+        if new_status not in STATUS_TRANSITIONS:
             return Response(
                 {"detail": "Invalid status change."},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        allowed_from, error = STATUS_TRANSITIONS[new_status]
+        if booking.status not in allowed_from:
+            return Response({"detail": error}, status=status.HTTP_400_BAD_REQUEST)
 
-        booking.status = new_status
-        booking.save()
+        with transaction.atomic():
+            booking.status = new_status
+            booking.save()
 
-        # Send Telegram message to client and provider on status change
-        from accounts.send_booking_message import send_booking_message_sync
-        send_booking_message_sync(
-            telegram_id=booking.customer.telegram_id,
-            message=f"Your booking for {booking.service.title} status changed to {booking.status}!",
-            button_text="View Booking",
-            button_url="https://balemuya-frontend-qn6y.vercel.app/bookings"
-        )
-        send_booking_message_sync(
-            telegram_id=booking.provider.telegram_id,
-            message=f"Booking for your service {booking.service.title} status changed to {booking.status}!",
-            button_text="View Provider Dashboard",
-            button_url="https://balemuya-frontend-qn6y.vercel.app/provider-dashboard"
-        )
+            # Queue Telegram messages to client and provider on status change
+            enqueue_many(status_change_messages(booking))
 
         serializer = self.get_serializer(booking)
-        return Response(serializer.data)
\ No newline at end of file
+        return Response(serializer.data)
+
+    @action(detail=False, methods=["post"], url_path="bulk-status")
+    def bulk_status(self, request):
+        """
+        Move many bookings to one status: {"ids": [...], "status": "in_progress"|"cancelled"}.
+        Applied with a single conditional UPDATE; returns a result per id.
+        """
+        new_status = request.data.get("status")
+        ids = request.data.get("ids")
+        if new_status not in STATUS_TRANSITIONS:
+            return Response({"detail": "Invalid status change."}, status=status.HTTP_400_BAD_REQUEST)
+        if not isinstance(ids, list) or not ids or len(ids) > BULK_STATUS_MAX_IDS:
+            return Response(
+                {"detail": f"ids must be a list of 1 to {BULK_STATUS_MAX_IDS} booking ids."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            ids = list(dict.fromkeys(int(pk) for pk in ids))
+        except (TypeError, ValueError):
+            return Response({"detail": "ids must be integers."}, status=status.HTTP_400_BAD_REQUEST)
+
+        allowed_from, error = STATUS_TRANSITIONS[new_status]
+        with transaction.atomic():
+            bookings = {
+                b.id: b for b in
+                self.get_queryset().filter(id__in=ids).select_for_update(of=("self",))
+            }
+            eligible = [b for b in bookings.values() if b.status in allowed_from]
+            if eligible:
+                Booking.objects.filter(
+                    id__in=[b.id for b in eligible], status__in=allowed_from
+                ).update(status=new_status)
+                # queryset.update() skips the rollup signals; move the counts here
+                moved = Counter(
+                    (rollups.day_of(b.created_at), b.provider_id, b.service_id, b.status) for b in eligible
+                )
+                for (day, provider_id, service_id, old_status), count in moved.items():
+                    rollups.bump_bookings(day, provider_id, service_id, old_status, -count)
+                    rollups.bump_bookings(day, provider_id, service_id, new_status, count)
+                for b in eligible:
+                    b.status = new_status
+                enqueue_many(m for b in eligible for m in status_change_messages(b))
+
+        eligible_ids = {b.id for b in eligible}
+        results = []
+        for pk in ids:
+            booking = bookings.get(pk)
+            if booking is None:
+                results.append({"id": pk, "ok": False, "detail": "Not found."})
+            elif pk in eligible_ids:
+                results.append({"id": pk, "ok": True, "status": new_status})
+            else:
+                results.append({"id": pk, "ok": False, "status": booking.status, "detail": error})
+        return Response({
+            "status": new_status,
+            "updated": len(eligible),
+            "results": results,
+        })
+
+class ProviderAvailabilityViewSet(viewsets.ModelViewSet):
+    """
+    Provider's weekly availability windows (?telegram_id=<provider>)
+    """
+    serializer_class = ProviderAvailabilitySerializer
+    queryset = ProviderAvailability.objects.all()
+
+    def get_provider(self):
+        if not self.request.tg_telegram_id:
+            raise ValidationError({"detail": "telegram_id is required"})
+        if self.request.tg_user is None:
+            raise Http404("No User matches the given query.")
+        return self.request.tg_user
+
+    def get_queryset(self):
+        return ProviderAvailability.objects.filter(provider=self.get_provider())
+
+    def perform_create(self, serializer):
+        serializer.save(provider=self.get_provider())
+
+
+class FreeSlotsAPIView(APIView):
+    """
+    Bookable start times for a service's provider: /api/free-slots/?service=<id>&date=YYYY-MM-DD
+    """
+
+    def get(self, request):
+        try:
+            day = exports.parse_day(request.query_params.get("date")) or localdate()
+        except ValueError:
+            raise ValidationError({"date": "Must be YYYY-MM-DD."})
+        try:
+            service_id = int(request.query_params.get("service", ""))
+        except ValueError:
+            raise ValidationError({"service": "A numeric service id is required."})
+        service = get_object_or_404(Service.objects.only("id", "provider_id"), id=service_id)
+        slots = availability.free_slots(service.provider_id, day)
+        return Response({
+            "service": service.id,
+            "date": day,
+            "slot_minutes": int(availability.slot_length().total_seconds() // 60),
+            "slots": slots,
+        })
+
+
+class ExportAPIView(APIView):
+    """
+    Stream a full export: /api/exports/<transactions|bookings>.<csv|ndjson>?from=YYYY-MM-DD&to=YYYY-MM-DD
+    Staff only; ``manage.py export_data`` writes the same files from the shell.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, dataset, fmt):
+        if dataset not in exports.DATASETS or fmt not in exports.FORMATS:
+            return Response({"detail": "Unknown export."}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            date_from = exports.parse_day(request.query_params.get("from"))
+            date_to = exports.parse_day(request.query_params.get("to"))
+        except ValueError:
+            raise ValidationError({"detail": "from/to must be YYYY-MM-DD."})
+
+        response = StreamingHttpResponse(
+            exports.stream(dataset, fmt, date_from, date_to),
+            content_type=exports.FORMATS[fmt],
+        )
+        response["Content-Disposition"] = f'attachment; filename="{dataset}.{fmt}"'
+        return response
@@ -0,0 +1,128 @@
+"""
+Primary/replica database routing.
+
+Writes always go to ``default``. Reads go to the ``READ_REPLICA_ALIAS``
+database only inside ``replica_reads()``, which the analytics and catalog
+views enter for safe methods through ``ReplicaReadsMixin``; everything else
+keeps reading the primary. When no replica alias is configured the router
+stays out of the way.
+
+After a caller's successful write request, ``ReadYourWritesMiddleware``
+pins that caller to the primary for ``READ_YOUR_WRITES_SECONDS`` so their
+next reads cannot miss the write on a lagging replica. Only callers with a
+Telegram id are pinned: behind the proxy every anonymous request shares one
+client address. Pins live in the ``READ_YOUR_WRITES_CACHE_ALIAS`` cache,
+which must be shared by all workers.
+
+Locally a second SQLite file works as the replica: set
+``SQLITE_REPLICA_PATH`` and refresh it from the primary with
+``sqlite3 db.sqlite3 ".backup replica.sqlite3"``.
+"""
+import contextlib
+import contextvars
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+_replica_reads = contextvars.ContextVar("replica_reads", default=False)
+_pinned = contextvars.ContextVar("pinned_to_primary", default=False)
+
+
+def replica_alias():
+    alias = getattr(settings, "READ_REPLICA_ALIAS", "replica")
+    return alias if alias in connections.settings else None
+
+
+@contextlib.contextmanager
+def replica_reads():
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+@contextlib.contextmanager
+def pinned_to_primary(pinned=True):
+    token = _pinned.set(pinned)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+def _pin_cache():
+    return caches[getattr(settings, "READ_YOUR_WRITES_CACHE_ALIAS", "default")]
+
+
+def _pin_key(caller):
+    return f"read-your-writes:{caller}"
+
+
+def pin(caller):
+    _pin_cache().set(_pin_key(caller), True, timeout=getattr(settings, "READ_YOUR_WRITES_SECONDS", 10))
+
+
+def is_pinned(caller):
+    return bool(caller) and _pin_cache().get(_pin_key(caller), False)
+
+
+def request_caller(request):
+    return getattr(request, "tg_telegram_id", None)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _replica_reads.get() and not _pinned.get():
+            return replica_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Explicit, so saving an instance read from the replica still hits the primary
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        pair = {DEFAULT_DB_ALIAS, replica_alias()}
+        if obj1._state.db in pair and obj2._state.db in pair:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica receives the schema from the primary
+        return db != replica_alias()
+
+
+class ReadYourWritesMiddleware:
+    """
+    Pin a caller to the primary for a while after their write requests succeed.
+    Runs after ``accounts.middleware.TelegramUserMiddleware``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if replica_alias() is None:
+            return self.get_response(request)
+        caller = request_caller(request)
+        with pinned_to_primary(is_pinned(caller)):
+            response = self.get_response(request)
+        if request.method not in SAFE_METHODS and response.status_code < 400 and caller:
+            pin(caller)
+        return response
+
+
+class ReplicaReadsMixin:
+    """
+    Serve safe-method requests of a view from the read replica.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method in SAFE_METHODS:
+            with replica_reads():
+                return super().dispatch(request, *args, **kwargs)
+        return super().dispatch(request, *args, **kwargs)
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class LocalCacheTestRunner(DiscoverRunner):
+    """
+    Runs the suite with every cache alias in local memory, so tests never
+    read or write the file caches under ``BASE_DIR/.cache``.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._local_caches = override_settings(CACHES={
+            alias: {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": f"test-{alias}"}
+            for alias in settings.CACHES
+        })
+        self._local_caches.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._local_caches.disable()
+        super().teardown_test_environment(**kwargs)
@@ -15,9 +15,9 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path,include
+from django.urls import path,include,re_path
 from django.conf import settings
-from django.conf.urls.static import static
+from services.media import serve_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -27,5 +27,7 @@ urlpatterns = [
     path('api/admin/', include('admins.urls')),
 ]
 
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+# Served in every environment, with cache headers and byte ranges (services/media.py)
+urlpatterns += [
+    re_path(r'^%s/(?P<path>.+)$' % settings.MEDIA_URL.strip('/'), serve_media, name='media'),
+]
\ No newline at end of file
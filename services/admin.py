@@ -1,6 +1,6 @@
 from django.contrib import admin
 from .models import Service
-from .models import ServiceCategory, ServiceReview
+from .models import MediaBlob, ServiceCategory, ServiceReview
 
 class ServiceAdmin(admin.ModelAdmin):
     list_display = ['title', 'provider', 'price', 'available', 'created_at']
@@ -18,4 +18,10 @@ class ServiceReviewAdmin(admin.ModelAdmin):
     list_display = ['service', 'reviewer', 'rating', 'created_at']
     search_fields = ['service__title', 'reviewer__username']
     list_filter = ['rating', 'created_at']
-    ordering = ['-created_at']
\ No newline at end of file
+    ordering = ['-created_at']
+
+@admin.register(MediaBlob)
+class MediaBlobAdmin(admin.ModelAdmin):
+    list_display = ['name', 'size', 'refcount', 'created_at']
+    search_fields = ['digest']
+    readonly_fields = ['digest', 'name', 'size', 'refcount', 'created_at']
@@ -0,0 +1,92 @@
+import hashlib
+import threading
+from datetime import timedelta
+
+from cachetools import TTLCache
+from django.conf import settings
+from django.utils import timezone
+
+
+def normalize_query(query):
+    return " ".join(query.lower().split())[:255]
+
+
+def categories_version(categories):
+    """
+    Stable fingerprint of the category set offered to the classifier.
+    """
+    names = sorted({name for name in categories if name})
+    return hashlib.sha256("\x1f".join(names).encode("utf-8")).hexdigest()
+
+
+class ClassificationCache:
+    """
+    Two-tier cache for ``classify_query_categories`` results.
+
+    Entries are keyed by the normalized query and the version of the category
+    set, so renaming or adding a category naturally misses old answers. The
+    in-process LRU avoids a query on hot searches; the ``CategoryClassification``
+    table survives restarts and is shared across gunicorn workers.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = None
+
+    def _ttl(self):
+        return getattr(settings, "AI_CLASSIFICATION_TTL", 7 * 24 * 60 * 60)
+
+    def _lru(self):
+        if self._local is None:
+            self._local = TTLCache(
+                maxsize=getattr(settings, "AI_CLASSIFICATION_LRU_SIZE", 1024),
+                ttl=self._ttl(),
+            )
+        return self._local
+
+    def get(self, query, version):
+        from .models import CategoryClassification
+
+        key = (normalize_query(query), version)
+        with self._lock:
+            cached = self._lru().get(key)
+        if cached is not None:
+            return list(cached)
+
+        row = (
+            CategoryClassification.objects
+            .filter(query=key[0], categories_version=version, expires_at__gt=timezone.now())
+            .values_list("categories", flat=True)
+            .first()
+        )
+        if row is None:
+            return None
+        with self._lock:
+            self._lru()[key] = tuple(row)
+        return list(row)
+
+    def set(self, query, version, categories):
+        from .models import CategoryClassification
+
+        key = (normalize_query(query), version)
+        with self._lock:
+            self._lru()[key] = tuple(categories)
+        CategoryClassification.objects.update_or_create(
+            query=key[0],
+            categories_version=version,
+            defaults={
+                "categories": list(categories),
+                "expires_at": timezone.now() + timedelta(seconds=self._ttl()),
+            },
+        )
+
+    def invalidate(self):
+        from .models import CategoryClassification
+
+        with self._lock:
+            if self._local is not None:
+                self._local.clear()
+        CategoryClassification.objects.all().delete()
+
+
+classification_cache = ClassificationCache()
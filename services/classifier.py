@@ -0,0 +1,126 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from django.conf import settings
+from django.db import connection
+from dotenv import load_dotenv
+from groq import Groq
+
+from . import metrics
+from .classification_cache import classification_cache, normalize_query
+
+load_dotenv()
+
+_client = None
+_client_lock = threading.Lock()
+_executor = None
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def get_groq_client():
+    """
+    Process-wide Groq client so connections are reused across requests.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = Groq(
+                    api_key=os.getenv("GROQ_API_KEY"),
+                    timeout=getattr(settings, "AI_CLASSIFICATION_REQUEST_TIMEOUT", 20),
+                    max_retries=0,
+                )
+    return _client
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _client_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, "AI_CLASSIFICATION_WORKERS", 4),
+                    thread_name_prefix="ai-classify",
+                )
+    return _executor
+
+
+def classify_query_categories(search_query: str, possible_categories: list[str]) -> list[str]:
+    client = get_groq_client()
+
+    prompt = (
+        f"You are an expert classifier. Given the user search query: \"{search_query}\", "
+        f"choose which of the following service categories it belongs to: {', '.join(possible_categories)}. "
+        "You are an API. Only respond with a valid JSON array of category names that best match the following service search query.No extra text. No explanations. Example: ['Tutoring', 'Education']."
+        "If the query does not match any category, return an empty array."
+        )
+
+    response = client.chat.completions.create(
+        messages=[
+            {"role": "system", "content": "You classify user queries into service categories."},
+            {"role": "user", "content": prompt},
+        ],
+        model="llama-3.3-70b-versatile",  # or use 'compound-beta' for built-in web search support :contentReference[oaicite:1]{index=1}
+    )
+
+    ai_response = response.choices[0].message.content
+
+    raw = ai_response.strip()
+
+    # First, try parsing normally
+    try:
+        categories = json.loads(raw)
+        # If it's a string that contains JSON, parse again
+        if isinstance(categories, str):
+            categories = json.loads(categories)
+    except json.JSONDecodeError:
+        categories = []
+
+    # Ensure it's a list of strings
+    if not isinstance(categories, list):
+        categories = []
+
+    return categories
+
+
+def _classify_and_store(key, query, possible_categories, version):
+    try:
+        categories = classify_query_categories(query, possible_categories)
+        classification_cache.set(query, version, categories)
+        return categories
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+        # Worker threads open their own DB connection; don't leak it.
+        connection.close()
+
+
+def classify_with_deadline(query, possible_categories, version):
+    """
+    Classify ``query`` within ``AI_CLASSIFICATION_BUDGET`` seconds.
+
+    Returns the categories, or ``None`` when the budget runs out or the model
+    call fails. A late call keeps running in the background and fills the
+    classification cache for the next request; concurrent requests for the same
+    query share one in-flight call.
+    """
+    key = (normalize_query(query), version)
+    with _inflight_lock:
+        future = _inflight.get(key)
+        if future is None:
+            future = _get_executor().submit(
+                _classify_and_store, key, query, possible_categories, version
+            )
+            _inflight[key] = future
+
+    try:
+        return future.result(timeout=getattr(settings, "AI_CLASSIFICATION_BUDGET", 1.5))
+    except TimeoutError:
+        metrics.incr("ai_classification.deadline_exceeded")
+        return None
+    except Exception:
+        metrics.incr("ai_classification.errors")
+        return None
@@ -0,0 +1,200 @@
+"""
+Full-text index over services.
+
+SQLite uses an FTS5 virtual table, PostgreSQL a tsvector table with a GIN
+index; both are created by migration 0004 and kept in sync by the signals in
+``services/signals.py``. Other backends report ``None`` from ``search`` so
+callers fall back to ``icontains``.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection, connections, router
+
+SQLITE_TABLE = "services_service_fts"
+POSTGRES_TABLE = "services_service_search"
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Joined source rows used to (re)populate a whole index in one statement.
+_SOURCE_SQL = (
+    "FROM services_service s "
+    "LEFT JOIN services_servicecategory c ON c.id = s.category_id "
+    "LEFT JOIN accounts_user u ON u.id = s.provider_id"
+)
+
+
+def _tokens(query):
+    return _TOKEN_RE.findall(query.lower())[:10]
+
+
+def _documents(service_ids):
+    from .models import Service
+
+    return list(
+        Service.objects.filter(id__in=service_ids).values_list(
+            "id", "title", "description", "category__name", "provider__full_name"
+        )
+    )
+
+
+class SQLiteBackend:
+    def create(self, cursor):
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_TABLE} USING fts5("
+            "title, description, category, provider, tokenize='unicode61 remove_diacritics 2')"
+        )
+
+    def drop(self, cursor):
+        cursor.execute(f"DROP TABLE IF EXISTS {SQLITE_TABLE}")
+
+    def populate(self, cursor):
+        cursor.execute(
+            f"INSERT INTO {SQLITE_TABLE} (rowid, title, description, category, provider) "
+            "SELECT s.id, COALESCE(s.title, ''), COALESCE(s.description, ''), "
+            f"COALESCE(c.name, ''), COALESCE(u.full_name, '') {_SOURCE_SQL}"
+        )
+
+    def index(self, cursor, service_ids):
+        docs = _documents(service_ids)
+        cursor.executemany(
+            f"DELETE FROM {SQLITE_TABLE} WHERE rowid = %s", [(pk,) for pk in service_ids]
+        )
+        cursor.executemany(
+            f"INSERT INTO {SQLITE_TABLE} (rowid, title, description, category, provider) "
+            "VALUES (%s, %s, %s, %s, %s)",
+            [(pk, t or "", d or "", c or "", p or "") for pk, t, d, c, p in docs],
+        )
+
+    def remove(self, cursor, service_ids):
+        cursor.executemany(
+            f"DELETE FROM {SQLITE_TABLE} WHERE rowid = %s", [(pk,) for pk in service_ids]
+        )
+
+    def search(self, cursor, tokens, limit):
+        match = " ".join('"%s"*' % token for token in tokens)
+        # bm25 column weights: title, description, category, provider
+        cursor.execute(
+            f"SELECT rowid FROM {SQLITE_TABLE} WHERE {SQLITE_TABLE} MATCH %s "
+            f"ORDER BY bm25({SQLITE_TABLE}, 10.0, 1.0, 5.0, 3.0) LIMIT %s",
+            [match, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+class PostgresBackend:
+    DOCUMENT = (
+        "setweight(to_tsvector('simple', %s), 'A') || "
+        "setweight(to_tsvector('simple', %s), 'B') || "
+        "setweight(to_tsvector('simple', %s), 'C') || "
+        "setweight(to_tsvector('simple', %s), 'D')"
+    )
+
+    def create(self, cursor):
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {POSTGRES_TABLE} ("
+            "service_id bigint PRIMARY KEY REFERENCES services_service(id) "
+            "ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+            "document tsvector NOT NULL)"
+        )
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {POSTGRES_TABLE}_document_gin "
+            f"ON {POSTGRES_TABLE} USING gin (document)"
+        )
+
+    def drop(self, cursor):
+        cursor.execute(f"DROP TABLE IF EXISTS {POSTGRES_TABLE}")
+
+    def populate(self, cursor):
+        document = self.DOCUMENT % (
+            "COALESCE(s.title, '')",
+            "COALESCE(c.name, '')",
+            "COALESCE(u.full_name, '')",
+            "COALESCE(s.description, '')",
+        )
+        cursor.execute(
+            f"INSERT INTO {POSTGRES_TABLE} (service_id, document) "
+            f"SELECT s.id, {document} {_SOURCE_SQL}"
+        )
+
+    def index(self, cursor, service_ids):
+        cursor.executemany(
+            f"INSERT INTO {POSTGRES_TABLE} (service_id, document) VALUES (%s, {self.DOCUMENT}) "
+            "ON CONFLICT (service_id) DO UPDATE SET document = EXCLUDED.document",
+            [(pk, t or "", c or "", p or "", d or "") for pk, t, d, c, p in _documents(service_ids)],
+        )
+
+    def remove(self, cursor, service_ids):
+        cursor.execute(
+            f"DELETE FROM {POSTGRES_TABLE} WHERE service_id = ANY(%s)", [list(service_ids)]
+        )
+
+    def search(self, cursor, tokens, limit):
+        tsquery = " & ".join("%s:*" % token for token in tokens)
+        cursor.execute(
+            f"SELECT service_id FROM {POSTGRES_TABLE} "
+            "WHERE document @@ to_tsquery('simple', %s) "
+            "ORDER BY ts_rank(document, to_tsquery('simple', %s)) DESC LIMIT %s",
+            [tsquery, tsquery, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+BACKENDS = {
+    "sqlite": SQLiteBackend(),
+    "postgresql": PostgresBackend(),
+}
+
+
+def get_backend(conn=None):
+    return BACKENDS.get((conn or connection).vendor)
+
+
+def index_services(service_ids):
+    backend = get_backend()
+    service_ids = list(service_ids)
+    if backend is None or not service_ids:
+        return
+    with connection.cursor() as cursor:
+        backend.index(cursor, service_ids)
+
+
+def remove_services(service_ids):
+    backend = get_backend()
+    service_ids = list(service_ids)
+    if backend is None or not service_ids:
+        return
+    with connection.cursor() as cursor:
+        backend.remove(cursor, service_ids)
+
+
+def rebuild(conn=None):
+    conn = conn or connection
+    backend = get_backend(conn)
+    if backend is None:
+        return
+    with conn.cursor() as cursor:
+        backend.drop(cursor)
+        backend.create(cursor)
+        backend.populate(cursor)
+
+
+def search(query, limit=None):
+    """
+    Return service ids matching ``query``, most relevant first, or ``None``
+    when the database has no full-text backend.
+    """
+    from .models import Service
+
+    # Catalog reads may be routed to the replica (config/routers.py)
+    conn = connections[router.db_for_read(Service)]
+    backend = get_backend(conn)
+    if backend is None:
+        return None
+    tokens = _tokens(query)
+    if not tokens:
+        return []
+    if limit is None:
+        limit = getattr(settings, "FULLTEXT_SEARCH_LIMIT", 200)
+    with conn.cursor() as cursor:
+        return backend.search(cursor, tokens, limit)
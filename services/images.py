@@ -0,0 +1,202 @@
+"""
+Resized WebP derivatives of ``Service.image``.
+
+Each source image is decoded once, rotated upright from its EXIF
+orientation and re-encoded as WebP at every width in
+``SERVICE_IMAGE_WIDTHS`` (never upscaled) without any metadata. Files are
+named after the sha256 of the source bytes, so identical uploads share
+derivatives and a name never changes meaning. ``Service.image_variants``
+records which source the derivatives belong to, letting the serializer
+build a ``srcset`` without touching storage. Reads never generate: a
+service without a current record serves the original image only and is
+queued for a background worker (``manage.py generate_image_variants``
+backfills in bulk).
+"""
+import hashlib
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+
+DERIVATIVE_DIR = "service_images/derived"
+ORIENTATION_TAG = 0x0112
+
+_executor = None
+_queued = set()  # service ids waiting for or being generated
+_queue_lock = threading.Lock()
+
+
+def widths():
+    return tuple(sorted(getattr(settings, "SERVICE_IMAGE_WIDTHS", (320, 640, 1280))))
+
+
+def derivative_name(digest, width):
+    return f"{DERIVATIVE_DIR}/{digest[:32]}-{width}w.webp"
+
+
+def _encode(image, width):
+    if image.width > width:
+        height = max(1, round(image.height * width / image.width))
+        image = image.resize((width, height), Image.LANCZOS)
+    buffer = io.BytesIO()
+    # No exif=/icc_profile= arguments: the output carries no metadata
+    image.save(buffer, "WEBP", quality=getattr(settings, "SERVICE_IMAGE_QUALITY", 80), method=4)
+    return buffer.getvalue()
+
+
+def _source_width(fp):
+    """Upright width of the image, read from the header only."""
+    with Image.open(fp) as probe:
+        width, height = probe.size
+        if probe.getexif().get(ORIENTATION_TAG, 1) in (5, 6, 7, 8):
+            return height
+        return width
+
+
+def _target_widths(source_width):
+    # Never upscale: widths past the source collapse into one full-size copy
+    return sorted({min(width, source_width) for width in widths()})
+
+
+def generate(field_file):
+    """
+    Write the derivatives of ``field_file`` (skipping ones already on disk)
+    and return the ``image_variants`` record for it.
+    """
+    with field_file.storage.open(field_file.name, "rb") as source:
+        data = source.read()
+    digest = hashlib.sha256(data).hexdigest()
+
+    targets = _target_widths(_source_width(io.BytesIO(data)))
+
+    image = None
+    variants = {}
+    for width in targets:
+        name = derivative_name(digest, width)
+        # Derivatives carry their own content-derived names; they go to the
+        # plain default storage rather than the blob store
+        if not default_storage.exists(name):
+            if image is None:
+                image = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+                if image.mode not in ("RGB", "RGBA"):
+                    image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+            name = default_storage.save(name, ContentFile(_encode(image, width)))
+        variants[str(width)] = name
+    return {"source": field_file.name, "digest": digest, "configured": list(widths()), "widths": variants}
+
+
+def delete_derivatives(storage, name):
+    """
+    Remove the derivatives of the blob ``name`` (``blobs/<aa>/<sha256><ext>``)
+    unless a service still records them; call before the blob itself goes.
+    """
+    from .models import Service
+
+    digest = os.path.splitext(os.path.basename(name))[0]
+    # A legacy upload with the same bytes shares these files
+    if Service.objects.filter(image_variants__digest=digest).exists():
+        return
+    try:
+        with storage.open(name, "rb") as source:
+            targets = _target_widths(_source_width(source))
+    except (OSError, Image.DecompressionBombError):
+        return  # undecodable source: nothing was generated
+    for width in targets:
+        default_storage.delete(derivative_name(digest, width))
+
+
+def is_current(service):
+    variants = service.image_variants or {}
+    return (
+        bool(service.image)
+        and variants.get("source") == service.image.name
+        and variants.get("configured") == list(widths())
+    )
+
+
+def ensure_variants(service, force=False):
+    """
+    Generate missing or stale derivatives for ``service`` and persist the
+    record; returns ``{width: storage name}``.
+    """
+    from .models import Service
+
+    if not service.image:
+        if service.image_variants:
+            Service.objects.filter(pk=service.pk).update(image_variants={})
+            service.image_variants = {}
+        return {}
+    if force or not is_current(service):
+        try:
+            service.image_variants = generate(service.image)
+        except (OSError, Image.DecompressionBombError):
+            # Missing or undecodable source: serve the original only, and
+            # remember that so later requests don't retry
+            service.image_variants = {
+                "source": service.image.name, "configured": list(widths()), "widths": {},
+            }
+        Service.objects.filter(pk=service.pk).update(image_variants=service.image_variants)
+    return service.image_variants["widths"]
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _queue_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, "SERVICE_IMAGE_WORKERS", 1),
+                    thread_name_prefix="image-variants",
+                )
+    return _executor
+
+
+def _generate_queued(service_id):
+    from .models import Service
+
+    try:
+        service = Service.objects.filter(pk=service_id).only("id", "image", "image_variants").first()
+        if service is not None:
+            ensure_variants(service)
+    finally:
+        with _queue_lock:
+            _queued.discard(service_id)
+        # Worker threads open their own DB connection; don't leak it.
+        connection.close()
+
+
+def _submit(service_id):
+    with _queue_lock:
+        if service_id in _queued:
+            return
+        _queued.add(service_id)
+    _get_executor().submit(_generate_queued, service_id)
+
+
+def queue_variants(service):
+    """Generate ``service``'s derivatives in the background, once per service at a time."""
+    service_id = service.pk
+    transaction.on_commit(lambda: _submit(service_id))
+
+
+def srcset(service, request=None):
+    """
+    ``{"320w": url, ...}`` for the service image; empty (the original only)
+    until its derivatives are recorded.
+    """
+    if not service.image:
+        return {}
+    if not is_current(service):
+        queue_variants(service)
+        return {}
+    result = {}
+    for width, name in service.image_variants["widths"].items():
+        url = default_storage.url(name)
+        result[f"{width}w"] = request.build_absolute_uri(url) if request is not None else url
+    return result
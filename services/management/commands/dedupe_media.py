@@ -0,0 +1,46 @@
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F
+
+from services.models import MediaBlob, Service
+from services.storage import is_blob
+
+
+class Command(BaseCommand):
+    help = (
+        "Move service images stored under their upload names into the "
+        "content-addressed blob store, one blob per distinct file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--delete-originals", action="store_true",
+                            help="Remove each original file once every service points at its blob.")
+
+    def handle(self, *args, **options):
+        storage = Service._meta.get_field("image").storage
+        legacy = (
+            Service.objects.exclude(image="").exclude(image__isnull=True)
+            .values("image").annotate(references=Count("id")).order_by()
+        )
+        moved = services = 0
+        for row in legacy:
+            name = row["image"]
+            if is_blob(name):
+                continue
+            if not storage.exists(name):
+                self.stderr.write(f"missing: {name}")
+                continue
+            with transaction.atomic():
+                with storage.open(name, "rb") as original:
+                    new_name = storage.save(name, File(original, name=name))  # first reference
+                MediaBlob.objects.filter(name=new_name).update(refcount=F("refcount") + row["references"] - 1)
+                services += Service.objects.filter(image=name).update(image=new_name)
+            if options["delete_originals"]:
+                # Plain FileSystemStorage.delete: the storage's own delete() only releases blobs
+                super(type(storage), storage).delete(name)
+            moved += 1
+            self.stdout.write(f"{name} -> {new_name} ({row['references']} services)")
+        self.stdout.write(self.style.SUCCESS(
+            f"Moved {moved} files for {services} services; run generate_image_variants to refresh derivative records."
+        ))
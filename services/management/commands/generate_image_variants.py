@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from services import images
+from services.models import Service
+
+
+class Command(BaseCommand):
+    help = "Generate resized WebP derivatives for existing service images."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true",
+                            help="Regenerate the record even when it looks current.")
+
+    def handle(self, *args, **options):
+        by_source = {}  # one decode per distinct file, however many services share it
+        processed = skipped = 0
+        for service in Service.objects.exclude(image="").exclude(image__isnull=True).only("id", "image", "image_variants").iterator():
+            if not options["force"] and images.is_current(service):
+                skipped += 1
+                continue
+            record = by_source.get(service.image.name)
+            if record is None:
+                images.ensure_variants(service, force=True)
+                by_source[service.image.name] = service.image_variants
+            else:
+                Service.objects.filter(pk=service.pk).update(image_variants=record)
+            processed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {processed} services ({len(by_source)} distinct images), {skipped} already current."
+        ))
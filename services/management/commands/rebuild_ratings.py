@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from services.models import Service
+from services.ratings import refresh_ratings
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized rating_avg/rating_count of every service."
+
+    def handle(self, *args, **options):
+        updated = refresh_ratings(Service.objects.all())
+        self.stdout.write(self.style.SUCCESS(f"Refreshed ratings for {updated} services."))
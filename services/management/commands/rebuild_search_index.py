@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from services import fulltext
+
+
+class Command(BaseCommand):
+    help = "Drop and repopulate the full-text search index over services."
+
+    def handle(self, *args, **options):
+        if fulltext.get_backend() is None:
+            self.stdout.write(self.style.WARNING("No full-text backend for this database; nothing to do."))
+            return
+        fulltext.rebuild()
+        self.stdout.write(self.style.SUCCESS("Search index rebuilt."))
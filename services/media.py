@@ -0,0 +1,116 @@
+"""
+Media file serving with HTTP caching and byte ranges.
+
+Content-addressed names (``blobs/`` from services/storage.py and the image
+derivatives from services/images.py) never change content, so they are
+served ``immutable`` with a year-long ``max-age`` and an ``ETag`` taken
+from the name itself. Any other file gets a short ``max-age`` and an
+``ETag`` from its size and mtime. ``If-None-Match`` is answered with 304
+and a single ``Range: bytes=`` request with 206.
+"""
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_safe
+
+from .images import DERIVATIVE_DIR
+from .storage import BLOB_DIR
+
+IMMUTABLE_PREFIXES = (f"{BLOB_DIR}/", f"{DERIVATIVE_DIR}/")
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+CHUNK_SIZE = 64 * 1024
+
+
+def is_immutable(path):
+    return path.startswith(IMMUTABLE_PREFIXES)
+
+
+def etag_for(path, stat):
+    if is_immutable(path):
+        return quote_etag(os.path.splitext(os.path.basename(path))[0])
+    return quote_etag(f"{stat.st_size:x}-{int(stat.st_mtime):x}")
+
+
+def parse_range(header, size):
+    """
+    ``(start, end)`` inclusive for a single satisfiable ``bytes=`` range,
+    ``None`` to ignore the header, or ``False`` when it cannot be satisfied.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match or match.groups() == ("", ""):
+        return None  # absent, multi-range or malformed: send the whole file
+    first, last = match.groups()
+    if first == "":
+        length = int(last)
+        if length == 0:
+            return False
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _read_range(path, start, length):
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+@require_safe
+def serve_media(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except Exception:
+        raise Http404("Invalid path.")
+    if not os.path.isfile(full_path):
+        raise Http404("File not found.")
+
+    stat = os.stat(full_path)
+    etag = etag_for(path, stat)
+    if is_immutable(path):
+        cache_control = f"public, max-age={getattr(settings, 'MEDIA_IMMUTABLE_MAX_AGE', 31536000)}, immutable"
+    else:
+        cache_control = f"public, max-age={getattr(settings, 'MEDIA_MAX_AGE', 300)}"
+    headers = {
+        "ETag": etag,
+        "Last-Modified": http_date(stat.st_mtime),
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes",
+    }
+
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]):
+        response = HttpResponseNotModified()
+    else:
+        content_type = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+        byte_range = parse_range(request.headers.get("Range"), stat.st_size)
+        if_range = request.headers.get("If-Range")
+        if if_range and if_range.strip() != etag:
+            byte_range = None  # the client's copy is stale: send it all
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{stat.st_size}"
+        elif byte_range:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                _read_range(full_path, start, end - start + 1), status=206, content_type=content_type
+            )
+            response["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+            response["Content-Length"] = str(end - start + 1)
+        else:
+            response = FileResponse(open(full_path, "rb"), content_type=content_type)
+    for name, value in headers.items():
+        response[name] = value
+    return response
@@ -0,0 +1,24 @@
+import logging
+import threading
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_counters = Counter()
+
+
+def incr(name, amount=1):
+    with _lock:
+        _counters[name] += amount
+    logger.info("metric %s +%s", name, amount)
+
+
+def snapshot():
+    with _lock:
+        return dict(_counters)
+
+
+def reset():
+    with _lock:
+        _counters.clear()
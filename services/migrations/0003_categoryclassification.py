@@ -0,0 +1,27 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0002_service_image'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryClassification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('query', models.CharField(max_length=255)),
+                ('categories_version', models.CharField(max_length=64)),
+                ('categories', models.JSONField(default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'unique_together': {('query', 'categories_version')},
+            },
+        ),
+    ]
@@ -0,0 +1,59 @@
+from django.db import migrations
+
+# The DDL is spelled out here rather than imported from services.fulltext, so
+# later changes to that module cannot change what this migration does.
+SOURCE = (
+    "FROM services_service s "
+    "LEFT JOIN services_servicecategory c ON c.id = s.category_id "
+    "LEFT JOIN accounts_user u ON u.id = s.provider_id"
+)
+
+CREATE = {
+    "sqlite": [
+        "DROP TABLE IF EXISTS services_service_fts",
+        "CREATE VIRTUAL TABLE services_service_fts USING fts5("
+        "title, description, category, provider, tokenize='unicode61 remove_diacritics 2')",
+        "INSERT INTO services_service_fts (rowid, title, description, category, provider) "
+        "SELECT s.id, COALESCE(s.title, ''), COALESCE(s.description, ''), "
+        f"COALESCE(c.name, ''), COALESCE(u.full_name, '') {SOURCE}",
+    ],
+    "postgresql": [
+        "DROP TABLE IF EXISTS services_service_search",
+        "CREATE TABLE services_service_search ("
+        "service_id bigint PRIMARY KEY REFERENCES services_service(id) "
+        "ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+        "document tsvector NOT NULL)",
+        "CREATE INDEX services_service_search_document_gin "
+        "ON services_service_search USING gin (document)",
+        "INSERT INTO services_service_search (service_id, document) SELECT s.id, "
+        "setweight(to_tsvector('simple', COALESCE(s.title, '')), 'A') || "
+        "setweight(to_tsvector('simple', COALESCE(c.name, '')), 'B') || "
+        "setweight(to_tsvector('simple', COALESCE(u.full_name, '')), 'C') || "
+        f"setweight(to_tsvector('simple', COALESCE(s.description, '')), 'D') {SOURCE}",
+    ],
+}
+
+DROP = {
+    "sqlite": ["DROP TABLE IF EXISTS services_service_fts"],
+    "postgresql": ["DROP TABLE IF EXISTS services_service_search"],
+}
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        # Other backends have no index; services.fulltext falls back to icontains
+        for sql in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_telegramuser'),
+        ('services', '0003_categoryclassification'),
+    ]
+
+    operations = [
+        migrations.RunPython(_run(CREATE), _run(DROP)),
+    ]
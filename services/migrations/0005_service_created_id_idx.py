@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_telegramuser'),
+        ('services', '0004_service_fulltext_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='service',
+            index=models.Index(fields=['-created_at', '-id'], name='service_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:13
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_ratings(apps, schema_editor):
+    Service = apps.get_model('services', 'Service')
+    ServiceReview = apps.get_model('services', 'ServiceReview')
+
+    def aggregate(field, expression, default):
+        reviews = (
+            ServiceReview.objects.filter(service=OuterRef('pk'))
+            .order_by().values('service').annotate(value=expression).values('value')
+        )
+        return Coalesce(Subquery(reviews, output_field=field), Value(default))
+
+    Service.objects.update(
+        rating_avg=aggregate(models.FloatField(), Avg('rating'), 0.0),
+        rating_count=aggregate(models.PositiveIntegerField(), Count('id'), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_telegramuser'),
+        ('services', '0005_service_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='service',
+            name='rating_avg',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='service',
+            index=models.Index(fields=['-rating_avg', '-rating_count'], name='service_rating_idx'),
+        ),
+        migrations.RunPython(backfill_ratings, migrations.RunPython.noop),
+    ]
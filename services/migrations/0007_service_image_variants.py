@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0006_service_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='service',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from accounts.models import User
+from .storage import service_image_storage
 
 class ServiceCategory(models.Model):
     name = models.CharField(max_length=100, unique=True)
@@ -22,11 +23,22 @@ class Service(models.Model):
     location = models.CharField(max_length=255, blank=True, null=True)
     available = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
-    image = models.ImageField(upload_to='service_images/', blank=True, null=True)
+    image = models.ImageField(upload_to='service_images/', storage=service_image_storage, blank=True, null=True)
+    # Resized WebP copies of ``image`` (services/images.py)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+    # Denormalized from ServiceReview, kept current by services.ratings
+    rating_avg = models.FloatField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of the catalog (ServiceCursorPagination)
+            models.Index(fields=['-created_at', '-id'], name='service_created_id_idx'),
+            models.Index(fields=['-rating_avg', '-rating_count'], name='service_rating_idx'),
+        ]
 
     def average_rating(self):
-        reviews = self.reviews.all()
-        return reviews.aggregate(models.Avg("rating"))["rating__avg"] or 0
+        return self.rating_avg
 
     def __str__(self):
         return self.title
@@ -52,3 +64,34 @@ class ServiceReview(models.Model):
 
     def __str__(self):
         return f"{self.rating}★ - {self.service.title}"
+
+
+class CategoryClassification(models.Model):
+    """
+    Persistent tier of the AI category classification cache, shared by all workers.
+    """
+    query = models.CharField(max_length=255)
+    categories_version = models.CharField(max_length=64)
+    categories = models.JSONField(default=list)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        unique_together = ('query', 'categories_version')
+
+    def __str__(self):
+        return f"{self.query} → {self.categories}"
+
+
+class MediaBlob(models.Model):
+    """
+    One stored file of the content-addressed media storage (services/storage.py).
+    """
+    digest = models.CharField(max_length=64, unique=True)  # sha256 of the content
+    name = models.CharField(max_length=255, unique=True)
+    size = models.BigIntegerField()
+    refcount = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ×{self.refcount}"
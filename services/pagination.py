@@ -0,0 +1,23 @@
+from rest_framework.pagination import CursorPagination
+
+from .search import RANK_ANNOTATION
+
+
+class ServiceCursorPagination(CursorPagination):
+    """
+    Keyset pagination for the service catalog.
+
+    Plain listings page newest first on ``(created_at, id)``; search results
+    keep their relevance order by paging on the ``search_rank`` annotation set
+    by ``order_by_ids``. ``?ordering=`` from ``OrderingFilter`` is honoured
+    otherwise.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        if RANK_ANNOTATION in queryset.query.annotations:
+            return (RANK_ANNOTATION,)
+        return super().get_ordering(request, queryset, view)
@@ -0,0 +1,30 @@
+from django.db.models import Avg, Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Service, ServiceReview
+
+
+def _aggregate(field, aggregate, default):
+    reviews = (
+        ServiceReview.objects
+        .filter(service=OuterRef('pk'))
+        .order_by()
+        .values('service')
+        .annotate(value=aggregate)
+        .values('value')
+    )
+    return Coalesce(Subquery(reviews, output_field=field), Value(default))
+
+
+def refresh_ratings(queryset):
+    """
+    Recompute ``rating_avg``/``rating_count`` for ``queryset`` in a single UPDATE.
+    """
+    return queryset.update(
+        rating_avg=_aggregate(Service._meta.get_field('rating_avg'), Avg('rating'), 0.0),
+        rating_count=_aggregate(Service._meta.get_field('rating_count'), Count('id'), 0),
+    )
+
+
+def refresh_service_rating(service_id):
+    return refresh_ratings(Service.objects.filter(pk=service_id))
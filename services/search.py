@@ -0,0 +1,106 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db import models
+from django.db.models import Case, When
+from rapidfuzz import fuzz, process
+
+
+class FuzzyTitleIndex:
+    """
+    In-process fuzzy index over service titles.
+
+    Titles are kept pre-lowercased in a dict keyed by service id so a search is
+    a single batched ``rapidfuzz.process.extract`` call instead of a Python loop
+    over every row. The corpus is built lazily, patched in place by the
+    ``Service`` save/delete signals and rebuilt after ``FUZZY_INDEX_TTL`` seconds
+    so that workers which did not see a write still converge.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._titles = None
+        self._built_at = 0.0
+
+    def _ttl(self):
+        return getattr(settings, "FUZZY_INDEX_TTL", 300)
+
+    def _load(self):
+        from .models import Service
+
+        return {
+            pk: (title or "").lower()
+            for pk, title in Service.objects.values_list("id", "title").iterator()
+        }
+
+    def _corpus(self):
+        with self._lock:
+            if self._titles is not None and time.monotonic() - self._built_at < self._ttl():
+                return self._titles
+        titles = self._load()
+        with self._lock:
+            self._titles = titles
+            self._built_at = time.monotonic()
+        return titles
+
+    def search(self, query, score_cutoff=None, limit=None):
+        """
+        Return ``[(service_id, score), ...]`` best match first.
+        """
+        if score_cutoff is None:
+            score_cutoff = getattr(settings, "FUZZY_SEARCH_SCORE_CUTOFF", 60)
+        if limit is None:
+            limit = getattr(settings, "FUZZY_SEARCH_LIMIT", 50)
+        titles = self._corpus()
+        if not titles:
+            return []
+        matches = process.extract(
+            query.lower(),
+            titles,
+            scorer=fuzz.WRatio,
+            processor=None,
+            score_cutoff=score_cutoff,
+            limit=limit,
+        )
+        return [(pk, score) for _, score, pk in matches]
+
+    def update(self, pk, title):
+        with self._lock:
+            if self._titles is not None:
+                self._titles = {**self._titles, pk: (title or "").lower()}
+
+    def remove(self, pk):
+        with self._lock:
+            if self._titles is not None and pk in self._titles:
+                titles = dict(self._titles)
+                del titles[pk]
+                self._titles = titles
+
+    def clear(self):
+        with self._lock:
+            self._titles = None
+            self._built_at = 0.0
+
+
+title_index = FuzzyTitleIndex()
+
+
+RANK_ANNOTATION = "search_rank"
+
+
+def order_by_ids(queryset, ids):
+    """
+    Restrict ``queryset`` to ``ids`` and keep their order, exposed as ``search_rank``.
+    """
+    if not ids:
+        return queryset.none()
+    preserved_order = Case(
+        *[When(pk=pk, then=pos) for pos, pk in enumerate(ids)],
+        output_field=models.IntegerField()
+    )
+    return (
+        queryset.filter(id__in=ids)
+        .annotate(**{RANK_ANNOTATION: preserved_order})
+        .order_by(RANK_ANNOTATION)
+    )
@@ -1,5 +1,51 @@
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 from .models import Service, ServiceCategory, ServiceReview
+from . import images
+
+
+def parse_csv_param(value):
+    """
+    ``"a, b,,c"`` -> ``{"a", "b", "c"}``
+    """
+    return {item.strip() for item in (value or "").split(",") if item.strip()}
+
+
+class DynamicFieldsMixin:
+    """
+    Sparse fieldsets and opt-in expansion driven by the serializer context.
+
+    ``context["fields"]`` limits the output to those fields (``id`` is always
+    kept); fields listed in ``expandable_fields`` are only rendered when named
+    in ``context["expand"]``. On writes every field is still validated and
+    saved, and only the rendered response is trimmed.
+    """
+    expandable_fields = ()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        expand = self.context.get("expand") or set()
+        for name in self.expandable_fields:
+            if name not in expand:
+                self.fields.pop(name, None)
+
+        self._output_fields = None
+        fields = self.context.get("fields")
+        if fields:
+            request = self.context.get("request")
+            if request is None or request.method in SAFE_METHODS:
+                # Read-only: drop the fields up front so they are never computed
+                for name in set(self.fields) - set(fields) - {"id"}:
+                    self.fields.pop(name)
+            else:
+                self._output_fields = set(fields) | {"id"}
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if self._output_fields is not None:
+            for name in set(data) - self._output_fields:
+                del data[name]
+        return data
 
 class ServiceCategorySerializer(serializers.ModelSerializer):
     class Meta:
@@ -20,12 +66,43 @@ class ServiceReviewSerializer(serializers.ModelSerializer):
         return value
 
 
-class ServiceSerializer(serializers.ModelSerializer):
+class ImageSrcsetMixin:
+    """
+    ``image_srcset``: ``{"320w": url, ...}`` WebP derivatives of ``image``.
+    """
+
+    def get_image_srcset(self, obj):
+        return images.srcset(obj, self.context.get("request"))
+
+
+class ServiceSerializer(ImageSrcsetMixin, DynamicFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = ('reviews',)
     provider_name = serializers.CharField(source='provider.full_name', read_only=True)
-    average_rating = serializers.FloatField(read_only=True)
+    average_rating = serializers.FloatField(source='rating_avg', read_only=True)
     reviews = ServiceReviewSerializer(many=True, read_only=True)
+    image_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = Service
-        fields = '__all__'
-        read_only_fields = ["provider"]
+        exclude = ["image_variants"]
+        read_only_fields = ["provider", "rating_avg", "rating_count"]
+
+
+class ServiceSummarySerializer(ImageSrcsetMixin, serializers.ModelSerializer):
+    """
+    Compact service card for embedding in other resources (bookings); reads only
+    columns reachable through ``select_related('service__category', 'service__provider')``.
+    """
+    category_name = serializers.CharField(source='category.name', read_only=True, default=None)
+    provider_name = serializers.CharField(source='provider.full_name', read_only=True)
+    average_rating = serializers.FloatField(source='rating_avg', read_only=True)
+    image_srcset = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Service
+        fields = [
+            'id', 'title', 'price', 'location', 'image', 'image_srcset', 'available',
+            'category', 'category_name', 'provider', 'provider_name',
+            'average_rating', 'rating_count',
+        ]
+        read_only_fields = fields
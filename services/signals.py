@@ -0,0 +1,97 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from accounts.models import User
+
+from . import fulltext, images
+from .classification_cache import classification_cache
+from .models import Service, ServiceCategory
+from .search import title_index
+
+
+@receiver(post_save, sender=Service)
+def index_service_title(sender, instance, **kwargs):
+    title_index.update(instance.pk, instance.title)
+    fulltext.index_services([instance.pk])
+
+
+@receiver(pre_save, sender=Service)
+def remember_service_image(sender, instance, raw=False, **kwargs):
+    instance._previous_image = (
+        Service.objects.filter(pk=instance.pk).values_list("image", flat=True).first()
+        if instance.pk and not raw else None
+    )
+    # An uncommitted file is stored (adding a reference) by this save
+    instance._image_uploaded = bool(instance.image) and not instance.image._committed
+
+
+@receiver(post_save, sender=Service)
+def release_replaced_image(sender, instance, **kwargs):
+    previous = getattr(instance, "_previous_image", None)
+    # Re-uploading the same bytes lands on the same blob name but still added
+    # a reference, which the old one must give back
+    if previous and (previous != instance.image.name or getattr(instance, "_image_uploaded", False)):
+        instance.image.storage.delete(previous)
+
+
+@receiver(post_delete, sender=Service)
+def release_deleted_image(sender, instance, **kwargs):
+    if instance.image:
+        instance.image.storage.delete(instance.image.name)
+
+
+@receiver(post_save, sender=Service)
+def generate_image_variants(sender, instance, raw=False, **kwargs):
+    # At upload time; anything missed is queued on first serialization
+    if not raw and instance.image and not images.is_current(instance):
+        images.ensure_variants(instance)
+
+
+@receiver(post_delete, sender=Service)
+def unindex_service_title(sender, instance, **kwargs):
+    title_index.remove(instance.pk)
+    fulltext.remove_services([instance.pk])
+
+
+@receiver(pre_save, sender=ServiceCategory)
+def remember_category_name(sender, instance, **kwargs):
+    instance._previous_name = (
+        ServiceCategory.objects.filter(pk=instance.pk).values_list("name", flat=True).first()
+        if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=ServiceCategory)
+def invalidate_classifications_on_save(sender, instance, created, **kwargs):
+    if created or getattr(instance, "_previous_name", None) != instance.name:
+        classification_cache.invalidate()
+        if not created:
+            fulltext.index_services(instance.service_set.values_list("id", flat=True))
+
+
+@receiver(pre_delete, sender=ServiceCategory)
+def remember_category_services(sender, instance, **kwargs):
+    instance._service_ids = list(instance.service_set.values_list("id", flat=True))
+
+
+@receiver(post_delete, sender=ServiceCategory)
+def invalidate_classifications_on_delete(sender, instance, **kwargs):
+    classification_cache.invalidate()
+    fulltext.index_services(getattr(instance, "_service_ids", []))
+
+
+@receiver(pre_save, sender=User)
+def remember_provider_name(sender, instance, raw=False, update_fields=None, **kwargs):
+    if not instance.pk or raw or (update_fields is not None and "full_name" not in update_fields):
+        instance._previous_full_name = instance.full_name  # unchanged by this save
+        return
+    instance._previous_full_name = (
+        User.objects.filter(pk=instance.pk).values_list("full_name", flat=True).first()
+    )
+
+
+@receiver(post_save, sender=User)
+def reindex_provider_services(sender, instance, created, **kwargs):
+    # full_name is the only user field in the index
+    if not created and getattr(instance, "_previous_full_name", None) != instance.full_name:
+        fulltext.index_services(instance.services.values_list("id", flat=True))
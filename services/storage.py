@@ -0,0 +1,111 @@
+"""
+Content-addressed media storage for service images.
+
+``ContentAddressedStorage`` stores every upload as
+``blobs/<aa>/<sha256><ext>``: identical files land on the same name, are
+written once and counted in ``MediaBlob.refcount``. ``save()`` adds a
+reference and ``delete()`` drops one; the file is removed after the commit
+that drops the last reference, together with its WebP derivatives
+(``services/signals.py`` calls ``delete()`` when a service loses or
+replaces its image). Names outside ``blobs/`` are
+pre-existing uploads and are left untouched by ``delete()``.
+
+Blob names never change content, so ``services/media.py`` serves them as
+immutable.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+BLOB_DIR = "blobs"
+
+
+def is_blob(name):
+    return bool(name) and name.startswith(f"{BLOB_DIR}/")
+
+
+def blob_name(digest, original_name):
+    ext = os.path.splitext(original_name)[1].lower()
+    return f"{BLOB_DIR}/{digest[:2]}/{digest}{ext}"
+
+
+def digest_of(content):
+    sha = hashlib.sha256()
+    if hasattr(content, "seek"):
+        content.seek(0)
+    for chunk in content.chunks():
+        sha.update(chunk)
+    if hasattr(content, "seek"):
+        content.seek(0)
+    return sha.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+
+    def get_available_name(self, name, max_length=None):
+        # The final name comes from the content in _save(); never suffix it
+        return name
+
+    def _save(self, name, content):
+        from .models import MediaBlob
+
+        digest = digest_of(content)
+        name = blob_name(digest, name)
+        if not self.exists(name):
+            self._write(name, content)
+        with transaction.atomic():
+            if not MediaBlob.objects.filter(digest=digest).update(refcount=F("refcount") + 1):
+                try:
+                    with transaction.atomic():
+                        MediaBlob.objects.create(digest=digest, name=name, size=content.size, refcount=1)
+                except IntegrityError:
+                    # Same content stored concurrently; count this reference too
+                    MediaBlob.objects.filter(digest=digest).update(refcount=F("refcount") + 1)
+        return name
+
+    def _write(self, name, content):
+        # Written beside the target and renamed over it: concurrent writers of
+        # the same blob produce the same bytes, so the last rename is harmless.
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                for chunk in content.chunks():
+                    tmp.write(chunk)
+            os.chmod(tmp_path, self.file_permissions_mode or 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def delete(self, name):
+        """Drop one reference to the blob ``name``; the last one removes the file."""
+        from .models import MediaBlob
+
+        if not is_blob(name):
+            return
+        with transaction.atomic():
+            MediaBlob.objects.filter(name=name).update(refcount=F("refcount") - 1)
+            released = MediaBlob.objects.filter(name=name, refcount__lte=0).delete()[0]
+        if released:
+            transaction.on_commit(lambda: self._remove_if_unreferenced(name))
+
+    def _remove_if_unreferenced(self, name):
+        from .images import delete_derivatives
+        from .models import MediaBlob
+
+        # Re-uploaded since the last reference went away: keep it
+        if not MediaBlob.objects.filter(name=name).exists():
+            delete_derivatives(self, name)  # reads the source's size, so first
+            super().delete(name)
+
+
+def service_image_storage():
+    # MEDIA_ROOT/MEDIA_URL are read lazily, so settings overrides apply
+    return ContentAddressedStorage()
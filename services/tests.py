@@ -1,3 +1,671 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import caches
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from bookings.models import Booking
+from config import routers
+from PIL import Image
+
+from . import classifier, fulltext, images, metrics
+from .classification_cache import ClassificationCache, categories_version, classification_cache
+from .models import CategoryClassification, MediaBlob, Service, ServiceCategory, ServiceReview
+from .search import title_index
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    Primary/replica routing against two SQLite databases: the test database
+    and a file copy of it that is only refreshed by ``sync_replica``.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Registered after the test database setup, which only knows "default"
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.replica_path = os.path.join(cls.tmp.name, "replica.sqlite3")
+        connections.settings["replica"] = {
+            **connections.settings["default"], "NAME": cls.replica_path, "OPTIONS": {},
+        }
+        cls.databases = {"default", "replica"}
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.databases = {"default"}
+        super().tearDownClass()
+        connections["replica"].close()
+        del connections["replica"]
+        del connections.settings["replica"]
+        cls.tmp.cleanup()
+
+    def setUp(self):
+        caches["read_your_writes"].clear()
+        self.client = APIClient()
+        self.sync_replica()
+
+    def sync_replica(self):
+        connections["replica"].close()
+        primary = connections["default"]
+        primary.ensure_connection()
+        target = sqlite3.connect(self.replica_path)
+        try:
+            primary.connection.backup(target)
+        finally:
+            target.close()
+
+    def category_names(self, telegram_id="1"):
+        response = self.client.get(f"/api/services/categories/?telegram_id={telegram_id}")
+        self.assertEqual(response.status_code, 200)
+        return [category["name"] for category in response.json()]
+
+    def test_catalog_reads_come_from_the_replica(self):
+        ServiceCategory.objects.create(name="Plumbing")
+        self.assertEqual(self.category_names(), [])
+        self.sync_replica()
+        self.assertEqual(self.category_names(), ["Plumbing"])
+
+    def test_writes_go_to_the_primary_and_pin_the_writer(self):
+        response = self.client.post("/api/services/categories/?telegram_id=900", {"name": "Painting"}, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(ServiceCategory.objects.using("default").count(), 1)
+        self.assertEqual(ServiceCategory.objects.using("replica").count(), 0)
+
+        self.assertEqual(self.category_names("900"), ["Painting"])  # sees its own write
+        self.assertEqual(self.category_names("901"), [])  # everyone else reads the replica
+
+    def test_pins_are_shared_between_workers(self):
+        self.client.post("/api/services/categories/?telegram_id=902", {"name": "Tiling"}, format="json")
+        # A separate cache connection, as another gunicorn worker would open
+        other_worker = caches.create_connection("read_your_writes")
+        self.assertTrue(other_worker.get(routers._pin_key("902")))
+
+    def test_anonymous_writes_pin_nobody(self):
+        response = self.client.post("/api/services/categories/", {"name": "Roofing"}, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.category_names(""), [])
+
+    def test_dashboard_reads_come_from_the_replica(self):
+        customer = User.objects.create(telegram_id="910")
+        provider = User.objects.create(telegram_id="911", role="pro")
+        service = Service.objects.create(provider=provider, title="Service", description="", price=Decimal("10.00"))
+        Booking.objects.create(
+            service=service, customer=customer, provider=provider,
+            scheduled_date=timezone.now(), price=Decimal("10.00"),
+        )
+        self.assertEqual(self.client.get("/api/admin/dashboard/").json()["pending_bookings"], 0)
+        self.sync_replica()
+        self.assertEqual(self.client.get("/api/admin/dashboard/").json()["pending_bookings"], 1)
+        # Everything outside the analytics/catalog views stays on the primary
+        self.assertEqual(len(self.client.get("/api/bookings/?telegram_id=910").json()), 1)
+
+
+class FuzzyTitleSearchTests(TestCase):
+
+    def setUp(self):
+        title_index.clear()
+        self.provider = User.objects.create(telegram_id="950", role="pro")
+        self.plumbing = self.make_service("Plumbing Repair")
+        self.painting = self.make_service("House Painting")
+        self.tutoring = self.make_service("Math Tutoring")
+
+    def make_service(self, title):
+        return Service.objects.create(provider=self.provider, title=title, description="", price=Decimal("1.00"))
+
+    def test_typos_match_best_first(self):
+        results = title_index.search("plumbng")
+        self.assertEqual(results[0][0], self.plumbing.pk)
+        self.assertNotIn(self.tutoring.pk, [pk for pk, _ in results])
+        self.assertEqual([pk for pk, _ in title_index.search("paintng")][:1], [self.painting.pk])
+        self.assertEqual(title_index.search("zzzz"), [])
+
+    def test_index_patched_by_signals_without_a_reload(self):
+        title_index.search("warm up")  # builds the corpus
+        with self.assertNumQueries(0):
+            self.assertEqual(title_index.search("plumbing repair")[0][0], self.plumbing.pk)
+        electrical = self.make_service("Electrical Wiring")
+        self.plumbing.delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(title_index.search("electrcal")[0][0], electrical.pk)
+            self.assertNotIn(self.plumbing.pk, [pk for pk, _ in title_index.search("plumbing repair")])
+
+    def test_search_endpoint_keeps_match_order(self):
+        response = APIClient().get("/api/services/?search=math tutorng&fields=id,title")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"][0], {"id": self.tutoring.pk, "title": "Math Tutoring"})
+
+
+class ClassificationCacheTests(TestCase):
+
+    def setUp(self):
+        title_index.clear()
+        classification_cache.invalidate()
+        self.version = categories_version(["Cleaning", "Plumbing"])
+
+    def test_hits_come_from_memory_then_the_database(self):
+        classification_cache.set("Fix my  SINK", self.version, ["Plumbing"])
+        with self.assertNumQueries(0):
+            self.assertEqual(classification_cache.get("fix my sink", self.version), ["Plumbing"])
+        other_worker = ClassificationCache()
+        with self.assertNumQueries(1):
+            self.assertEqual(other_worker.get("fix my sink", self.version), ["Plumbing"])
+        with self.assertNumQueries(0):
+            self.assertEqual(other_worker.get("fix my sink", self.version), ["Plumbing"])
+
+    def test_expired_rows_are_misses(self):
+        classification_cache.set("fix my sink", self.version, ["Plumbing"])
+        CategoryClassification.objects.update(expires_at=timezone.now())
+        self.assertIsNone(ClassificationCache().get("fix my sink", self.version))
+
+    def test_versions_follow_the_category_set(self):
+        self.assertEqual(categories_version(["Plumbing", "Cleaning", "Plumbing", None]), self.version)
+        classification_cache.set("fix my sink", self.version, ["Plumbing"])
+        self.assertIsNone(classification_cache.get("fix my sink", categories_version(["Plumbing"])))
+
+    def test_category_changes_invalidate(self):
+        category = ServiceCategory.objects.create(name="Cleaning")
+        classification_cache.set("fix my sink", self.version, ["Plumbing"])
+        category.description = "Homes and offices"
+        category.save()
+        self.assertEqual(classification_cache.get("fix my sink", self.version), ["Plumbing"])
+        category.name = "Deep Cleaning"
+        category.save()
+        self.assertIsNone(classification_cache.get("fix my sink", self.version))
+        self.assertFalse(CategoryClassification.objects.exists())
+
+    def test_search_uses_the_cached_answer(self):
+        provider = User.objects.create(telegram_id="960", role="pro")
+        plumbing = ServiceCategory.objects.create(name="Plumbing")
+        service = Service.objects.create(
+            provider=provider, category=plumbing, title="Pipes", description="", price=Decimal("1.00")
+        )
+        classification_cache.set("leaking faucet", categories_version(["Plumbing"]), ["Plumbing"])
+        with mock.patch("services.views.classify_with_deadline") as classify:
+            response = APIClient().get("/api/services/?search=leaking faucet&fields=id")
+        classify.assert_not_called()
+        self.assertEqual(response.json()["results"], [{"id": service.pk}])
+
+
+@override_settings(AI_CLASSIFICATION_BUDGET=0.05)
+class ClassificationDeadlineTests(TransactionTestCase):
+    """
+    The model call runs on a worker thread with its own connection, hence
+    TransactionTestCase.
+    """
+
+    def setUp(self):
+        title_index.clear()
+        classification_cache.invalidate()
+        metrics.reset()
+        self.version = categories_version(["Plumbing"])
+        self.release = threading.Event()
+        self.calls = 0
+
+    def slow_model(self, query, categories):
+        self.calls += 1
+        self.release.wait(5)
+        return ["Plumbing"]
+
+    def wait_for_background_call(self):
+        self.release.set()
+        for future in list(classifier._inflight.values()):
+            future.result(timeout=5)
+
+    def test_budget_overrun_falls_back_and_fills_the_cache_later(self):
+        with mock.patch("services.classifier.classify_query_categories", self.slow_model):
+            self.assertIsNone(classifier.classify_with_deadline("leaking pipe", ["Plumbing"], self.version))
+            self.assertIsNone(classifier.classify_with_deadline("leaking pipe", ["Plumbing"], self.version))
+            self.wait_for_background_call()
+        self.assertEqual(self.calls, 1)  # the second request joined the in-flight call
+        self.assertEqual(metrics.snapshot()["ai_classification.deadline_exceeded"], 2)
+        self.assertEqual(classification_cache.get("leaking pipe", self.version), ["Plumbing"])
+
+    def test_model_errors_fall_back(self):
+        with mock.patch("services.classifier.classify_query_categories", side_effect=RuntimeError("down")):
+            self.assertIsNone(classifier.classify_with_deadline("leaking pipe", ["Plumbing"], self.version))
+        self.assertEqual(metrics.snapshot()["ai_classification.errors"], 1)
+        self.assertIsNone(classification_cache.get("leaking pipe", self.version))
+
+    def test_search_answers_from_the_full_text_index_meanwhile(self):
+        provider = User.objects.create(telegram_id="970", role="pro")
+        plumbing = ServiceCategory.objects.create(name="Plumbing")
+        service = Service.objects.create(
+            provider=provider, category=plumbing, title="Handyman", description="Fixes leaking taps",
+            price=Decimal("1.00"),
+        )
+        with mock.patch("services.classifier.classify_query_categories", self.slow_model):
+            response = APIClient().get("/api/services/?search=leaking&fields=id")
+            self.wait_for_background_call()
+        self.assertEqual(response.json()["results"], [{"id": service.pk}])
+
+
+class CatalogPaginationTests(TestCase):
+
+    def setUp(self):
+        title_index.clear()
+        self.client = APIClient()
+        self.provider = User.objects.create(telegram_id="980", role="pro")
+        created = timezone.now()
+        # Equal created_at everywhere: order must still be total through the id tiebreak
+        Service.objects.bulk_create([
+            Service(provider=self.provider, title=f"Cleaning {i}", description="", price=Decimal(i % 4),
+                    created_at=created)
+            for i in range(25)
+        ])
+
+    def walk(self, url):
+        ids, pages = [], 0
+        while url:
+            body = self.client.get(url).json()
+            ids += [service["id"] for service in body["results"]]
+            url = body["next"]
+            pages += 1
+            if pages == 1:
+                # Inserted while paging: ahead of the cursor, so never seen and nothing shifts
+                Service.objects.create(provider=self.provider, title="Cleaning new", description="",
+                                       price=Decimal("9"))
+        return ids
+
+    def test_pages_are_stable_under_inserts(self):
+        ids = self.walk("/api/services/?page_size=10&fields=id")
+        expected = list(
+            Service.objects.exclude(title="Cleaning new").order_by("-created_at", "-id").values_list("id", flat=True)
+        )
+        self.assertEqual(ids, expected)
+
+    def test_ordering_parameter(self):
+        ids = self.walk("/api/services/?page_size=10&ordering=price&fields=id")
+        prices = dict(Service.objects.values_list("id", "price"))
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual([prices[pk] for pk in ids], sorted(prices[pk] for pk in ids))
+
+    def test_search_results_page_in_relevance_order(self):
+        ranked = [pk for pk, _ in title_index.search("cleaning 1")]
+        ids = self.walk("/api/services/?search=cleaning 1&page_size=5&fields=id")
+        self.assertEqual(len(ids), len(set(ids)))
+        # The row inserted mid-walk may join later pages, but nothing seen moves
+        self.assertEqual([pk for pk in ids if pk in ranked], ranked)
+
+
+class RatingAggregateTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.provider = User.objects.create(telegram_id="990", role="pro")
+        self.reviewers = [User.objects.create(telegram_id=f"99{i}") for i in range(1, 4)]
+        self.service, self.other = [
+            Service.objects.create(provider=self.provider, title=title, description="", price=Decimal("1.00"))
+            for title in ("Rated", "Other")
+        ]
+
+    def review(self, reviewer, rating, service=None):
+        response = self.client.post("/api/services/reviews/", {
+            "service": (service or self.service).pk, "reviewer_telegram_id": reviewer.telegram_id, "rating": rating,
+        }, format="json")
+        self.assertIn(response.status_code, (200, 201))
+        return response.json()["id"]
+
+    def assertRating(self, service, avg, count):
+        service.refresh_from_db()
+        self.assertEqual((round(service.rating_avg, 2), service.rating_count), (avg, count))
+
+    def test_maintained_through_review_writes(self):
+        first = self.review(self.reviewers[0], 5)
+        self.review(self.reviewers[1], 2)
+        self.assertRating(self.service, 3.5, 2)
+
+        self.review(self.reviewers[0], 3)  # same reviewer: updates their review
+        self.assertRating(self.service, 2.5, 2)
+
+        response = self.client.patch(f"/api/services/reviews/{first}/", {"service": self.other.pk}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertRating(self.service, 2.0, 1)
+        self.assertRating(self.other, 3.0, 1)
+
+        self.client.delete(f"/api/services/reviews/{first}/")
+        self.assertRating(self.other, 0.0, 0)
+
+    def test_min_rating_filter(self):
+        self.review(self.reviewers[0], 4)
+        self.review(self.reviewers[1], 3, service=self.other)
+        response = self.client.get("/api/services/?min_rating=3.5&fields=id")
+        self.assertEqual(response.json()["results"], [{"id": self.service.pk}])
+        response = self.client.get("/api/services/?min_rating=3&ordering=-rating_avg&fields=id")
+        self.assertEqual(response.json()["results"], [{"id": self.service.pk}, {"id": self.other.pk}])
+        self.assertEqual(self.client.get("/api/services/?min_rating=high").status_code, 400)
+
+    def test_rebuild_ratings_command(self):
+        self.review(self.reviewers[0], 4)
+        Service.objects.update(rating_avg=0, rating_count=0)
+        call_command("rebuild_ratings", stdout=io.StringIO())
+        self.assertRating(self.service, 4.0, 1)
+
+
+class SparseFieldsetTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.provider = User.objects.create(telegram_id="1000", role="pro", full_name="Provider")
+        self.services = [
+            Service.objects.create(provider=self.provider, title=f"Service {i}", description="", price=Decimal("1.00"))
+            for i in range(3)
+        ]
+        for i, reviewer in enumerate(User.objects.create(telegram_id=f"100{i}") for i in range(1, 4)):
+            for service in self.services:
+                ServiceReview.objects.create(service=service, reviewer=reviewer, rating=i + 1)
+
+    def test_fields_projection(self):
+        results = self.client.get("/api/services/?fields=title, provider_name,nonsense").json()["results"]
+        self.assertEqual(set(results[0]), {"id", "title", "provider_name"})
+        detail = self.client.get(f"/api/services/{self.services[0].pk}/?fields=price").json()
+        self.assertEqual(set(detail), {"id", "price"})
+
+    def test_reviews_embedded_only_when_asked(self):
+        self.assertNotIn("reviews", self.client.get("/api/services/").json()["results"][0])
+        self.assertEqual(len(self.client.get(f"/api/services/{self.services[0].pk}/").json()["reviews"]), 3)
+        results = self.client.get("/api/services/?expand=reviews&fields=title,reviews").json()["results"]
+        self.assertEqual([set(r) for r in results], [{"id", "title", "reviews"}] * 3)
+        self.assertEqual(sorted(r["rating"] for r in results[0]["reviews"]), [1, 2, 3])
+
+    def test_writes_ignore_the_projection_except_in_the_response(self):
+        response = self.client.post("/api/services/?fields=id", {
+            "provider": self.provider.telegram_id, "title": "New", "description": "Fresh", "price": "5.00",
+        }, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(set(response.json()), {"id"})
+        self.assertEqual(Service.objects.get(pk=response.json()["id"]).price, Decimal("5.00"))
+
+        self.assertEqual(self.client.post("/api/services/?fields=id", {
+            "provider": self.provider.telegram_id, "title": "No price", "description": "Fresh",
+        }, format="json").status_code, 400)
+
+        service = self.services[0]
+        response = self.client.patch(
+            f"/api/services/myservices/{service.pk}/?telegram_id=1000&fields=id", {"title": "B"}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"id": service.pk})
+        service.refresh_from_db()
+        self.assertEqual(service.title, "B")
+
+    def test_expanded_reviews_load_in_constant_queries(self):
+        def count():
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.get("/api/services/?expand=reviews&fields=title,reviews")
+            return len(ctx.captured_queries)
+
+        before = count()
+        Service.objects.create(provider=self.provider, title="More", description="", price=Decimal("1.00"))
+        ServiceReview.objects.create(service=Service.objects.get(title="More"), reviewer=self.provider, rating=5)
+        self.assertEqual(count(), before)
+
+
+class FullTextIndexTests(TestCase):
+
+    def setUp(self):
+        self.provider = User.objects.create(telegram_id="940", role="pro", full_name="Abebe Kebede")
+        self.category = ServiceCategory.objects.create(name="Home Repair")
+
+    def make_service(self, title, description=""):
+        return Service.objects.create(
+            provider=self.provider, category=self.category, title=title, description=description,
+            price=Decimal("1.00"),
+        )
+
+    def test_title_matches_rank_above_description_matches(self):
+        described = self.make_service("Handyman", "Also does plumbing")
+        titled = self.make_service("Plumbing and pipes")
+        self.make_service("Painting")
+        self.assertEqual(fulltext.search("plumb"), [titled.pk, described.pk])
+        self.assertEqual(fulltext.search("plumbing pipes"), [titled.pk])
+        self.assertEqual(fulltext.search("?!"), [])
+
+    def test_index_follows_service_changes(self):
+        service = self.make_service("Gardening")
+        self.assertEqual(fulltext.search("garden"), [service.pk])
+        service.title = "Landscaping"
+        service.save()
+        self.assertEqual(fulltext.search("garden"), [])
+        self.assertEqual(fulltext.search("landscap"), [service.pk])
+        service.delete()
+        self.assertEqual(fulltext.search("landscap"), [])
+
+    def test_index_follows_category_and_provider_names(self):
+        service = self.make_service("Tiling")
+        self.category.name = "Renovation"
+        self.category.save()
+        self.assertEqual(fulltext.search("renovation"), [service.pk])
+        self.provider.full_name = "Almaz Tesfaye"
+        self.provider.save()
+        self.assertEqual(fulltext.search("almaz"), [service.pk])
+        self.assertEqual(fulltext.search("abebe"), [])
+
+    def test_unrelated_user_changes_do_not_reindex(self):
+        self.make_service("Tiling")
+        self.provider.phone_number = "0911000000"
+        with CaptureQueriesContext(connection) as ctx:
+            self.provider.save()
+            self.provider.save(update_fields=["phone_number"])
+        self.assertFalse([q for q in ctx.captured_queries if "services_service" in q["sql"]])
+
+
+class ImageDerivativeTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.media = override_settings(MEDIA_ROOT=cls.media_root, SERVICE_IMAGE_WIDTHS=(320, 640, 1280))
+        cls.media.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.media.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.provider = User.objects.create(telegram_id="920", role="pro")
+
+    def upload(self, name="photo.jpg"):
+        # 800x400 landscape pixels tagged "rotate 90°": upright it is 400 wide
+        image = Image.new("RGB", (800, 400), "red")
+        exif = Image.Exif()
+        exif[images.ORIENTATION_TAG] = 6
+        exif[0x010F] = "CameraMaker"
+        buffer = io.BytesIO()
+        image.save(buffer, "JPEG", exif=exif)
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/jpeg")
+
+    def make_service(self, **kwargs):
+        return Service.objects.create(
+            provider=self.provider, title="Service", description="", price=Decimal("1.00"), **kwargs
+        )
+
+    def test_generated_at_upload(self):
+        service = self.make_service(image=self.upload())
+        service.refresh_from_db()
+        widths = service.image_variants["widths"]
+        self.assertEqual(list(widths), ["320", "400"])  # never upscaled past the source
+        for width, name in widths.items():
+            with default_storage.open(name) as f, Image.open(f) as derived:
+                self.assertEqual(derived.format, "WEBP")
+                self.assertEqual(derived.width, int(width))
+                self.assertGreater(derived.height, derived.width)  # EXIF rotation applied
+                self.assertEqual(len(derived.getexif()), 0)
+
+    def test_identical_uploads_share_derivatives(self):
+        first = self.make_service(image=self.upload("a.jpg"))
+        second = self.make_service(image=self.upload("b.jpg"))
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.image.name, second.image.name)  # one blob (services/storage.py)
+        self.assertEqual(first.image_variants["widths"], second.image_variants["widths"])
+
+    def test_missing_srcset_is_queued_not_generated_in_the_request(self):
+        service = self.make_service(image=self.upload())
+        Service.objects.filter(pk=service.pk).update(image_variants={})
+        executor = mock.Mock()
+        with mock.patch("services.images._get_executor", return_value=executor), \
+                mock.patch("services.images.generate") as generate, \
+                self.captureOnCommitCallbacks(execute=True), \
+                CaptureQueriesContext(connection) as queries:
+            response = APIClient().get(f"/api/services/{service.pk}/")
+        self.assertEqual(response.json()["image_srcset"], {})
+        self.assertTrue(response.json()["image"])
+        self.assertNotIn("image_variants", response.json())
+        generate.assert_not_called()
+        self.assertFalse([q for q in queries if q["sql"].startswith("UPDATE")])
+
+        job, service_id = executor.submit.call_args.args
+        with mock.patch("services.images.connection"):  # keep the test connection open
+            job(service_id)
+        srcset = APIClient().get(f"/api/services/{service.pk}/").json()["image_srcset"]
+        self.assertEqual(list(srcset), ["320w", "400w"])
+        self.assertTrue(srcset["320w"].endswith("-320w.webp"))
+
+
+class ContentAddressedMediaTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.media = override_settings(MEDIA_ROOT=cls.media_root, SERVICE_IMAGE_WIDTHS=(320,))
+        cls.media.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.media.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.provider = User.objects.create(telegram_id="930", role="pro")
+
+    def upload(self, name="photo.png", color="blue"):
+        buffer = io.BytesIO()
+        Image.new("RGB", (40, 20), color).save(buffer, "PNG")
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+    def legacy_file(self, data, name="legacy.png"):
+        # A pre-existing upload stored under its own name
+        path = os.path.join(self.media_root, "service_images", name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def make_service(self, **kwargs):
+        return Service.objects.create(
+            provider=self.provider, title="Service", description="", price=Decimal("1.00"), **kwargs
+        )
+
+    def test_identical_uploads_stored_once_and_released_by_the_last_reference(self):
+        first = self.make_service(image=self.upload("a.png"))
+        second = self.make_service(image=self.upload("b.png"))
+        name = first.image.name
+        first.refresh_from_db()
+        derived = list(first.image_variants["widths"].values())
+        self.assertTrue(name.startswith("blobs/"))
+        self.assertEqual(MediaBlob.objects.get().refcount, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(MediaBlob.objects.get(name=name).refcount, 1)
+        self.assertTrue(default_storage.exists(name))
+        self.assertTrue(all(default_storage.exists(path) for path in derived))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.image = self.upload("c.png", color="green")
+            second.save()
+        self.assertFalse(MediaBlob.objects.filter(name=name).exists())
+        self.assertFalse(default_storage.exists(name))
+        self.assertEqual(derived, [f"{images.DERIVATIVE_DIR}/{os.path.basename(name)[:32]}-40w.webp"])
+        self.assertFalse(any(default_storage.exists(path) for path in derived))
+        # The replacement's own derivatives are untouched
+        second.refresh_from_db()
+        self.assertTrue(all(default_storage.exists(path) for path in second.image_variants["widths"].values()))
+
+    def test_derivatives_shared_with_a_legacy_upload_are_kept(self):
+        data = self.upload().read()
+        self.legacy_file(data)
+        legacy = Service.objects.create(
+            provider=self.provider, title="Legacy", description="", price=Decimal("1.00"),
+            image="service_images/legacy.png",
+        )
+        self.assertTrue(legacy.image_variants["widths"])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.make_service(image=self.upload()).delete()
+        self.assertTrue(all(default_storage.exists(path) for path in legacy.image_variants["widths"].values()))
+
+    def test_reuploading_the_same_bytes_keeps_one_reference(self):
+        service = self.make_service(image=self.upload("a.png"))
+        name = service.image.name
+        service.image = self.upload("again.png")
+        service.save()
+        service.title = "Renamed"  # no new upload
+        service.save()
+        self.assertEqual(service.image.name, name)
+        self.assertEqual(MediaBlob.objects.get(name=name).refcount, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            service.delete()
+        self.assertFalse(MediaBlob.objects.exists())
+        self.assertFalse(default_storage.exists(name))
+
+    def test_dedupe_media_moves_legacy_names_into_blobs(self):
+        path = self.legacy_file(self.upload().read())
+        Service.objects.bulk_create([
+            Service(provider=self.provider, title=f"S{i}", description="", price=Decimal("1.00"),
+                    image="service_images/legacy.png")
+            for i in range(3)
+        ])
+        call_command("dedupe_media", stdout=io.StringIO())
+        blob = MediaBlob.objects.get()
+        self.assertEqual(blob.refcount, 3)
+        self.assertEqual(set(Service.objects.values_list("image", flat=True)), {blob.name})
+        self.assertTrue(os.path.exists(path))  # originals kept unless --delete-originals
+
+    def test_blobs_served_immutable_with_validators_and_ranges(self):
+        name = self.make_service(image=self.upload()).image.name
+        size = default_storage.size(name)
+        url = f"/media/{name}"
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Cache-Control"], "public, max-age=31536000, immutable")
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        etag = response["ETag"]
+        self.assertIn(etag.strip('"'), name)
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        partial = self.client.get(url, HTTP_RANGE="bytes=0-9")
+        self.assertEqual(partial.status_code, 206)
+        self.assertEqual(partial["Content-Range"], f"bytes 0-9/{size}")
+        self.assertEqual(len(b"".join(partial.streaming_content)), 10)
+        # A stale If-Range validator gets the whole file
+        self.assertEqual(self.client.get(url, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"stale"').status_code, 200)
+        self.assertEqual(self.client.get(url, HTTP_RANGE=f"bytes={size}-").status_code, 416)
+
+    def test_other_media_revalidated_and_traversal_refused(self):
+        self.legacy_file(b"x")
+        response = self.client.get("/media/service_images/legacy.png")
+        self.assertEqual(response["Cache-Control"], "public, max-age=300")
+        self.assertEqual(self.client.get("/media/../manage.py").status_code, 404)
@@ -1,69 +1,61 @@
 from rest_framework import viewsets, filters
+from django.db import transaction
 from .models import Service, ServiceCategory, ServiceReview
-from .serializers import ServiceSerializer, ServiceCategorySerializer, ServiceReviewSerializer
-from groq import Groq
-from dotenv import load_dotenv
-import os
-import json
-from rapidfuzz import fuzz
-from django.db.models import Q, Case, When
-from django.db import models
+from .serializers import ServiceSerializer, ServiceCategorySerializer, ServiceReviewSerializer, parse_csv_param
+from django.db.models import Q, Prefetch
 from rest_framework.exceptions import ValidationError
-from accounts.models import User
-from django.shortcuts import get_object_or_404
+from accounts.user_cache import get_by_telegram_id
+from config.routers import ReplicaReadsMixin
+from accounts.outbox import enqueue_booking_message
+from django.http import Http404
 from rest_framework.response import Response
+from .search import title_index, order_by_ids
+from . import fulltext
+from .pagination import ServiceCursorPagination
+from .ratings import refresh_service_rating
+from .classification_cache import classification_cache, categories_version
+from .classifier import classify_with_deadline
 
 
-def classify_query_categories(search_query: str, possible_categories: list[str]) -> list[str]:
-    load_dotenv()
-    GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-    client = Groq(api_key=GROQ_API_KEY)
-    
-    prompt = (
-        f"You are an expert classifier. Given the user search query: \"{search_query}\", "
-        f"choose which of the following service categories it belongs to: {', '.join(possible_categories)}. "
-        "You are an API. Only respond with a valid JSON array of category names that best match the following service search query.No extra text. No explanations. Example: ['Tutoring', 'Education']."
-        "If the query does not match any category, return an empty array."
-        )
-    
-    response = client.chat.completions.create(
-        messages=[
-            {"role": "system", "content": "You classify user queries into service categories."},
-            {"role": "user", "content": prompt},
-        ],
-        model="llama-3.3-70b-versatile",  # or use 'compound-beta' for built-in web search support :contentReference[oaicite:1]{index=1}
-    )
-
-    ai_response = response.choices[0].message.content
-    
-    raw = ai_response.strip()
+class ServiceCategoryViewSet(ReplicaReadsMixin, viewsets.ModelViewSet):
+    queryset = ServiceCategory.objects.all()
+    serializer_class = ServiceCategorySerializer
 
-    # First, try parsing normally
-    try:
-        categories = json.loads(raw)
-        # If it's a string that contains JSON, parse again
-        if isinstance(categories, str):
-            categories = json.loads(categories)
-    except json.JSONDecodeError:
-        categories = []
+class ServiceFieldsMixin:
+    """
+    ``?fields=a,b`` sparse fieldsets and ``?expand=reviews`` for ServiceSerializer views.
 
-    # Ensure it's a list of strings
-    if not isinstance(categories, list):
-        categories = []
+    Reviews are embedded by default only on retrieve; when embedded they are
+    loaded with one prefetch (plus the reviewer join) for the whole page.
+    """
 
-    print("AI classified categories:", categories)
-    return categories
+    def get_expand(self):
+        expand = parse_csv_param(self.request.query_params.get('expand'))
+        if self.action == 'retrieve':
+            expand.add('reviews')
+        return expand
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['expand'] = self.get_expand()
+        context['fields'] = parse_csv_param(self.request.query_params.get('fields'))
+        return context
+
+    def with_expansions(self, queryset):
+        if 'reviews' in self.get_expand():
+            queryset = queryset.prefetch_related(
+                Prefetch('reviews', queryset=ServiceReview.objects.select_related('reviewer'))
+            )
+        return queryset
 
 
-class ServiceCategoryViewSet(viewsets.ModelViewSet):
-    queryset = ServiceCategory.objects.all()
-    serializer_class = ServiceCategorySerializer
-
-class ServiceViewSet(viewsets.ModelViewSet):
+class ServiceViewSet(ReplicaReadsMixin, ServiceFieldsMixin, viewsets.ModelViewSet):
     serializer_class = ServiceSerializer
     queryset = Service.objects.all().select_related('category', 'provider')
-    filter_backends = [filters.SearchFilter]
+    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    pagination_class = ServiceCursorPagination
     search_fields = ['title', 'description', 'category__name', 'provider__full_name']
+    ordering_fields = ['rating_avg', 'rating_count', 'price', 'created_at']
 
     def perform_create(self, serializer):
         # Get telegram_id from query param or request data
@@ -71,60 +63,65 @@ class ServiceViewSet(viewsets.ModelViewSet):
         if not telegram_id:
             raise ValidationError({"telegram_id": "Telegram ID is required."})
 
-        provider = User.objects.filter(telegram_id=telegram_id).first()
+        provider = get_by_telegram_id(telegram_id)
         if not provider:
             raise ValidationError({"provider": "No provider found for this Telegram ID."})
 
-        service = serializer.save(provider=provider)
+        with transaction.atomic():
+            service = serializer.save(provider=provider)
 
-        # Send Telegram message to provider after successful service registration
-        from accounts.send_booking_message import send_booking_message_sync
-        send_booking_message_sync(
-            telegram_id=provider.telegram_id,
-            message=f"Your service '{service.title}' has been registered successfully!",
-            button_text="Go to Provider Dashboard",
-            button_url="https://balemuya-frontend-qn6y.vercel.app/provider/dashboard"
-        )
+            # Queue Telegram message to provider after successful service registration
+            enqueue_booking_message(
+                telegram_id=provider.telegram_id,
+                message=f"Your service '{service.title}' has been registered successfully!",
+                button_text="Go to Provider Dashboard",
+                button_url="https://balemuya-frontend-qn6y.vercel.app/provider/dashboard"
+            )
 
     def get_queryset(self):
         # Use a fresh queryset to avoid stale cached results on class-level QuerySet
-        base_qs = self.queryset.all()
+        base_qs = self.with_expansions(self.queryset.all())
         provider_telegram_id = self.request.query_params.get('provider_telegram_id')
         if provider_telegram_id:
-            provider = User.objects.filter(telegram_id=provider_telegram_id).first()
+            provider = get_by_telegram_id(provider_telegram_id)
             if provider:
                 return base_qs.filter(provider=provider)
             return Service.objects.none()
 
+        min_rating = self.request.query_params.get('min_rating')
+        if min_rating:
+            try:
+                base_qs = base_qs.filter(rating_avg__gte=float(min_rating))
+            except ValueError:
+                raise ValidationError({"min_rating": "Must be a number."})
+
         query = self.request.query_params.get('search', "").strip()
         if not query:
             return base_qs
 
-        # 2️⃣ Fuzzy match on titles
-        scored_services = []
-        for service in base_qs:
-            score = fuzz.WRatio(query.lower(), service.title.lower())
-            print(score)
-            if score >= 60:  # tweak threshold if needed
-                scored_services.append((service.id, score))
+        # 2️⃣ Fuzzy match on titles (cached in-process index, best match first)
+        scored_services = title_index.search(query)
 
         if scored_services:
-            scored_services.sort(key=lambda x: x[1], reverse=True)
-            ids_ordered = [sid for sid, _ in scored_services]
-            preserved_order = Case(
-                *[When(pk=pk, then=pos) for pos, pk in enumerate(ids_ordered)],
-                output_field=models.IntegerField()
-            )
-            return base_qs.filter(id__in=ids_ordered).order_by(preserved_order)
+            return order_by_ids(base_qs, [sid for sid, _ in scored_services])
         
         # 1️⃣ Try AI category classification
         possible_categories = list(Service.objects.values_list('category__name', flat=True).distinct())
-        ai_categories = classify_query_categories(query, possible_categories)
+        version = categories_version(possible_categories)
+        ai_categories = classification_cache.get(query, version)
+        if ai_categories is None:
+            # Bounded by AI_CLASSIFICATION_BUDGET; None means fall through to icontains
+            ai_categories = classify_with_deadline(query, possible_categories, version)
 
         if ai_categories:
             return base_qs.filter(category__name__in=ai_categories)
 
-        # 3️⃣ Fallback: partial match on other fields
+        # 3️⃣ Fallback: full-text index over title/description/category/provider
+        ranked_ids = fulltext.search(query)
+        if ranked_ids is not None:
+            return order_by_ids(base_qs, ranked_ids)
+
+        # No full-text backend for this database: partial match on other fields
         return base_qs.filter(
             Q(title__icontains=query) |
             Q(description__icontains=query) |
@@ -149,7 +146,7 @@ class ServiceReviewViewSet(viewsets.ModelViewSet):
         )
         reviewer_id = None
         if reviewer_telegram_id:
-            user = User.objects.filter(telegram_id=reviewer_telegram_id).first()
+            user = get_by_telegram_id(reviewer_telegram_id)
             if user:
                 reviewer_id = user.id
         if not reviewer_id:
@@ -175,8 +172,28 @@ class ServiceReviewViewSet(viewsets.ModelViewSet):
         self.perform_create(serializer)
         headers = self.get_success_headers(serializer.data)
         return Response(serializer.data, status=201, headers=headers)
+
+    # Keep Service.rating_avg/rating_count in step with every review write
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            review = serializer.save()
+            refresh_service_rating(review.service_id)
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            previous_service_id = serializer.instance.service_id
+            review = serializer.save()
+            refresh_service_rating(review.service_id)
+            if previous_service_id != review.service_id:
+                refresh_service_rating(previous_service_id)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            service_id = instance.service_id
+            instance.delete()
+            refresh_service_rating(service_id)
     
-class MyServicesViewSet(viewsets.ModelViewSet):
+class MyServicesViewSet(ServiceFieldsMixin, viewsets.ModelViewSet):
     """
     Retrieve, update (partial or full) services for a specific provider
     """
@@ -186,11 +203,14 @@ class MyServicesViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         # Expect telegram_id as a query param
-        telegram_id = self.request.query_params.get("telegram_id")
-        if not telegram_id:
+        if not self.request.tg_telegram_id:
             return Service.objects.none()
-        user = get_object_or_404(User, telegram_id=telegram_id)
-        return Service.objects.filter(provider=user)
+        user = self.request.tg_user
+        if user is None:
+            raise Http404("No User matches the given query.")
+        return self.with_expansions(
+            Service.objects.filter(provider=user).select_related('category', 'provider')
+        )
 
     def partial_update(self, request, *args, **kwargs):
         service = self.get_object()